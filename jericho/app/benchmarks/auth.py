@@ -0,0 +1,71 @@
+"""Authentication microbenchmark.
+
+Runs the middleware's token verification against the offline JWKS
+stand-in, so it needs neither Auth0 nor a database:
+
+    poetry run python -m benchmarks.auth --iterations 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from src.auth.local_jwks import LocalJWKS
+from src.auth.middleware import averify_token, verified_tokens
+from src.metrics import registry
+
+
+def _report(name: str, samples: List[float]):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"{name:<12} n={len(samples):<6} mean={statistics.mean(samples) * 1e6:8.1f}us "
+        f"p50={p50 * 1e6:8.1f}us p99={p99 * 1e6:8.1f}us"
+    )
+
+
+async def _run(iterations: int, distinct_tokens: int):
+    local_jwks = LocalJWKS()
+    local_jwks.install()
+    tokens = [local_jwks.mint(f"auth0|bench{i}") for i in range(distinct_tokens)]
+
+    cold: List[float] = []
+    for i in range(iterations):
+        verified_tokens.clear()
+        start = time.perf_counter()
+        await averify_token(tokens[i % distinct_tokens])
+        cold.append(time.perf_counter() - start)
+
+    for token in tokens:
+        await averify_token(token)
+    warm: List[float] = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await averify_token(tokens[i % distinct_tokens])
+        warm.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[averify_token(tokens[i % distinct_tokens]) for i in range(iterations)])
+    concurrent = time.perf_counter() - start
+
+    _report("cold", cold)
+    _report("warm", warm)
+    print(f"concurrent   {iterations / concurrent:.0f} verifications/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--distinct-tokens", type=int, default=50)
+    parser.add_argument("--metrics", action="store_true", help="dump the phase histograms")
+    args = parser.parse_args()
+
+    asyncio.run(_run(args.iterations, args.distinct_tokens))
+    if args.metrics:
+        print("\n".join(registry.get("auth_phase_seconds").render()))
+
+
+if __name__ == "__main__":
+    main()
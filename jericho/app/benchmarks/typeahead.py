@@ -0,0 +1,139 @@
+"""Typeahead microbenchmark.
+
+Builds the in-memory index from a synthetic catalog, so it needs no
+database, then measures suggestion latency serially and at a fixed
+request rate while the index takes new books, as synced and as rebuilt:
+
+    poetry run python -m benchmarks.typeahead --books 200000 --rate 2000
+"""
+import argparse
+import itertools
+import random
+import string
+import threading
+import time
+from typing import Callable, List
+
+from src.config import typeahead_sync_interval_seconds
+from src.db.schema.books import SuggestionType
+from src.domain.utils.typeahead import TypeaheadIndex
+
+from benchmarks.auth import _report
+
+
+def _words(rng: random.Random, count: int) -> List[str]:
+    return [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))).capitalize()
+        for _ in range(count)
+    ]
+
+
+def _queries(rng: random.Random, titles: List[str], count: int) -> List[str]:
+    # Prefixes of one or two words of real titles, as typed.
+    queries = []
+    for _ in range(count):
+        words = rng.choice(titles).split()
+        start = rng.randrange(len(words))
+        typed = " ".join(words[start:start + rng.randint(1, 2)])
+        queries.append(typed[:rng.randint(1, len(typed))])
+    return queries
+
+
+def _run(books: int, authors: int, queries: int, rate: int, sync_books: int, seed: int):
+    rng = random.Random(seed)
+    vocabulary = _words(rng, 20000)
+    titles = [" ".join(rng.choices(vocabulary, k=rng.randint(1, 6))) for _ in range(books)]
+    names = [" ".join(rng.choices(vocabulary, k=2)) for _ in range(authors)]
+
+    index = TypeaheadIndex()
+    start = time.perf_counter()
+    for i, title in enumerate(titles):
+        index.add(SuggestionType.BOOK, i, title, popularity=int(rng.paretovariate(1.5)))
+    for i, name in enumerate(names):
+        index.add(SuggestionType.AUTHOR, i, name, popularity=rng.randint(0, 20))
+    build = time.perf_counter() - start
+    stats = index.stats()
+    print(
+        f"build        {books + authors} suggestions, {stats['keys']} keys in {build:.1f}s "
+        f"({(books + authors) / build:.0f}/s)"
+    )
+
+    typed = _queries(rng, titles, queries)
+    serial: List[float] = []
+    for q in typed:
+        start = time.perf_counter()
+        index.suggest(q)
+        serial.append(time.perf_counter() - start)
+    _report("serial", serial)
+
+    def add_books(count: int) -> int:
+        index.add_many(SuggestionType.BOOK, [
+            (next(new_ids), " ".join(rng.choices(vocabulary, k=3)), 0) for _ in range(count)
+        ])
+        return count
+
+    new_ids = itertools.count(books)
+    # The sync thread adding what was inserted since its last sync, then
+    # rebuilding, when it adds nonstop.
+    _under_load(
+        index, typed, rate, f"{rate}/s sync",
+        lambda: add_books(sync_books), typeahead_sync_interval_seconds,
+    )
+    _under_load(index, typed, rate, f"{rate}/s rebuild", lambda: add_books(1000), 0)
+
+
+def _under_load(
+        index: TypeaheadIndex,
+        typed: List[str],
+        rate: int,
+        name: str,
+        write: Callable[[], int],
+        write_interval_seconds: float,
+):
+    """Requests arrive at a fixed rate on one thread, as on the event loop,
+    while another thread writes. Latency counts from the scheduled arrival,
+    so it includes queueing behind the writer.
+    """
+    stop = threading.Event()
+    written = 0
+
+    def writer():
+        nonlocal written
+        while not stop.is_set():
+            written += write()
+            if write_interval_seconds:
+                stop.wait(write_interval_seconds)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    samples: List[float] = []
+    begin = time.perf_counter()
+    for i, q in enumerate(typed):
+        arrival = begin + i / rate
+        while time.perf_counter() < arrival:
+            pass
+        index.suggest(q)
+        samples.append(time.perf_counter() - arrival)
+    elapsed = time.perf_counter() - begin
+    stop.set()
+    thread.join()
+
+    _report(name, samples)
+    print(f"{'':<12} {written / elapsed:.0f} inserts/s alongside")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--authors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=2000, help="requests per second under load")
+    parser.add_argument("--sync-books", type=int, default=100, help="books added per sync")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    _run(args.books, args.authors, args.queries, args.rate, args.sync_books, args.seed)
+
+
+if __name__ == "__main__":
+    main()
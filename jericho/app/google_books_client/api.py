@@ -1,6 +1,6 @@
 import logging
 from ._rest_adapter import RestAdapter
-from .constants import GOOGLE_BOOKS_API_URL
+from .constants import GOOGLE_BOOKS_API_URL, GOOGLE_BOOKS_MAX_RESULTS
 from .models import Book, BookSearchResultSet, GoogleBooksSearchParams
 
 class GoogleBooksAPI:
@@ -31,6 +31,8 @@ class GoogleBooksAPI:
         author: str = None,
         publisher: str = None,
         subject: str = None,
+        start_index: int = None,
+        max_results: int = GOOGLE_BOOKS_MAX_RESULTS,
     ) -> BookSearchResultSet:
         """Search for a book with optional filters
 
@@ -46,6 +48,10 @@ class GoogleBooksAPI:
         :type publisher: str, optional
         :param subject: Book Subject, defaults to None
         :type subject: str, optional
+        :param start_index: Position of the first result to return, defaults to None
+        :type start_index: int, optional
+        :param max_results: Page size, at most 40, defaults to 40
+        :type max_results: int, optional
         :return: A BookSearchResultSet objects
         :rtype: BookSearchResultSet
         """
@@ -58,6 +64,8 @@ class GoogleBooksAPI:
                 author=author,
                 title=title,
                 subject=subject,
+                start_index=start_index,
+                max_results=max_results,
             ).generate(),
         )
         result_set = BookSearchResultSet.from_google_books_api_response(response.data)
@@ -1,6 +1,8 @@
 from enum import Enum
 
 GOOGLE_BOOKS_API_URL: str = "www.googleapis.com/books"
+# Largest page the volumes endpoint accepts.
+GOOGLE_BOOKS_MAX_RESULTS: int = 40
 
 
 class GoogleBookAPISearchFilters(str, Enum):
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from datetime import date
-from .constants import GoogleBookAPISearchFilters
+from .constants import GOOGLE_BOOKS_MAX_RESULTS, GoogleBookAPISearchFilters
 import urllib.parse
 
 class HttpResult:
@@ -132,9 +132,10 @@ class BookSearchResultSet:
     :type books: list[Book], optional
     """
 
-    def __init__(self, books: list[Book] = None):
+    def __init__(self, books: list[Book] = None, total_items: int = None):
         """Class Constructor."""
         self._books = books or []
+        self._total_items = total_items
         self._idx = 0
         
     def __iter__(self):
@@ -157,7 +158,7 @@ class BookSearchResultSet:
             Book.from_google_books_api_response_book_item(book_result)
             for book_result in book_results_from_web_api
         ]
-        return cls(books=book_results)
+        return cls(books=book_results, total_items=google_books_response_data.get("totalItems"))
 
         
 
@@ -186,6 +187,15 @@ class BookSearchResultSet:
         """
         return len(self._books)
 
+    @property
+    def total_items(self) -> int:
+        """Total results Google reports for the search query, across all pages
+
+        :return: Number of matching volumes
+        :rtype: int
+        """
+        return self._total_items if self._total_items is not None else len(self._books)
+
     def __repr__(self):
         return f"BookSearchResultSet(total_size={self.total_results})"
 
@@ -199,6 +209,8 @@ class GoogleBooksSearchParams:
         author: str = None,
         subject: str = None,
         search_term: str = "",
+        start_index: int = None,
+        max_results: int = GOOGLE_BOOKS_MAX_RESULTS,
     ):
         """Represents search parameters to be used on the API
 
@@ -214,8 +226,14 @@ class GoogleBooksSearchParams:
         :type subject: str, optional
         :param search_term: Book generalizedsearch term, defaults to ""
         :type search_term: str, optional
+        :param start_index: Position of the first result to return, defaults to None
+        :type start_index: int, optional
+        :param max_results: Page size, at most 40, defaults to 40
+        :type max_results: int, optional
         """
         self.search_term = search_term
+        self.start_index = start_index
+        self.max_results = min(max_results, GOOGLE_BOOKS_MAX_RESULTS)
         self.title = title
         self.isbn = isbn
         self.publisher = publisher
@@ -232,12 +250,15 @@ class GoogleBooksSearchParams:
         search_term_with_filters: str = None
         if len(filters) > 0:
             search_term_with_filters = self._get_search_term_with_filters()
-        return urllib.parse.urlencode({"q": search_term_with_filters or self.search_term, "maxResults": 40}, safe=":+")
+        params = {"q": search_term_with_filters or self.search_term, "maxResults": self.max_results}
+        if self.start_index:
+            params["startIndex"] = self.start_index
+        return urllib.parse.urlencode(params, safe=":+")
 
     def _get_used_filters(self) -> list[str]:
         used_properties = []
         for property in vars(self):
-            if property == "search_term":
+            if property in ("search_term", "start_index", "max_results"):
                 continue
             used_properties.append(property) if self.__getattribute__(
                 property
@@ -2,11 +2,18 @@ import functools
 import io
 
 import yaml
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.responses import Response
+from sqlmodel import Session
 
-from src.database import create_db_and_tables
-from src.routers import activity, books, collections, internal, reviews, users
+from src.config import environment
+from src.covers.cache import cover_cache
+from src.database import create_db_and_tables, engine, job_worker_pool, replica_router
+from src.db import instrumentation
+from src.domain.service.books import stop_prefetching
+from src.domain.service.imports import resume_imports, stop_imports
+from src.domain.utils.typeahead import typeahead_index
+from src.routers import activity, books, collections, covers, imports, internal, reviews, users
 
 app = FastAPI()
 
@@ -14,6 +21,35 @@ app = FastAPI()
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    replica_router.start()
+    with Session(engine) as session:
+        resume_imports(session)
+    job_worker_pool.start()
+    typeahead_index.start(lambda: Session(engine))
+    cover_cache.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    job_worker_pool.stop()
+    stop_imports()
+    stop_prefetching()
+    replica_router.stop()
+    cover_cache.close()
+
+
+# Query counts go in response headers in dev and in /metrics elsewhere.
+@app.middleware("http")
+async def track_request_queries(request: Request, call_next):
+    with instrumentation.track_queries() as stats:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    instrumentation.report_request(
+        stats,
+        route.path if route else "unmatched",
+        response.headers if environment == "dev" else None,
+    )
+    return response
 
 
 # additional yaml version of openapi.json
@@ -29,6 +65,8 @@ def read_openapi_yaml() -> Response:
 app.include_router(activity.router)
 app.include_router(books.router)
 app.include_router(collections.router)
+app.include_router(covers.router)
+app.include_router(imports.router)
 app.include_router(internal.router)
 app.include_router(reviews.router)
 app.include_router(users.user_router)
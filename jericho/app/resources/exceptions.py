@@ -11,3 +11,11 @@ NotAuthorizedException = HTTPException(
 InvalidArgumentException = HTTPException(
     status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid argument"
 )
+
+PayloadTooLargeException = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Payload too large"
+)
+
+BadGatewayException = HTTPException(
+    status_code=status.HTTP_502_BAD_GATEWAY, detail="Bad gateway"
+)
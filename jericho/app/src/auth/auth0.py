@@ -1,29 +1,206 @@
+import asyncio
 import base64
 import struct
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
 
+import httpx
 import requests
 import six
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicNumbers
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey, RSAPublicNumbers
 
-from src.config import auth0_domain
+from src.config import (
+    auth0_domain,
+    jwks_cache_ttl_seconds,
+    jwks_miss_refresh_interval_seconds,
+)
 
+# Auth0 JWKS URL
+JWKS_URL = auth0_domain + ".well-known/jwks.json"
 
-# Define a function to get the RSA public key from the JWKS
-def get_rsa_public_key(token):
-    # Auth0 JWKS URL
-    jwks_url = auth0_domain + ".well-known/jwks.json"
 
-    # Fetch the JWKS from Auth0
-    jwks_response = requests.get(jwks_url)
-    jwks_data = jwks_response.json()
+def fetch_jwks(jwks_url: str = JWKS_URL) -> dict:
+    jwks_response = requests.get(jwks_url, timeout=10)
+    jwks_response.raise_for_status()
+    return jwks_response.json()
 
-    rsa_key = {}
-    for key in jwks_data["keys"]:
-        if key["kid"] == token["kid"]:
-            rsa_key = key
-    return rsa_key
+
+async def afetch_jwks(jwks_url: str = JWKS_URL) -> dict:
+    async with httpx.AsyncClient(timeout=10) as client:
+        jwks_response = await client.get(jwks_url)
+        jwks_response.raise_for_status()
+        return jwks_response.json()
+
+
+class JWKSKeyStore:
+    """Parsed Auth0 signing keys by kid.
+
+    Keys older than the TTL are served while a background thread refetches
+    them. An unknown kid (e.g. after a key rotation) triggers an immediate
+    refetch, at most once per miss refresh interval. After a failed fetch
+    nothing is refetched for a miss refresh interval either, so an Auth0
+    outage does not turn every request into a fetch.
+
+    The a-prefixed methods are the event loop equivalents used by the
+    middleware; concurrent callers share a single in-flight fetch.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], dict] = fetch_jwks,
+        afetch: Callable[[], Awaitable[dict]] = afetch_jwks,
+        ttl_seconds: float = jwks_cache_ttl_seconds,
+        miss_refresh_interval_seconds: float = jwks_miss_refresh_interval_seconds,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fetch = fetch
+        self.afetch = afetch
+        self.ttl_seconds = ttl_seconds
+        self.miss_refresh_interval_seconds = miss_refresh_interval_seconds
+        self._clock = clock
+
+        self._keys: Dict[str, RSAPublicKey] = {}
+        self._fetched_at: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        # Bumped once a fetch ends, failed or not, so its waiters share the outcome.
+        self._attempts = 0
+        self._last_miss_refresh: Optional[float] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._background_refresh: Optional[threading.Thread] = None
+        self._async_refresh_lock = asyncio.Lock()
+        self._background_arefresh: Optional[asyncio.Task] = None
+
+    def get_public_key(self, kid: str) -> Optional[RSAPublicKey]:
+        fetched = False
+        if self._recently_failed():
+            fetched = True
+        elif self._fetched_at is None:
+            self.refresh()
+            fetched = True
+        elif self._is_stale():
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and not fetched and self._should_refresh_on_miss():
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def refresh(self):
+        # Concurrent callers wait on the in-flight fetch instead of issuing their own.
+        attempts = self._attempts
+        with self._refresh_lock:
+            if self._attempts != attempts:
+                return
+            try:
+                keys = keys_from_jwks(self.fetch())
+            except Exception as e:  # pylint: disable=W0703
+                # Keep serving the previous keys if Auth0 is unreachable.
+                print(f"JWKS refresh failed: {e}")
+                self._failed_at = self._clock()
+                return
+            finally:
+                self._attempts += 1
+            self.set_keys(keys)
+
+    async def aget_public_key(self, kid: str) -> Optional[RSAPublicKey]:
+        fetched = False
+        if self._recently_failed():
+            fetched = True
+        elif self._fetched_at is None:
+            await self.arefresh()
+            fetched = True
+        elif self._is_stale():
+            self._arefresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and not fetched and self._should_refresh_on_miss():
+            await self.arefresh()
+            key = self._keys.get(kid)
+        return key
+
+    async def arefresh(self):
+        attempts = self._attempts
+        async with self._async_refresh_lock:
+            if self._attempts != attempts:
+                return
+            try:
+                keys = keys_from_jwks(await self.afetch())
+            except Exception as e:  # pylint: disable=W0703
+                print(f"JWKS refresh failed: {e}")
+                self._failed_at = self._clock()
+                return
+            finally:
+                self._attempts += 1
+            self.set_keys(keys)
+
+    def set_keys(self, keys: Dict[str, RSAPublicKey]):
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = self._clock()
+            self._failed_at = None
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._failed_at = None
+            self._last_miss_refresh = None
+
+    def _recently_failed(self) -> bool:
+        failed_at = self._failed_at
+        if failed_at is None:
+            return False
+        return self._clock() - failed_at < self.miss_refresh_interval_seconds
+
+    def _is_stale(self) -> bool:
+        return self._clock() - self._fetched_at >= self.ttl_seconds
+
+    def _should_refresh_on_miss(self) -> bool:
+        now = self._clock()
+        with self._lock:
+            if (
+                self._last_miss_refresh is not None
+                and now - self._last_miss_refresh < self.miss_refresh_interval_seconds
+            ):
+                return False
+            self._last_miss_refresh = now
+            return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._background_refresh and self._background_refresh.is_alive():
+                return
+            self._background_refresh = threading.Thread(
+                target=self.refresh,
+                name="jwks-refresh",
+                daemon=True,
+            )
+            self._background_refresh.start()
+
+    def _arefresh_in_background(self):
+        if self._background_arefresh and not self._background_arefresh.done():
+            return
+        self._background_arefresh = asyncio.get_running_loop().create_task(self.arefresh())
+
+
+jwks_key_store = JWKSKeyStore()
+
+
+def get_rsa_public_key(token) -> Optional[RSAPublicKey]:
+    return jwks_key_store.get_public_key(token["kid"])
+
+
+def keys_from_jwks(jwks_data: dict) -> Dict[str, RSAPublicKey]:
+    return {
+        key["kid"]: jwk_to_public_key(key)
+        for key in jwks_data["keys"]
+        if key.get("kty") == "RSA"
+    }
 
 
 def intarr2long(arr):
@@ -39,11 +216,15 @@ def base64_to_long(data):
     return intarr2long(struct.unpack("%sB" % len(_d), _d))
 
 
-def jwk_to_pem(jwk):
+def jwk_to_public_key(jwk) -> RSAPublicKey:
     exponent = base64_to_long(jwk["e"])
     modulus = base64_to_long(jwk["n"])
     numbers = RSAPublicNumbers(exponent, modulus)
-    public_key = numbers.public_key(backend=default_backend())
+    return numbers.public_key(backend=default_backend())
+
+
+def jwk_to_pem(jwk):
+    public_key = jwk_to_public_key(jwk)
     pem = public_key.public_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PublicFormat.SubjectPublicKeyInfo,
@@ -1,15 +1,98 @@
+import hashlib
+
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
 from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jwt import decode, get_unverified_header
 from sqlmodel import Session
 
-from src.auth.auth0 import get_rsa_public_key, jwk_to_pem
-from src.auth.user import get_request_user_by_sub
-from src.config import auth0_audience, auth0_domain
+from src import metrics
+from src.auth.auth0 import get_rsa_public_key, jwks_key_store
+from src.auth.user import aget_request_user_by_sub, user_ids_by_sub
+from src.cache import TTLCache
+from src.config import auth0_audience, auth0_domain, verified_token_cache_size
 from src.database import get_session
 
 bearer = HTTPBearer()
 
+# Decoded payloads of tokens that already passed signature and claim checks,
+# keyed by token digest and dropped at the token's exp.
+verified_tokens: TTLCache[dict] = TTLCache(maxsize=verified_token_cache_size)
+
+auth_phase_seconds = metrics.histogram(
+    "auth_phase_seconds",
+    "Time spent in each phase of request authentication.",
+    ["phase"],
+)
+metrics.gauge(
+    "auth_verified_token_cache",
+    "Verified token cache statistics.",
+    verified_tokens.stats,
+)
+metrics.gauge(
+    "auth_user_identity_cache",
+    "Sub to user id cache statistics.",
+    user_ids_by_sub.stats,
+)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def verify_token(token: str) -> dict:
+    digest = token_digest(token)
+    payload = verified_tokens.get(digest)
+    if payload is not None:
+        return payload
+
+    token_header = get_unverified_header(token)
+    public_key = get_rsa_public_key(token_header)
+    payload = _decode(token, token_header, public_key)
+    _cache_verified_token(digest, payload)
+    return payload
+
+
+async def averify_token(token: str) -> dict:
+    with auth_phase_seconds.time(phase="header_parse"):
+        digest = token_digest(token)
+        payload = verified_tokens.get(digest)
+        if payload is None:
+            token_header = get_unverified_header(token)
+    if payload is not None:
+        return payload
+
+    with auth_phase_seconds.time(phase="key_lookup"):
+        public_key = await jwks_key_store.aget_public_key(token_header["kid"])
+
+    with auth_phase_seconds.time(phase="signature_verify"):
+        # Signature verification is CPU bound, keep it off the event loop.
+        payload = await run_in_threadpool(_decode, token, token_header, public_key)
+    _cache_verified_token(digest, payload)
+    return payload
+
+
+def _decode(token: str, token_header: dict, public_key: RSAPublicKey) -> dict:
+    if public_key is None:
+        raise ValueError(f"unknown signing key {token_header.get('kid')}")
+
+    return decode(
+        token,
+        public_key,
+        # If necessary due to PEM formatting set options verify_signature false.
+        # options={"verify_signature": False, "verify_aud": True},
+        algorithms=token_header["alg"],
+        audience=auth0_audience,
+        issuer=auth0_domain,
+    )
+
+
+def _cache_verified_token(digest: str, payload: dict):
+    # Tokens without exp are never cached since they could not be evicted on expiry.
+    if "exp" in payload:
+        verified_tokens.set(digest, payload, expires_at=payload["exp"])
+
 
 async def auth0_middleware(
     request: Request,
@@ -22,25 +105,12 @@ async def auth0_middleware(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token_header = get_unverified_header(credentials.credentials)
-    rsa_key = get_rsa_public_key(token_header)
-    pem_key = jwk_to_pem(rsa_key)
-
-    print(token_header)
-
     try:
-        payload = decode(
-            credentials.credentials,
-            pem_key,
-            # If necessary due to PEM formatting set options verify_signature false.
-            # options={"verify_signature": False, "verify_aud": True},
-            algorithms=token_header["alg"],
-            audience=auth0_audience,
-            issuer=auth0_domain,
-        )
+        payload = await averify_token(credentials.credentials)
     except Exception as e:
         print(f"Credential Exception: {e}")
         raise credentials_exception
 
-    request.state.user = get_request_user_by_sub(session, payload["sub"])
+    with auth_phase_seconds.time(phase="user_resolution"):
+        request.state.user = await aget_request_user_by_sub(session, payload["sub"])
     print(f"User: {request.state.user}")
@@ -1,8 +1,23 @@
-from typing import Optional
+from typing import Callable, List, Optional
 
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select
 
 import src.db.schema as schema
+from src.cache import TTLCache
+from src.config import user_identity_cache_size, user_identity_cache_ttl_seconds
+
+# Process local sub -> user id. The TTL bounds staleness for workers that
+# miss an invalidation broadcast.
+user_ids_by_sub: TTLCache[int] = TTLCache(
+    maxsize=user_identity_cache_size,
+    ttl_seconds=user_identity_cache_ttl_seconds,
+)
+
+# Called with the sub on every local invalidation so other workers can be told
+# to drop it, e.g. by publishing on a pub/sub channel that calls
+# invalidate_request_user(sub, broadcast=False) on receipt.
+invalidation_hooks: List[Callable[[str], None]] = []
 
 
 class RequestUser:
@@ -16,6 +31,20 @@ class RequestUser:
 
 
 def get_request_user_by_sub(session: Session, sub: str) -> RequestUser:
+    user_id = user_ids_by_sub.get(sub)
+    if user_id is not None:
+        return RequestUser(sub=sub, id=user_id)
+    return _load_request_user(session, sub)
+
+
+async def aget_request_user_by_sub(session: Session, sub: str) -> RequestUser:
+    user_id = user_ids_by_sub.get(sub)
+    if user_id is not None:
+        return RequestUser(sub=sub, id=user_id)
+    return await run_in_threadpool(_load_request_user, session, sub)
+
+
+def _load_request_user(session: Session, sub: str) -> RequestUser:
     request_user = RequestUser(sub=sub)
 
     stmt = select(schema.users.User).where(schema.users.User.sub == sub)
@@ -23,6 +52,7 @@ def get_request_user_by_sub(session: Session, sub: str) -> RequestUser:
 
     if user:
         inject_request_user(request_user, user)
+        user_ids_by_sub.set(sub, user.id)
 
     return request_user
 
@@ -32,3 +62,18 @@ def inject_request_user(
     user: schema.users.User,
 ):
     request_user.id = user.id
+
+
+def register_invalidation_hook(hook: Callable[[str], None]):
+    invalidation_hooks.append(hook)
+
+
+def invalidate_request_user(sub: str, broadcast: bool = True):
+    user_ids_by_sub.delete(sub)
+    if not broadcast:
+        return
+    for hook in invalidation_hooks:
+        try:
+            hook(sub)
+        except Exception as e:  # pylint: disable=W0703
+            print(f"User invalidation hook failed: {e}")
@@ -1,6 +1,62 @@
+import os
+from typing import List
+
 pg_host: str = "localhost"
 pg_user: str = "postgres"
 pg_password: str = "admin"
 auth0_domain: str = "https://dev-xlrahc2qy1wqddf8.us.auth0.com/"
 auth0_audience: str = "https://jericho.dev.com"
-alembic_dir: str = "/Users/achew/bibli/jericho/app/src/db/alembic"
+alembic_dir: str = os.path.join(os.path.dirname(__file__), "db", "alembic")
+jwks_cache_ttl_seconds: int = 600
+jwks_miss_refresh_interval_seconds: int = 30
+verified_token_cache_size: int = 10000
+user_identity_cache_size: int = 10000
+user_identity_cache_ttl_seconds: int = 300
+pg_echo: bool = False
+pg_pool_size: int = 10
+pg_max_overflow: int = 20
+pg_pool_timeout_seconds: float = 10
+pg_pool_recycle_seconds: int = 1800
+pg_pool_pre_ping: bool = True
+pg_replica_hosts: List[str] = []
+pg_replica_max_lag_seconds: float = 5
+pg_replica_lag_check_interval_seconds: float = 5
+environment: str = "dev"
+slow_query_threshold_seconds: float = 0.2
+n_plus_one_threshold: int = 5
+local_search_min_results: int = 10
+google_search_cache_size: int = 1000
+google_search_cache_ttl_seconds: int = 86400
+google_search_cache_max_rows: int = 100000
+google_fetch_concurrency: int = 8
+tag_backfill_batch_size: int = 200
+job_workers: int = 2
+job_poll_interval_seconds: float = 1.0
+job_max_attempts: int = 5
+job_retry_backoff_seconds: float = 30
+job_lease_seconds: float = 600
+job_deferred_max_keys: int = 10000
+tag_enrichment_batch_size: int = 50
+google_prefetch_workers: int = 2
+book_refresh_ttl_seconds: int = 604800
+book_refresh_batch_size: int = 20
+cover_cache_dir: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".covers")
+cover_widths: List[int] = [128, 256, 512]
+cover_default_width: int = 256
+cover_resize_workers: int = 2
+cover_fetch_timeout_seconds: float = 10
+cover_max_bytes: int = 5 * 1024 * 1024
+cover_max_age_seconds: int = 604800
+cover_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+cover_cache_prune_interval_seconds: float = 600
+import_upload_dir: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".imports")
+import_batch_size: int = 100
+import_max_bytes: int = 50 * 1024 * 1024
+import_workers: int = 2
+import_heartbeat_timeout_seconds: int = 300
+typeahead_max_results: int = 10
+typeahead_max_key_chars: int = 32
+typeahead_sync_interval_seconds: float = 2
+typeahead_sync_batch_size: int = 5000
+typeahead_rebuild_interval_seconds: int = 86400
+typeahead_gap_timeout_seconds: float = 600
@@ -1,35 +1,64 @@
 import pytest
 from fastapi.testclient import TestClient
 from psycopg import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from main import app
-from src.database import get_session
+from src.auth.local_jwks import LocalJWKS
+from src.database import get_async_read_session, get_async_session, get_session
 
+TEST_USER_SUB = "auth0|test"
 
-@pytest.fixture(name="session")
-def session_fixture(postgresql: Connection):
-    url = (
-        f"postgresql+psycopg2://"
+
+def _postgresql_url(postgresql: Connection, driver: str) -> str:
+    return (
+        f"postgresql+{driver}://"
         f"{postgresql.info.user}:"
         f"{postgresql.info.password}@"
         f"{postgresql.info.host}:"
         f"{postgresql.info.port}/"
         f"{postgresql.info.dbname}"
     )
-    engine = create_engine(url)
+
+
+@pytest.fixture(name="session")
+def session_fixture(postgresql: Connection):
+    engine = create_engine(_postgresql_url(postgresql, "psycopg2"))
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
 
 
+@pytest.fixture(name="local_jwks", scope="session")
+def local_jwks_fixture():
+    local_jwks = LocalJWKS()
+    local_jwks.install()
+    return local_jwks
+
+
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, local_jwks: LocalJWKS, postgresql: Connection):
     def get_session_override():
         return session
 
+    # The test client runs every request on a fresh event loop, so async
+    # connections are not pooled across requests.
+    async_engine = create_async_engine(_postgresql_url(postgresql, "asyncpg"), poolclass=NullPool)
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine) as async_session:
+            yield async_session
+
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_async_read_session] = get_async_session_override
 
-    client = TestClient(app)
+    client = TestClient(
+        app,
+        headers={"Authorization": f"Bearer {local_jwks.mint(TEST_USER_SUB)}"},
+    )
     yield client
     app.dependency_overrides.clear()
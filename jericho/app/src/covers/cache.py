@@ -0,0 +1,297 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+from PIL import Image
+
+from src import metrics
+from src.config import (
+    cover_cache_dir,
+    cover_cache_max_bytes,
+    cover_cache_prune_interval_seconds,
+    cover_fetch_timeout_seconds,
+    cover_max_bytes,
+    cover_resize_workers,
+    cover_widths,
+)
+
+cover_lookups = metrics.counter(
+    "cover_lookups_total",
+    "Cover requests, by the cache tier that answered them.",
+    ["result"],
+)
+cover_pruned_bytes = metrics.counter(
+    "cover_pruned_bytes_total",
+    "Bytes of covers deleted to keep the cache under its size.",
+)
+cover_fetch_seconds = metrics.histogram(
+    "cover_fetch_seconds",
+    "Time to fetch a cover from its origin.",
+)
+cover_resize_seconds = metrics.histogram(
+    "cover_resize_seconds",
+    "Time to resize a cover, including the process hop.",
+)
+
+
+def fetch_cover(url: str) -> bytes:
+    response = requests.get(url, timeout=cover_fetch_timeout_seconds, stream=True)
+    response.raise_for_status()
+    content = response.raw.read(cover_max_bytes + 1, decode_content=True)
+    if len(content) > cover_max_bytes:
+        raise ValueError(f"Cover at {url} is over {cover_max_bytes} bytes")
+    return content
+
+
+def resize_cover(original_path: str, variant_path: str, width: int):
+    """Writes a JPEG of the original at most width wide. Runs in the resize processes."""
+    with Image.open(original_path) as image:
+        image = image.convert("RGB")
+        image.thumbnail((width, width * 4))
+        _write_atomically(
+            variant_path, lambda f: image.save(f, format="JPEG", quality=85, optimize=True),
+        )
+
+
+def _write_atomically(path: str, write: Callable):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# A prune deletes covers down to this fraction of max_bytes, so the next
+# few fetches do not start another.
+PRUNE_TARGET = 0.9
+
+
+def _mark_used(path: str) -> bool:
+    """Bumps the mtime pruning goes by, False if path does not exist."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class Cover:
+    def __init__(self, path: str, etag: str):
+        self.path = path
+        # Strong, the bytes at path never change for a given etag.
+        self.etag = etag
+
+
+class CoverCache:
+    """Book covers on local disk, fetched from their origin once.
+
+    Originals are stored by the sha256 of their content, so covers shared
+    by several books or URLs are stored once, and an index maps each
+    source URL to its digest. Resized variants are JPEGs next to the
+    original, made in a process pool to keep the event loop and the GIL
+    free. Concurrent requests for the same URL or variant share one fetch
+    or resize.
+
+    A background thread keeps the cache under max_bytes, deleting the
+    least recently used originals along with their variants.
+    """
+
+    def __init__(
+        self,
+        root: str = cover_cache_dir,
+        fetch: Callable[[str], bytes] = fetch_cover,
+        widths: List[int] = cover_widths,
+        resize_workers: int = cover_resize_workers,
+        max_bytes: int = cover_cache_max_bytes,
+        prune_interval_seconds: float = cover_cache_prune_interval_seconds,
+    ):
+        self.root = root
+        self.fetch = fetch
+        self.widths = widths
+        self.resize_workers = resize_workers
+        self.max_bytes = max_bytes
+        self.prune_interval_seconds = prune_interval_seconds
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._locks: Dict[str, List] = {}
+        self._locks_lock = threading.Lock()
+        self._pruner: Optional[threading.Thread] = None
+
+    def get(self, url: str, width: int) -> Cover:
+        """The cover at url resized to width, which must be one of widths."""
+        if width not in self.widths:
+            raise ValueError(f"Unsupported cover width {width}")
+
+        digest = self._read_index(url)
+        if digest is not None and _mark_used(self._variant_path(digest, width)):
+            cover_lookups.inc(result="variant")
+            return Cover(self._variant_path(digest, width), f'"{digest}-w{width}"')
+
+        digest, fetched = self._digest_of(url)
+        variant_path = self._variant_path(digest, width)
+        with self._lock(variant_path):
+            if os.path.exists(variant_path):
+                # Made by a concurrent request.
+                result = "variant"
+            else:
+                result = "origin" if fetched else "original"
+                with cover_resize_seconds.time():
+                    self._resize_pool().submit(
+                        resize_cover, self._original_path(digest), variant_path, width,
+                    ).result()
+        cover_lookups.inc(result=result)
+        return Cover(variant_path, f'"{digest}-w{width}"')
+
+    def etag(self, url: str, width: int) -> Optional[str]:
+        """The etag of a cover already cached, without fetching anything."""
+        digest = self._read_index(url)
+        if digest is None or not os.path.exists(self._variant_path(digest, width)):
+            return None
+        return f'"{digest}-w{width}"'
+
+    def prune(self) -> int:
+        """Deletes the least recently used covers until the cache is under
+        max_bytes, returns how many bytes it freed.
+        """
+        # Each original and its variants, by digest: last used, size and paths.
+        covers: Dict[str, List] = {}
+        total = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "objects")):
+            for name in filenames:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                cover = covers.setdefault(name.split("-")[0], [0.0, 0, []])
+                cover[0] = max(cover[0], stat.st_mtime)
+                cover[1] += stat.st_size
+                cover[2].append(path)
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        freed = 0
+        deleted: Set[str] = set()
+        for digest, (_, size, paths) in sorted(covers.items(), key=lambda item: item[1][0]):
+            if total - freed <= self.max_bytes * PRUNE_TARGET:
+                break
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            freed += size
+            deleted.add(digest)
+
+        # Index entries of deleted covers, fetched again if asked for.
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "urls")):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    with open(path, "rb") as f:
+                        if f.read().decode() in deleted:
+                            os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        cover_pruned_bytes.inc(freed)
+        return freed
+
+    def start(self):
+        if self._pruner is not None:
+            return
+        self._pruner = threading.Thread(target=self._run_pruner, name="cover-prune", daemon=True)
+        self._pruner.start()
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _run_pruner(self):
+        while True:
+            try:
+                self.prune()
+            except Exception as e:  # pylint: disable=W0703
+                print(f"Cover cache prune failed: {e}")
+            time.sleep(self.prune_interval_seconds)
+
+    def _digest_of(self, url: str) -> Tuple[str, bool]:
+        """The digest of the original at url, and whether it was fetched for it."""
+        digest = self._read_index(url)
+        if digest is not None and os.path.exists(self._original_path(digest)):
+            return digest, False
+
+        with self._lock(url):
+            digest = self._read_index(url)
+            # The original may have been pruned since it was indexed.
+            if digest is not None and os.path.exists(self._original_path(digest)):
+                return digest, False
+            with cover_fetch_seconds.time():
+                content = self.fetch(url)
+            digest = hashlib.sha256(content).hexdigest()
+            original_path = self._original_path(digest)
+            if not os.path.exists(original_path):
+                _write_atomically(original_path, lambda f: f.write(content))
+            _write_atomically(self._index_path(url), lambda f: f.write(digest.encode()))
+            return digest, True
+
+    def _read_index(self, url: str) -> Optional[str]:
+        try:
+            with open(self._index_path(url), "rb") as f:
+                return f.read().decode()
+        except FileNotFoundError:
+            return None
+
+    def _index_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.root, "urls", key[:2], key)
+
+    def _original_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def _variant_path(self, digest: str, width: int) -> str:
+        return f"{self._original_path(digest)}-w{width}.jpg"
+
+    def _resize_pool(self) -> ProcessPoolExecutor:
+        # Started on first use, not at import.
+        with self._pool_lock:
+            if self._pool is None:
+                # Spawned, forking a process with running threads is unsafe.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.resize_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    @contextmanager
+    def _lock(self, key: str) -> Iterator[None]:
+        # One lock per key, dropped once nobody holds or waits on it.
+        with self._locks_lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+cover_cache = CoverCache()
@@ -0,0 +1,63 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from PIL import Image
+
+
+def make_cover(width: int = 600, height: int = 900, color: str = "teal") -> bytes:
+    image = Image.new("RGB", (width, height), color)
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class LocalCoverOrigin:
+    """Offline stand-in for the image hosts cover links point at.
+
+    Serves covers added with add over HTTP on a local port and counts the
+    requests for each, so tests and benchmarks can fetch covers without
+    network access.
+    """
+
+    def __init__(self):
+        self.covers: Dict[str, bytes] = {}
+        self.requests: Dict[str, int] = {}
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=C0103
+                origin.requests[self.path] = origin.requests.get(self.path, 0) + 1
+                content = origin.covers.get(self.path)
+                if content is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def add(self, path: str, content: bytes) -> str:
+        """Serves content at path and returns its URL."""
+        self.covers[path] = content
+        return self.url(path)
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self) -> "LocalCoverOrigin":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
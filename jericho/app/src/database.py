@@ -1,8 +1,31 @@
 from alembic import command
 from alembic.config import Config
+from fastapi import Request
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.config import pg_host, pg_password, pg_user, alembic_dir
+from src import metrics
+from src.config import (
+    alembic_dir,
+    pg_echo,
+    pg_host,
+    pg_max_overflow,
+    pg_password,
+    pg_pool_pre_ping,
+    pg_pool_recycle_seconds,
+    pg_pool_size,
+    pg_pool_timeout_seconds,
+    pg_replica_hosts,
+    pg_replica_lag_check_interval_seconds,
+    pg_replica_max_lag_seconds,
+    pg_user,
+)
+from src.db import instrumentation
+from src.db.jobs import JobWorkerPool
+from src.db.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, pool_status
+from src.db.routing import Replica, ReplicaRouter
 
 from src.db.schema import *  # needed for autogeneration
 
@@ -12,14 +35,98 @@ def get_session():
         yield session
 
 
-# TODO(arden) use Alembic migrations.
+async def get_async_session():
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+
+# Set by clients that must see their own writes, e.g. right after a PUT.
+READ_AFTER_WRITE_HEADER = "X-Read-After-Write"
+
+
+async def get_async_read_session(request: Request):
+    """Session for read only work, served by a replica when one is healthy."""
+    replica = None
+    if not request.headers.get(READ_AFTER_WRITE_HEADER):
+        replica = replica_router.pick()
+    bind = replica.async_engine if replica else async_engine
+    async with AsyncSession(bind) as session:
+        yield session
+
+
 def create_db_and_tables():
+    # The init revision is empty, tables still come from the models and
+    # migrations add what create_all cannot, e.g. indexes on existing tables.
     SQLModel.metadata.create_all(engine)
-    # alembic_config = Config(alembic_dir + '.ini')
-    # alembic_config.set_main_option('sqlalchemy.url', pg_url)
-    # alembic_config.set_main_option('script_location', alembic_dir)
-    # command.upgrade(alembic_config, "head")
+    with engine.begin() as connection:
+        run_migrations(connection)
+
+
+def run_migrations(connection, revision: str = "head"):
+    alembic_config = Config(alembic_dir + '.ini')
+    alembic_config.set_main_option('script_location', alembic_dir)
+    alembic_config.attributes["connection"] = connection
+    alembic_config.attributes["configure_logger"] = False
+    command.upgrade(alembic_config, revision)
+
+
+pool_kwargs = dict(
+    pool_size=pg_pool_size,
+    max_overflow=pg_max_overflow,
+    pool_timeout=pg_pool_timeout_seconds,
+    pool_recycle=pg_pool_recycle_seconds,
+    pool_pre_ping=pg_pool_pre_ping,
+)
+
+
+def _pg_url(host: str, driver: str = "postgresql") -> str:
+    return f"{driver}://{pg_user}:{pg_password}@{host}:5432/jericho"
+
+
+pg_url = _pg_url(pg_host)
+
+instrumentation.install()
+engine = create_engine(pg_url, echo=pg_echo, poolclass=InstrumentedQueuePool, **pool_kwargs)
+
+pg_async_url = _pg_url(pg_host, "postgresql+asyncpg")
+async_engine = create_async_engine(
+    pg_async_url,
+    echo=pg_echo,
+    poolclass=InstrumentedAsyncQueuePool,
+    **pool_kwargs,
+)
+
+replica_router = ReplicaRouter(
+    [
+        Replica(
+            host=host,
+            # Only used for lag checks.
+            engine=create_engine(_pg_url(host), poolclass=NullPool),
+            async_engine=create_async_engine(
+                _pg_url(host, "postgresql+asyncpg"),
+                echo=pg_echo,
+                poolclass=InstrumentedAsyncQueuePool,
+                pool_logging_name=f"replica_{host}",
+                **pool_kwargs,
+            ),
+        )
+        for host in pg_replica_hosts
+    ],
+    max_lag_seconds=pg_replica_max_lag_seconds,
+    check_interval_seconds=pg_replica_lag_check_interval_seconds,
+)
 
+job_worker_pool = JobWorkerPool(lambda: Session(engine))
 
-pg_url = f"postgresql://{pg_user}:{pg_password}@{pg_host}:5432/jericho"
-engine = create_engine(pg_url, echo=True)
+metrics.gauge("db_pool", "Primary connection pool status.", lambda: pool_status(engine.pool))
+metrics.gauge(
+    "db_async_pool",
+    "Primary async connection pool status.",
+    lambda: pool_status(async_engine.pool),
+)
+metrics.gauge(
+    "db_replica_lag_seconds",
+    "Measured replication lag per replica, -1 when unknown.",
+    replica_router.lag,
+    labelname="replica",
+)
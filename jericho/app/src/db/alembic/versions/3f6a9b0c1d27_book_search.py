@@ -0,0 +1,54 @@
+"""book search
+
+Revision ID: 3f6a9b0c1d27
+Revises: 8c1d4e2f7a90
+Create Date: 2026-10-18 08:41:09.337612
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a9b0c1d27'
+down_revision: Union[str, None] = '8c1d4e2f7a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS since create_all already builds the table on new databases.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS booksearch (
+            book_id INTEGER NOT NULL PRIMARY KEY REFERENCES book (id),
+            document TSVECTOR NOT NULL
+        )
+    """)
+    op.create_index(
+        "ix_booksearch_document",
+        "booksearch",
+        ["document"],
+        postgresql_using="gin",
+        if_not_exists=True,
+    )
+
+    # Backfill, kept in step with INDEX_BOOKS_SQL in src/domain/utils/search.py.
+    op.execute("""
+        INSERT INTO booksearch (book_id, document)
+        SELECT
+            book.id,
+            setweight(to_tsvector('simple', coalesce(book.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(book.subtitle, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(string_agg(author.name, ' '), '')), 'B')
+        FROM book
+        LEFT JOIN authorbooklink ON authorbooklink.book_id = book.id
+        LEFT JOIN author ON author.id = authorbooklink.author_id
+        GROUP BY book.id
+        ON CONFLICT (book_id) DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_booksearch_document", table_name="booksearch")
+    op.drop_table("booksearch")
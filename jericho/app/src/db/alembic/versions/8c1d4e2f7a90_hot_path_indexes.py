@@ -0,0 +1,94 @@
+"""hot path indexes
+
+Revision ID: 8c1d4e2f7a90
+Revises: 5b5ceb7f8572
+Create Date: 2026-10-18 08:02:41.519204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d4e2f7a90'
+down_revision: Union[str, None] = '5b5ceb7f8572'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Not part of SQLModel.metadata, env.py keeps autogenerate from dropping them.
+TRIGRAM_INDEXES = {
+    "ix_user_name_trgm": "name",
+    "ix_user_tag_trgm": "tag",
+}
+
+
+def upgrade() -> None:
+    # if_not_exists since create_all already builds the metadata indexes on new databases.
+    op.create_index(
+        "ix_review_user_id_reaction_rank",
+        "review",
+        ["user_id", "reaction", "rank"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_collectionbooklink_book_id", "collectionbooklink", ["book_id"], if_not_exists=True
+    )
+    op.create_index(
+        "ix_userlink_child_id_type", "userlink", ["child_id", "type"], if_not_exists=True
+    )
+    op.create_index(
+        "ix_addtocollectionactivity_user_id",
+        "addtocollectionactivity",
+        ["user_id"],
+        if_not_exists=True,
+    )
+    op.create_index("ix_reviewactivity_user_id", "reviewactivity", ["user_id"], if_not_exists=True)
+    op.create_index(
+        "ix_followuseractivity_follower_user_id",
+        "followuseractivity",
+        ["follower_user_id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_activity_created_at_desc_id",
+        "activity",
+        [sa.text("created_at DESC"), "id"],
+        if_not_exists=True,
+    )
+
+    # Backs the ilike prefix search on user name and tag. Creating the
+    # extension needs privileges the app role may not have, so it is left
+    # to a database owner, and the indexes to when it is installed.
+    connection = op.get_bind()
+    installed = connection.execute(
+        sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    ).scalar()
+    if not installed:
+        print(
+            "pg_trgm is not installed, skipping trigram indexes on user name and tag. "
+            "Run CREATE EXTENSION pg_trgm as a database owner, then create them by hand."
+        )
+        return
+    for name, column in TRIGRAM_INDEXES.items():
+        op.create_index(
+            name,
+            "user",
+            [column],
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    for name in TRIGRAM_INDEXES:
+        op.drop_index(name, table_name="user", if_exists=True)
+    op.drop_index("ix_activity_created_at_desc_id", table_name="activity")
+    op.drop_index("ix_followuseractivity_follower_user_id", table_name="followuseractivity")
+    op.drop_index("ix_reviewactivity_user_id", table_name="reviewactivity")
+    op.drop_index("ix_addtocollectionactivity_user_id", table_name="addtocollectionactivity")
+    op.drop_index("ix_userlink_child_id_type", table_name="userlink")
+    op.drop_index("ix_collectionbooklink_book_id", table_name="collectionbooklink")
+    op.drop_index("ix_review_user_id_reaction_rank", table_name="review")
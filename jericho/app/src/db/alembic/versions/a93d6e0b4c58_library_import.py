@@ -0,0 +1,53 @@
+"""library import
+
+Revision ID: a93d6e0b4c58
+Revises: f2a7c05e9b13
+Create Date: 2026-10-18 13:02:44.508173
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93d6e0b4c58'
+down_revision: Union[str, None] = 'f2a7c05e9b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS since create_all already builds the table on new databases.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS libraryimport (
+            size_bytes INTEGER NOT NULL,
+            processed_bytes INTEGER NOT NULL,
+            rows_processed INTEGER NOT NULL,
+            rows_failed INTEGER NOT NULL,
+            books_imported INTEGER NOT NULL,
+            reviews_imported INTEGER NOT NULL,
+            error VARCHAR,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            finished_at TIMESTAMP WITHOUT TIME ZONE,
+            id SERIAL NOT NULL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES "user" (id),
+            format VARCHAR NOT NULL,
+            status VARCHAR NOT NULL,
+            path VARCHAR NOT NULL,
+            heartbeat_at TIMESTAMP WITHOUT TIME ZONE,
+            review_tiers JSONB NOT NULL
+        )
+    """)
+    op.create_index("ix_libraryimport_user_id", "libraryimport", ["user_id"], if_not_exists=True)
+
+    # Imports resolve their rows by ISBN.
+    op.create_index("ix_book_isbn13", "book", ["isbn13"], if_not_exists=True)
+    op.create_index("ix_book_isbn10", "book", ["isbn10"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_book_isbn10", table_name="book")
+    op.drop_index("ix_book_isbn13", table_name="book")
+    op.drop_index("ix_libraryimport_user_id", table_name="libraryimport")
+    op.drop_table("libraryimport")
@@ -0,0 +1,40 @@
+"""google search cache
+
+Revision ID: b27e5d1a9c44
+Revises: 3f6a9b0c1d27
+Create Date: 2026-10-18 09:12:53.804115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b27e5d1a9c44'
+down_revision: Union[str, None] = '3f6a9b0c1d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS since create_all already builds the table on new databases.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS googlesearchcache (
+            key VARCHAR NOT NULL PRIMARY KEY,
+            gids VARCHAR[] NOT NULL,
+            total_results INTEGER NOT NULL,
+            expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+    """)
+    op.create_index(
+        "ix_googlesearchcache_expires_at",
+        "googlesearchcache",
+        ["expires_at"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_googlesearchcache_expires_at", table_name="googlesearchcache")
+    op.drop_table("googlesearchcache")
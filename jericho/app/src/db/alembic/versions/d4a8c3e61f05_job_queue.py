@@ -0,0 +1,52 @@
+"""job queue
+
+Revision ID: d4a8c3e61f05
+Revises: b27e5d1a9c44
+Create Date: 2026-10-18 09:58:27.116590
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c3e61f05'
+down_revision: Union[str, None] = 'b27e5d1a9c44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS since create_all already builds the table on new databases.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS job (
+            id SERIAL NOT NULL PRIMARY KEY,
+            kind VARCHAR NOT NULL,
+            key VARCHAR NOT NULL,
+            attempts INTEGER NOT NULL,
+            run_after TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            last_error VARCHAR,
+            finished_at TIMESTAMP WITHOUT TIME ZONE,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            UNIQUE (kind, key)
+        )
+    """)
+    op.create_index("ix_job_kind_run_after", "job", ["kind", "run_after"], if_not_exists=True)
+
+    # Existing books without tags are enriched by the workers.
+    op.execute("""
+        INSERT INTO job (kind, key, attempts, run_after, created_at)
+        SELECT
+            'tag_enrichment', book.id::text, 0,
+            now() at time zone 'utc', now() at time zone 'utc'
+        FROM book
+        WHERE book.gid IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM tagbooklink WHERE tagbooklink.book_id = book.id)
+        ON CONFLICT (kind, key) DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_job_kind_run_after", table_name="job")
+    op.drop_table("job")
@@ -0,0 +1,44 @@
+"""collection book added at
+
+Revision ID: e61b9f2c7d38
+Revises: d4a8c3e61f05
+Create Date: 2026-10-18 11:02:44.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61b9f2c7d38'
+down_revision: Union[str, None] = 'd4a8c3e61f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Books already in a collection count as added now, ties are broken by id.
+    op.execute("""
+        ALTER TABLE collectionbooklink
+        ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        DEFAULT (now() at time zone 'utc')
+    """)
+    op.execute("ALTER TABLE collectionbooklink ALTER COLUMN created_at DROP DEFAULT")
+    op.create_index(
+        "ix_collectionbooklink_collection_id_created_at",
+        "collectionbooklink",
+        ["collection_id", "created_at", "book_id"],
+        if_not_exists=True,
+    )
+    # Title order pages by keyset on (title, id), which skips NULL titles.
+    op.execute("UPDATE book SET title = '' WHERE title IS NULL")
+    op.alter_column("book", "title", nullable=False)
+    op.create_index("ix_book_title_id", "book", ["title", "id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    # book.title stays NOT NULL, as the model declares it.
+    op.drop_index("ix_book_title_id", table_name="book")
+    op.drop_index("ix_collectionbooklink_collection_id_created_at", table_name="collectionbooklink")
+    op.drop_column("collectionbooklink", "created_at")
@@ -0,0 +1,26 @@
+"""book refreshed at
+
+Revision ID: f2a7c05e9b13
+Revises: e61b9f2c7d38
+Create Date: 2026-10-18 11:47:09.362815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c05e9b13'
+down_revision: Union[str, None] = 'e61b9f2c7d38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing books were never refreshed and are refetched when next read.
+    op.execute("ALTER TABLE book ADD COLUMN IF NOT EXISTS refreshed_at TIMESTAMP WITHOUT TIME ZONE")
+
+
+def downgrade() -> None:
+    op.drop_column("book", "refreshed_at")
@@ -0,0 +1,148 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src import metrics
+from src.config import n_plus_one_threshold, slow_query_threshold_seconds
+
+logger = logging.getLogger(__name__)
+
+db_query_seconds = metrics.histogram("db_query_seconds", "Statement execution time.")
+db_slow_queries = metrics.counter(
+    "db_slow_queries_total",
+    "Statements slower than the slow query threshold.",
+)
+db_request_queries = metrics.histogram(
+    "db_request_queries",
+    "Statements executed per request.",
+    ["route"],
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+db_request_seconds = metrics.histogram(
+    "db_request_seconds",
+    "Total statement execution time per request.",
+    ["route"],
+)
+db_n_plus_one = metrics.counter(
+    "db_n_plus_one_total",
+    "Requests that repeated a statement shape at least n_plus_one_threshold times.",
+    ["route"],
+)
+
+_IN_LIST = re.compile(r"IN \((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+_PARAM = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Statement text with parameters and expanded IN lists collapsed."""
+    shape = _IN_LIST.sub("IN (?)", statement)
+    shape = _PARAM.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: List[str] = []
+        self.shapes: Counter = Counter()
+        self.slow: List[Tuple[str, float]] = []
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements.append(statement)
+        self.shapes[statement_shape(statement)] += 1
+        if seconds >= slow_query_threshold_seconds:
+            self.slow.append((statement, seconds))
+
+    def n_plus_one(self, threshold: int = n_plus_one_threshold) -> Dict[str, int]:
+        """Statement shapes repeated at least threshold times."""
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Collects every statement executed in this context, including thread
+    pool and AsyncSession.run_sync work started from it."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def report_request(stats: QueryStats, route: str, headers: Optional[Dict[str, str]] = None):
+    """Records a request's query stats as metrics, and as response headers when given."""
+    repeated = stats.n_plus_one()
+    for shape, count in repeated.items():
+        logger.warning("Possible N+1 on %s, %d executions of: %s", route, count, shape)
+
+    if headers is not None:
+        headers["X-DB-Query-Count"] = str(stats.count)
+        headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.1f}"
+        headers["X-DB-N-Plus-One"] = str(len(repeated))
+        return
+
+    db_request_queries.observe(stats.count, route=route)
+    db_request_seconds.observe(stats.seconds, route=route)
+    if repeated:
+        db_n_plus_one.inc(route=route)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int) -> Iterator[QueryStats]:
+    with track_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{stats.count} queries executed, budget is {max_queries}:\n" +
+            "\n".join(stats.statements)
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start_time"].pop()
+    db_query_seconds.observe(seconds)
+    if seconds >= slow_query_threshold_seconds:
+        db_slow_queries.inc()
+        logger.warning("Slow query (%.3fs): %s", seconds, _WHITESPACE.sub(" ", statement))
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not fire for failed statements.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+def install():
+    """Instruments every engine, including test engines and the sync side of async engines."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
@@ -0,0 +1,258 @@
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, select
+
+import src.db.schema as schema
+from src import metrics
+from src.config import (
+    job_deferred_max_keys,
+    job_lease_seconds,
+    job_max_attempts,
+    job_poll_interval_seconds,
+    job_retry_backoff_seconds,
+    job_workers,
+)
+from src.db.unit_of_work import unit_of_work
+
+# Runs a batch of jobs of one kind and returns the keys that failed and
+# should be retried, if any. Raising fails the whole batch. Called with no
+# transaction open, handlers commit their own writes.
+JobHandler = Callable[[Session, List[str]], Optional[Iterable[str]]]
+
+
+class _Registration:
+    def __init__(self, handler: JobHandler, batch_size: int):
+        self.handler = handler
+        self.batch_size = batch_size
+
+
+handlers: Dict[str, _Registration] = {}
+
+# Keys by kind from enqueue_later, not written yet.
+_deferred: Dict[str, Set[str]] = {}
+_deferred_lock = threading.Lock()
+# The started pools, which drain _deferred.
+_running: Set["JobWorkerPool"] = set()
+
+jobs_processed = metrics.counter(
+    "jobs_processed_total",
+    "Background jobs processed, by kind and result.",
+    ["kind", "result"],
+)
+jobs_deferred_dropped = metrics.counter(
+    "jobs_deferred_dropped_total",
+    "Jobs enqueue_later dropped, by kind and reason.",
+    ["kind", "reason"],
+)
+job_batch_seconds = metrics.histogram("job_batch_seconds", "Time to run a batch of jobs.", ["kind"])
+
+
+def register_handler(kind: str, handler: JobHandler, batch_size: int = 1):
+    handlers[kind] = _Registration(handler, batch_size)
+
+
+def enqueue(session: Session, kind: str, keys: Iterable[str]):
+    """Adds jobs in one statement. A job that is already pending is left alone,
+    finished and dead jobs are started over.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    now = datetime.utcnow()
+    stmt = insert(schema.jobs.Job).values(
+        [
+            {"kind": kind, "key": key, "attempts": 0, "run_after": now, "created_at": now}
+            for key in keys
+        ]
+    )
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["kind", "key"],
+        set_={"attempts": 0, "run_after": now, "last_error": None, "finished_at": None},
+        where=(
+            col(schema.jobs.Job.finished_at).is_not(None) |
+            (schema.jobs.Job.attempts >= job_max_attempts)
+        ),
+    ))
+
+
+def enqueue_later(kind: str, keys: Iterable[str], max_keys: int = job_deferred_max_keys):
+    """Buffers jobs in memory for the worker pool to enqueue on its next poll.
+
+    For callers that must not write, e.g. reads served by a replica. Keys
+    buffered more than once are enqueued once. Keys are dropped when no
+    pool runs in this process to enqueue them, or past max_keys buffered.
+    """
+    keys = set(keys)
+    if not _running:
+        jobs_deferred_dropped.inc(len(keys), kind=kind, reason="no_workers")
+        return
+    with _deferred_lock:
+        buffered = _deferred.setdefault(kind, set())
+        new = keys - buffered
+        room = max(max_keys - sum(len(k) for k in _deferred.values()), 0)
+        kept = set(itertools.islice(new, room))
+        buffered.update(kept)
+    if len(new) > len(kept):
+        jobs_deferred_dropped.inc(len(new) - len(kept), kind=kind, reason="full")
+
+
+def enqueue_deferred(session: Session):
+    """Enqueues the jobs buffered by enqueue_later."""
+    with _deferred_lock:
+        deferred = dict(_deferred)
+        _deferred.clear()
+    for kind, keys in deferred.items():
+        enqueue(session, kind, keys)
+
+
+def pending(session: Session, kind: str, keys: Iterable[str]) -> Set[str]:
+    """The keys with a job that is still queued, running or retrying."""
+    stmt = select(schema.jobs.Job.key).where(
+        (schema.jobs.Job.kind == kind) &
+        col(schema.jobs.Job.key).in_(list(keys)) &
+        col(schema.jobs.Job.finished_at).is_(None) &
+        (schema.jobs.Job.attempts < job_max_attempts)
+    )
+    return set(session.exec(stmt).all())
+
+
+class JobWorkerPool:
+    """Threads that claim jobs with SELECT ... FOR UPDATE SKIP LOCKED.
+
+    A claim leases a batch in a short transaction, moving run_after past
+    the lease and counting the attempt, so workers, including those of
+    other processes, skip it. The handler then runs with no transaction
+    open and a second short transaction records the results. A crashed
+    worker's jobs become claimable again once their lease runs out. Failed
+    jobs are retried with exponential backoff until max_attempts.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int = job_workers,
+        poll_interval_seconds: float = job_poll_interval_seconds,
+        max_attempts: int = job_max_attempts,
+        retry_backoff_seconds: float = job_retry_backoff_seconds,
+        lease_seconds: float = job_lease_seconds,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval_seconds = poll_interval_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+
+    def run_once(self) -> int:
+        """Runs at most one batch of every registered kind, returns the jobs run."""
+        if _deferred:
+            with self.session_factory() as session, unit_of_work(session):
+                enqueue_deferred(session)
+        return sum(
+            self._run_batch(kind, registration)
+            for kind, registration in list(handlers.items())
+        )
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        _running.add(self)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Waits for the workers to finish their batches and exit."""
+        self._stopping.set()
+        _running.discard(self)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:  # pylint: disable=W0703
+                print(f"Job worker failed: {e}")
+                ran = 0
+            if not ran:
+                self._stopping.wait(self.poll_interval_seconds)
+
+    def _run_batch(self, kind: str, registration: _Registration) -> int:
+        keys, leased_until = self._claim(kind, registration.batch_size)
+        if not keys:
+            return 0
+
+        error = None
+        try:
+            with job_batch_seconds.time(kind=kind), self.session_factory() as session:
+                failed = set(registration.handler(session, keys) or ()) & set(keys)
+        except Exception as e:  # pylint: disable=W0703
+            error = str(e)
+            failed = set(keys)
+
+        self._record(kind, keys, leased_until, failed, error)
+        jobs_processed.inc(len(keys) - len(failed), kind=kind, result="finished")
+        if failed:
+            jobs_processed.inc(len(failed), kind=kind, result="failed")
+        return len(keys)
+
+    def _claim(self, kind: str, batch_size: int) -> Tuple[List[str], datetime]:
+        """Leases a batch of due jobs, returns their keys and the lease's end."""
+        with self.session_factory() as session, unit_of_work(session):
+            now = datetime.utcnow()
+            stmt = select(schema.jobs.Job).where(
+                (schema.jobs.Job.kind == kind) &
+                col(schema.jobs.Job.finished_at).is_(None) &
+                (schema.jobs.Job.attempts < self.max_attempts) &
+                (schema.jobs.Job.run_after <= now)
+            ).order_by(
+                col(schema.jobs.Job.run_after), col(schema.jobs.Job.id),
+            ).limit(batch_size).with_for_update(skip_locked=True)
+            jobs = session.exec(stmt).all()
+
+            leased_until = now + timedelta(seconds=self.lease_seconds)
+            for job in jobs:
+                job.attempts += 1
+                job.run_after = leased_until
+                session.add(job)
+            return [job.key for job in jobs], leased_until
+
+    def _record(
+        self,
+        kind: str,
+        keys: List[str],
+        leased_until: datetime,
+        failed: Set[str],
+        error: Optional[str],
+    ):
+        """Marks the leased jobs finished, or failed to retry with backoff.
+
+        Jobs whose lease ran out and were claimed again, or that were
+        enqueued again, are left to their new run.
+        """
+        with self.session_factory() as session, unit_of_work(session):
+            now = datetime.utcnow()
+            stmt = select(schema.jobs.Job).where(
+                (schema.jobs.Job.kind == kind) &
+                col(schema.jobs.Job.key).in_(keys) &
+                col(schema.jobs.Job.finished_at).is_(None) &
+                (schema.jobs.Job.run_after == leased_until)
+            ).with_for_update()
+            for job in session.exec(stmt).all():
+                if job.key in failed:
+                    backoff = self.retry_backoff_seconds * 2 ** (job.attempts - 1)
+                    job.run_after = now + timedelta(seconds=backoff)
+                    job.last_error = error or "failed"
+                else:
+                    job.finished_at = now
+                session.add(job)
@@ -0,0 +1,101 @@
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Zero when everything received has been replayed, otherwise the age of the
+# last replayed transaction.
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class Replica:
+    def __init__(self, host: str, engine: Engine, async_engine: AsyncEngine):
+        self.host = host
+        self.engine = engine
+        self.async_engine = async_engine
+        # None until the first successful lag check, and after a failed one.
+        self.lag_seconds: Optional[float] = None
+
+
+class ReplicaRouter:
+    """Picks a replica for read only sessions.
+
+    Replicas are used round robin while their measured replication lag is
+    within max_lag_seconds; when none qualify reads go to the primary. Lag is
+    measured by a background thread so picking never blocks.
+    """
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        max_lag_seconds: float,
+        check_interval_seconds: float,
+        measure_lag: Optional[Callable[[Replica], float]] = None,
+    ):
+        self.replicas = replicas
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self.measure_lag = measure_lag or _measure_lag
+        self._round_robin = itertools.cycle(range(len(replicas))) if replicas else None
+        self._lock = threading.Lock()
+        self._checker: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def pick(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[next(self._round_robin)]
+                if replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag_seconds:
+                    return replica
+        return None
+
+    def check_lag(self):
+        for replica in self.replicas:
+            try:
+                replica.lag_seconds = self.measure_lag(replica)
+            except Exception as e:  # pylint: disable=W0703
+                print(f"Replica {replica.host} lag check failed: {e}")
+                replica.lag_seconds = None
+
+    def start(self):
+        if not self.replicas or self._checker is not None:
+            return
+        self._stopping.clear()
+        self.check_lag()
+        self._checker = threading.Thread(target=self._run_checker, name="replica-lag", daemon=True)
+        self._checker.start()
+
+    def stop(self):
+        if self._checker is None:
+            return
+        self._stopping.set()
+        self._checker.join()
+        self._checker = None
+
+    def lag(self) -> Dict[str, float]:
+        # Unknown lag is reported as -1 so unhealthy replicas stay visible.
+        return {
+            replica.host: replica.lag_seconds if replica.lag_seconds is not None else -1
+            for replica in self.replicas
+        }
+
+    def _run_checker(self):
+        while not self._stopping.wait(self.check_interval_seconds):
+            self.check_lag()
+
+
+def _measure_lag(replica: Replica) -> float:
+    with replica.engine.connect() as connection:
+        return float(connection.execute(REPLICA_LAG_QUERY).scalar())
@@ -4,3 +4,5 @@ import src.db.schema.collections
 import src.db.schema.reviews
 import src.db.schema.users
 import src.db.schema.filter
+import src.db.schema.jobs
+import src.db.schema.imports
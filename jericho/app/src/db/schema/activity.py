@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel, Column, DateTime
 from src.db.schema.users import UserRead, User
 from src.db.schema.collections import CollectionRead, Collection
@@ -10,7 +11,7 @@ from src.db.schema.books import BookRead, Book
 
 class FollowUserActivity(SQLModel, table=True):
     activity_id: int = Field(foreign_key="activity.id", primary_key=True)
-    follower_user_id: int = Field(foreign_key="user.id")
+    follower_user_id: int = Field(foreign_key="user.id", index=True)
     following_user_id: int = Field(foreign_key="user.id")
 
     follower: User = Relationship(
@@ -34,7 +35,7 @@ class FollowUserActivityRead(SQLModel):
 
 class ReviewActivity(SQLModel, table=True):
     activity_id: int = Field(foreign_key="activity.id", primary_key=True)
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
     review_id: int = Field(foreign_key="review.id")
 
     user: User = Relationship(
@@ -58,7 +59,7 @@ class ReviewActivityRead(SQLModel):
 
 class AddToCollectionActivity(SQLModel, table=True):
     activity_id: int = Field(foreign_key="activity.id", primary_key=True)
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
     collection_id: int = Field(foreign_key="collection.id")
     book_id: int = Field(foreign_key="book.id")
 
@@ -139,6 +140,10 @@ class Activity(SQLModel, table=True):
     comments: List[ActivityComment] = Relationship(back_populates="activity")
 
 
+# Matches the feed's (created_at desc, id asc) keyset ordering.
+Index("ix_activity_created_at_desc_id", Activity.created_at.desc(), Activity.id)
+
+
 class ActivityRead(SQLModel):
     id: int
     created_at: datetime
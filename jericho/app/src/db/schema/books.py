@@ -1,6 +1,9 @@
-from datetime import date
+from datetime import date, datetime
+from enum import Enum
 from typing import List, Optional
 
+from sqlalchemy import Index, String
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlmodel import Boolean, Column, Date, Field, Relationship, SQLModel
 
 from src.db.schema.reviews import ReviewRead
@@ -18,6 +21,13 @@ class Tag(SQLModel, table=True):
     name: str = Field(default=None, primary_key=True, unique=True)
 
 
+class BookTags(SQLModel):
+    book_id: int
+    tags: List[TagBookLink] = []
+    # True while the book's tags are still being fetched in the background.
+    pending: bool = False
+
+
 class AuthorBookLink(SQLModel, table=True):
     author_id: int = Field(
         default=None, primary_key=True, foreign_key="author.id"
@@ -49,16 +59,36 @@ class BookBase(SQLModel):
     pages: Optional[int] = None
     cover_link: Optional[str]
     gid: Optional[str] = Field(default=None, unique=True)
-    isbn13: Optional[str]
-    isbn10: Optional[str]
+    isbn13: Optional[str] = Field(default=None, index=True)
+    isbn10: Optional[str] = Field(default=None, index=True)
 
 
 class Book(BookBase, table=True):
+    __table_args__ = (Index("ix_book_title_id", "title", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # When the metadata was last fetched from Google, None if never.
+    refreshed_at: Optional[datetime] = None
     tag_links: List[TagBookLink] = Relationship(back_populates="book")
     authors: List[Author] = Relationship(back_populates="books", link_model=AuthorBookLink)
 
 
+class BookSearch(SQLModel, table=True):
+    """Full text search document over a book's title, subtitle and authors."""
+    __table_args__ = (Index("ix_booksearch_document", "document", postgresql_using="gin"),)
+
+    book_id: int = Field(primary_key=True, foreign_key="book.id")
+    document: str = Field(sa_column=Column(TSVECTOR, nullable=False))
+
+
+class GoogleSearchCache(SQLModel, table=True):
+    """A Google Books search result page, as the gids of its books in order."""
+    key: str = Field(primary_key=True)
+    gids: List[str] = Field(sa_column=Column(ARRAY(String), nullable=False))
+    total_results: int
+    expires_at: datetime = Field(index=True)
+
+
 class BookRead(BookBase):
     id: int
 
@@ -72,13 +102,49 @@ class UserBookRead(SQLModel):
     authors: List[AuthorRead] = []
 
 
+class BookBatch(SQLModel):
+    book_ids: List[int]
+    # Defaults to the requesting user.
+    user_id: Optional[int] = None
+
+
+class BookSort(str, Enum):
+    # Most recently added to the filtered collections first, or newest books
+    # first without a collection filter.
+    ADDED = "added"
+    TITLE = "title"
+
+
+class BookCursor(SQLModel):
+    """The first book of the next page, by the page's sort."""
+    id: int
+    added_at: Optional[datetime] = None
+    title: Optional[str] = None
+
+
 class BookPage(SQLModel):
     total_count: int
     books: List[UserBookRead] = []
+    next_cursor: Optional[BookCursor] = None
 
 
 class BookFilter(SQLModel):
     user_id: int
     collection_ids: Optional[List[int]]
+    sort: BookSort = BookSort.ADDED
+    cursor: Optional[BookCursor] = None
+    # Ignored with a cursor, which is cheaper for deep pages.
     offset: Optional[int] = None
     limit: Optional[int] = None
+
+
+class SuggestionType(str, Enum):
+    BOOK = "book"
+    AUTHOR = "author"
+
+
+class Suggestion(SQLModel):
+    """A typeahead match, the id is a book or author id by type."""
+    type: SuggestionType
+    id: int
+    text: str
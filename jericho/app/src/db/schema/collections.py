@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional, List
 
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel, Column, DateTime
 
 
@@ -25,10 +26,19 @@ class CollectionUserLinkType(str, Enum):
 
 
 class CollectionBookLink(SQLModel, table=True):
+    # Backs listing a collection's books newest first.
+    __table_args__ = (
+        Index(
+            "ix_collectionbooklink_collection_id_created_at",
+            "collection_id", "created_at", "book_id",
+        ),
+    )
+
     collection_id: int = Field(
         default=None, primary_key=True, foreign_key="collection.id"
     )
-    book_id: int = Field(default=None, primary_key=True, foreign_key="book.id")
+    book_id: int = Field(default=None, primary_key=True, foreign_key="book.id", index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     collection: "Collection" = Relationship(back_populates="book_links")
 
 
@@ -0,0 +1,55 @@
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Optional
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Column, Field, SQLModel
+
+
+class LibraryImportFormat(str, Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+class LibraryImportStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class LibraryImportBase(SQLModel):
+    size_bytes: int = 0
+    # Progress, committed after every batch of rows.
+    processed_bytes: int = 0
+    rows_processed: int = 0
+    rows_failed: int = 0
+    books_imported: int = 0
+    reviews_imported: int = 0
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    finished_at: Optional[datetime] = None
+
+
+class LibraryImport(LibraryImportBase, table=True):
+    """A library file uploaded for import, see src/domain/service/imports.py."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    format: str
+    status: str = LibraryImportStatus.PENDING.value
+    path: str = ""
+    # Bumped by the thread running the import after every batch. One left
+    # stale belongs to a worker that died and can be taken over.
+    heartbeat_at: Optional[datetime] = None
+    # A book id of an imported review per "reaction:stars" tier, so later
+    # batches rank their reviews into the same tiers.
+    review_tiers: Dict[str, int] = Field(
+        default_factory=dict, sa_column=Column(JSONB, nullable=False),
+    )
+
+
+class LibraryImportRead(LibraryImportBase):
+    id: int
+    user_id: int
+    format: LibraryImportFormat
+    status: LibraryImportStatus
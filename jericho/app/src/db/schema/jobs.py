@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Index, UniqueConstraint
+from sqlmodel import Field, SQLModel
+
+
+class Job(SQLModel, table=True):
+    """Background work keyed by (kind, key), see src/db/jobs.py."""
+    __table_args__ = (
+        UniqueConstraint("kind", "key"),
+        Index("ix_job_kind_run_after", "kind", "run_after"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str
+    key: str
+    attempts: int = 0
+    run_after: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    last_error: Optional[str] = None
+    finished_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
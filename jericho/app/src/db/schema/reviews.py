@@ -2,6 +2,7 @@ from collections import namedtuple
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -34,6 +35,9 @@ class ReviewBase(SQLModel):
 
 
 class Review(ReviewBase, table=True):
+    # Covers the per user, per reaction rank lookups in the review service.
+    __table_args__ = (Index("ix_review_user_id_reaction_rank", "user_id", "reaction", "rank"),)
+
     id: int = Field(default=None, primary_key=True)
     rating: float = Field(default=None, index=True)
     hide_rank: bool = Field(default=False)
@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import List, Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel, Column, DateTime
 
 
@@ -24,6 +25,9 @@ class UserLinkBase(SQLModel):
 
 
 class UserLink(UserLinkBase, table=True):
+    # The primary key leads with parent_id; this covers followers lookups.
+    __table_args__ = (Index("ix_userlink_child_id_type", "child_id", "type"),)
+
     type: str
 
     parent_user: "User" = Relationship(
@@ -0,0 +1,64 @@
+import functools
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from sqlmodel import Session
+
+_DEPTH = "unit_of_work_depth"
+_ON_COMMIT = "unit_of_work_on_commit"
+
+
+@contextmanager
+def unit_of_work(session: Session) -> Iterator[Session]:
+    """Groups every write made inside it into a single transaction.
+
+    Units nest: inner units only flush, the outermost one commits, or rolls
+    back if an exception escapes it. Use session.begin_nested() inside a
+    unit to isolate work that may fail without losing the rest.
+    """
+    depth = session.info.get(_DEPTH, 0)
+    session.info[_DEPTH] = depth + 1
+    try:
+        yield session
+        if depth:
+            session.flush()
+            return
+        session.commit()
+    except Exception:
+        if not depth:
+            session.rollback()
+            session.info.pop(_ON_COMMIT, None)
+        raise
+    finally:
+        session.info[_DEPTH] = depth
+
+    for callback in session.info.pop(_ON_COMMIT, []):
+        callback()
+
+
+def transactional(fn: Callable) -> Callable:
+    """Runs a service function, which takes the session first, in a unit of work."""
+
+    @functools.wraps(fn)
+    def wrapper(session: Session, *args, **kwargs):
+        with unit_of_work(session):
+            return fn(session, *args, **kwargs)
+
+    return wrapper
+
+
+def end_reads(session: Session):
+    """Ends the transaction reads began, returning its connection, before slow
+    work such as an HTTP call. Does nothing inside a unit of work, whose
+    writes it would lose.
+    """
+    if not session.info.get(_DEPTH):
+        session.rollback()
+
+
+def on_commit(session: Session, callback: Callable[[], None]):
+    """Defers callback, e.g. a cache invalidation, until the outermost unit commits."""
+    if not session.info.get(_DEPTH):
+        callback()
+        return
+    session.info.setdefault(_ON_COMMIT, []).append(callback)
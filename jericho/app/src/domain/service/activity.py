@@ -1,9 +1,13 @@
 from typing import List
 
 from sqlmodel import col, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy import func
+from sqlalchemy.orm.attributes import set_committed_value
 
 import src.db.schema as schema
+from src.db.unit_of_work import transactional
+from src.domain.utils import loaders
 
 DEFAULT_PAGE_LIMIT = 25
 
@@ -38,6 +42,45 @@ def _get_follow_collection_ids(
     return [link.collection_id for link in links]
 
 
+def _attach_activity_relations(session: Session, results: List):
+    """Loads what the activity read models include, one batched query per relation."""
+    batch = loaders.loaders(session)
+    atcs = [atc for _, atc, _, _ in results if atc]
+    rs = [r for _, _, r, _ in results if r]
+    fus = [fu for _, _, _, fu in results if fu]
+
+    users = batch.users()
+    users.load_many(
+        [atc.user_id for atc in atcs] +
+        [r.user_id for r in rs] +
+        [fu.follower_user_id for fu in fus] +
+        [fu.following_user_id for fu in fus]
+    )
+    collections = batch.collections().load_many(atc.collection_id for atc in atcs)
+    batch.attach_collection_user_links(c for c in collections if c)
+    books = batch.books().load_many(atc.book_id for atc in atcs)
+    for atc, collection, book in zip(atcs, collections, books):
+        set_committed_value(atc, "user", users.load(atc.user_id))
+        set_committed_value(atc, "collection", collection)
+        set_committed_value(atc, "book", book)
+
+    for r, review in zip(rs, batch.reviews().load_many(r.review_id for r in rs)):
+        set_committed_value(r, "user", users.load(r.user_id))
+        set_committed_value(r, "review", review)
+
+    for fu in fus:
+        set_committed_value(fu, "follower", users.load(fu.follower_user_id))
+        set_committed_value(fu, "following", users.load(fu.following_user_id))
+
+    activities = [activity for activity, _, _, _ in results]
+    activity_ids = [activity.id for activity in activities]
+    reactions = batch.activity_reactions().load_many(activity_ids)
+    comments = batch.activity_comments().load_many(activity_ids)
+    for activity, activity_reactions, activity_comments in zip(activities, reactions, comments):
+        set_committed_value(activity, "reactions", activity_reactions)
+        set_committed_value(activity, "comments", activity_comments)
+
+
 def _get_linked_read_activity_model(
     activity: schema.activity.Activity,
     atc: schema.activity.AddToCollectionActivity,
@@ -121,6 +164,7 @@ def get_activities(
     )
 
     results = session.exec(stmt).all()
+    _attach_activity_relations(session, results)
     activities_read = []
     for activity, atc, r, fu in results:
         activity_read = _get_linked_read_activity_model(activity, atc, r, fu)
@@ -140,6 +184,13 @@ def get_activities(
     )
 
 
+async def aget_activities(
+        session: AsyncSession,
+        f: schema.activity.ActivityFilter,
+) -> schema.activity.ActivityPage:
+    return await session.run_sync(get_activities, f)
+
+
 def get_activity(
     session: Session,
     activity_id: int,
@@ -163,22 +214,32 @@ def get_activity(
     )
 
     activity, atc, r, fu = session.exec(stmt).one()
+    _attach_activity_relations(session, [(activity, atc, r, fu)])
     activity_read = _get_linked_read_activity_model(activity, atc, r, fu)
 
     return activity_read
 
 
+async def aget_activity(
+    session: AsyncSession,
+    activity_id: int,
+) -> schema.activity.ActivityRead:
+    return await session.run_sync(get_activity, activity_id)
+
+
+@transactional
 def upsert_activity_comment(
     session: Session,
     comment: schema.activity.ActivityCommentWrite,
 ) -> schema.activity.ActivityCommentRead:
     db_comment = schema.activity.ActivityComment.from_orm(comment)
     db_comment = session.merge(db_comment)
-    session.commit()
+    session.flush()
     session.refresh(db_comment)
     return schema.activity.ActivityCommentRead.from_orm(db_comment)
 
 
+@transactional
 def delete_activity_comment(
     session: Session,
     comment_id: int,
@@ -186,18 +247,19 @@ def delete_activity_comment(
     stmt = select(schema.activity.ActivityComment).where(schema.activity.ActivityComment.id == comment_id)
     comment = session.exec(stmt).one()
     session.delete(comment)
-    session.commit()
 
 
+@transactional
 def insert_activity_reaction(
         session: Session,
         reaction: schema.activity.ActivityReaction,
 ) -> schema.activity.ActivityReactionRead:
     session.add(reaction)
-    session.commit()
+    session.flush()
     return schema.activity.ActivityReactionRead.from_orm(reaction)
 
 
+@transactional
 def delete_activity_reaction(
         session: Session,
         reaction: schema.activity.ActivityReaction,
@@ -208,4 +270,3 @@ def delete_activity_reaction(
     )
     reaction = session.exec(stmt).one()
     session.delete(reaction)
-    session.commit()
@@ -1,13 +1,33 @@
-from typing import Dict, List, Optional, Set
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+from sqlalchemy import exists, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from google_books_client.api import GoogleBooksAPI
+from google_books_client.constants import GOOGLE_BOOKS_MAX_RESULTS
 from google_books_client.models import Book as GoogleBook
 
 from resources.exceptions import InvalidArgumentException, NotFoundException
 import src.db.schema as schema
+from src import metrics
+from src.db import jobs
+from src.db.unit_of_work import end_reads, on_commit, transactional, unit_of_work
 from olclient import OpenLibrary, Book as OlBook
-from src.domain.utils import translate
+from src.config import (
+    book_refresh_batch_size,
+    book_refresh_ttl_seconds,
+    google_fetch_concurrency,
+    google_prefetch_workers,
+    local_search_min_results,
+    tag_backfill_batch_size,
+    tag_enrichment_batch_size,
+    typeahead_max_results,
+)
+from src.domain.utils import loaders, search, search_cache, translate, typeahead
 from src.domain.utils.constants import OL_IDENTIFIER
 
 DEFAULT_PAGE_LIMIT = 10
@@ -15,6 +35,13 @@ MAXIMUM_PATE_LIMIT = 100
 
 googleClient = GoogleBooksAPI()
 GOOGLE_TAG_SIGNIFICANCE = 10
+TAG_ENRICHMENT_JOB = "tag_enrichment"
+BOOK_REFRESH_JOB = "book_refresh"
+
+book_refreshes_requested = metrics.counter(
+    "book_refreshes_requested_total",
+    "Stale books served from Postgres with a Google refresh requested.",
+)
 
 
 class UserBookCollectionResult:
@@ -32,82 +59,459 @@ class UserBookCollectionResult:
 
 
 def add_tags_if_not_exist(session: Session, tags: Set[str]):
-    for tag in tags:
-        # Check if the tag exists in the database
-        existing_tag = session.exec(select(schema.books.Tag).where(schema.books.Tag.name == tag)).first()
-        if not existing_tag:
-            # Tag does not exist, so add it to the database
-            new_tag = schema.books.Tag(name=tag)
-            session.add(new_tag)
-    session.commit()
+    if not tags:
+        return
+    stmt = insert(schema.books.Tag).values([{"name": tag} for tag in sorted(tags)])
+    session.execute(stmt.on_conflict_do_nothing(index_elements=["name"]))
 
 
 def add_tag_links_if_not_exist(session: Session, tags: Set[str], book_id: int):
-    for tag in tags:
-        # Check if the tag exists in the database
-        existing_link = session.exec(select(schema.books.TagBookLink).where((schema.books.TagBookLink.tag_name == tag) & (
-                    schema.books.TagBookLink.book_id == book_id))).first()
-        if not existing_link:
-            # Tag does not exist, so add it to the database
-            new_link = schema.books.TagBookLink(tag_name=tag, book_id=book_id, count=GOOGLE_TAG_SIGNIFICANCE)
-            session.add(new_link)
-    session.commit()
-
-
-def get_tags_from_book_id(session: Session, book_id: int) -> List[schema.books.TagBookLink]:
+    add_book_tag_links_if_not_exist(session, {book_id: tags})
+
+
+def add_book_tag_links_if_not_exist(session: Session, book_tags: Dict[int, Set[str]]):
+    links = [
+        {"tag_name": tag, "book_id": book_id, "count": GOOGLE_TAG_SIGNIFICANCE}
+        for book_id, tags in sorted(book_tags.items())
+        for tag in sorted(tags)
+    ]
+    if links:
+        stmt = insert(schema.books.TagBookLink).values(links)
+        session.execute(stmt.on_conflict_do_nothing())
+
+
+def get_book_tags(session: Session, book_id: int) -> schema.books.BookTags:
+    """Returns the tags stored so far; tags still being fetched are marked pending.
+
+    A read only, the books without tags are enqueued on insert or by the
+    migration that added the job queue.
+    """
     stmt = select(schema.books.TagBookLink).where(schema.books.TagBookLink.book_id == book_id).order_by(col(schema.books.TagBookLink.count).desc())
     tag_links = session.exec(stmt).all()
     if tag_links:
-        return tag_links
+        return schema.books.BookTags(book_id=book_id, tags=tag_links)
 
-    book = session.get(schema.books.Book, book_id)
-    google_book = googleClient.get_book_by_id(book.gid)
-    tags = translate.tags_from_google_book_subjects(google_book.subjects)
+    if not session.get(schema.books.Book, book_id):
+        raise NotFoundException
+
+    key = str(book_id)
+    return schema.books.BookTags(
+        book_id=book_id,
+        pending=key in jobs.pending(session, TAG_ENRICHMENT_JOB, [key]),
+    )
+
+
+async def aget_book_tags(session: AsyncSession, book_id: int) -> schema.books.BookTags:
+    return await session.run_sync(get_book_tags, book_id)
+
+
+def enrich_book_tags(session: Session, book_ids: List[int]) -> Set[int]:
+    """Adds Google subject tags to many books at once.
+
+    Google is asked with no transaction open. Returns the ids of the books
+    whose Google fetch failed.
+    """
+    stmt = select(schema.books.Book.id, schema.books.Book.gid).where(
+        col(schema.books.Book.id).in_(book_ids) & col(schema.books.Book.gid).is_not(None)
+    )
+    book_id_to_gid = dict(session.exec(stmt).all())
+    end_reads(session)
+    fetched = _fetch_google_tags(book_id_to_gid)
+    book_tags = {book_id: tags for book_id, tags in fetched.items() if tags is not None}
+
+    with unit_of_work(session):
+        add_tags_if_not_exist(session, set().union(*book_tags.values()))
+        add_book_tag_links_if_not_exist(session, book_tags)
+    return {book_id for book_id, tags in fetched.items() if tags is None}
+
+
+def _run_tag_enrichment_jobs(session: Session, keys: List[str]) -> List[str]:
+    return [str(book_id) for book_id in enrich_book_tags(session, [int(key) for key in keys])]
+
+
+jobs.register_handler(
+    TAG_ENRICHMENT_JOB, _run_tag_enrichment_jobs, batch_size=tag_enrichment_batch_size,
+)
+
+
+def backfill_book_tags(session: Session, batch_size: int = tag_backfill_batch_size) -> int:
+    """Enriches every book without tags, committing once per batch.
+
+    Returns how many books were fetched from Google.
+    """
+    enriched = 0
+    last_id = 0
+    while True:
+        stmt = select(schema.books.Book.id).where(
+            (schema.books.Book.id > last_id) &
+            ~exists().where(schema.books.TagBookLink.book_id == schema.books.Book.id)
+        ).order_by(col(schema.books.Book.id)).limit(batch_size)
+        book_ids = session.exec(stmt).all()
+        if not book_ids:
+            return enriched
+        enriched += len(book_ids) - len(enrich_book_tags(session, book_ids))
+        # Keyset, books Google has no subjects for are not retried.
+        last_id = book_ids[-1]
+
+
+def _fetch_google_tags(book_id_to_gid: Dict[int, str]) -> Dict[int, Optional[Set[str]]]:
+    # None for the books whose fetch failed.
+    fetched = _fetch_google_books(list(book_id_to_gid.values()))
+    return {
+        book_id: (
+            translate.tags_from_google_book_subjects(fetched[gid].subjects or [])
+            if fetched[gid] else None
+        )
+        for book_id, gid in book_id_to_gid.items()
+    }
+
+
+def _fetch_google_books(gids: List[str]) -> Dict[str, Optional[GoogleBook]]:
+    # None for the books whose fetch failed.
+    return _fetch_concurrently(gids, googleClient.get_book_by_id)
+
+
+def _fetch_google_books_by_isbn(isbns: List[str]) -> Dict[str, Optional[GoogleBook]]:
+    # None for the ISBNs Google has no book for or whose fetch failed.
+    def fetch(isbn: str) -> Optional[GoogleBook]:
+        if len(isbn) == 13:
+            return googleClient.get_book_by_isbn13(isbn)
+        return googleClient.get_book_by_isbn10(isbn)
+
+    return _fetch_concurrently(isbns, fetch)
+
+
+def _fetch_concurrently(
+    keys: List[str],
+    fetch: Callable[[str], Optional[GoogleBook]],
+) -> Dict[str, Optional[GoogleBook]]:
+    def fetch_or_none(key: str) -> Optional[GoogleBook]:
+        try:
+            return fetch(key)
+        except Exception as e:  # pylint: disable=W0703
+            print(e)
+            return None
+
+    if len(keys) <= 1:
+        return {key: fetch_or_none(key) for key in keys}
+    with ThreadPoolExecutor(max_workers=google_fetch_concurrency) as executor:
+        return dict(zip(keys, executor.map(fetch_or_none, keys)))
+
+
+def fetch_isbns(session: Session, isbns: Iterable[str]) -> Dict[str, GoogleBook]:
+    """The Google books of the ISBNs not in Postgres, for resolve_isbns.
+
+    Ends the read transaction before asking Google, so no connection is
+    held during the calls. ISBNs Google has no book for are left out.
+    """
+    isbns = set(isbns)
+    missing = isbns - _find_isbns(session, isbns).keys()
+    end_reads(session)
+    fetched = _fetch_google_books_by_isbn(sorted(missing))
+    return {isbn: gb for isbn, gb in fetched.items() if gb and gb.id}
+
+
+def resolve_isbns(
+        session: Session,
+        isbns: Iterable[str],
+        fetched: Dict[str, GoogleBook],
+) -> Dict[str, schema.books.Book]:
+    """Books by ISBN 13 or 10, from Postgres first, then from the Google
+    books fetch_isbns fetched, which are bulk inserted. ISBNs found nowhere
+    are left out.
+    """
+    isbns = set(isbns)
+    found = _find_isbns(session, isbns)
+    missing = {isbn: gb for isbn, gb in fetched.items() if isbn in isbns - found.keys()}
+    if not missing:
+        return found
+    google_books = {gb.id: gb for gb in missing.values()}
+    inserted = {
+        b.gid: b
+        for b in _insert_missing_books_and_return_v2(session, list(google_books.values()))
+    }
+    for isbn, google_book in missing.items():
+        if google_book.id in inserted:
+            found[isbn] = inserted[google_book.id]
+    return found
+
+
+def _find_isbns(session: Session, isbns: Set[str]) -> Dict[str, schema.books.Book]:
+    if not isbns:
+        return {}
+    stmt = select(schema.books.Book).where(
+        col(schema.books.Book.isbn13).in_(isbns) | col(schema.books.Book.isbn10).in_(isbns)
+    )
+    found: Dict[str, schema.books.Book] = {}
+    for book in session.exec(stmt).all():
+        for isbn in (book.isbn13, book.isbn10):
+            if isbn in isbns:
+                found[isbn] = book
+    return found
+
+
+def refresh_books(session: Session, gids: List[str]) -> Set[str]:
+    """Refetches the books from Google and updates their metadata and tags in bulk.
+
+    Google is asked with no transaction open. Authors are left as they are.
+    Returns the gids whose Google fetch failed.
+    """
+    stmt = select(schema.books.Book.id, schema.books.Book.gid).where(
+        col(schema.books.Book.gid).in_(gids)
+    )
+    gid_to_id = {gid: book_id for book_id, gid in session.exec(stmt).all()}
+    end_reads(session)
+    fetched = _fetch_google_books(list(gid_to_id))
+
+    now = datetime.utcnow()
+    rows = []
+    book_tags: Dict[int, Set[str]] = {}
+    for gid, google_book in fetched.items():
+        if google_book is None:
+            continue
+        book = translate.from_google_book(google_book)
+        rows.append(dict(book.dict(exclude={"id", "gid"}), id=gid_to_id[gid], refreshed_at=now))
+        book_tags[gid_to_id[gid]] = translate.tags_from_google_book_subjects(
+            google_book.subjects or []
+        )
 
-    add_tags_if_not_exist(session, tags)
-    add_tag_links_if_not_exist(session, tags, book_id)
-    return session.exec(stmt).all()
+    if rows:
+        with unit_of_work(session):
+            session.bulk_update_mappings(schema.books.Book, rows)
+            search.index_books(session, list(book_tags))
+            add_tags_if_not_exist(session, set().union(*book_tags.values()))
+            add_book_tag_links_if_not_exist(session, book_tags)
+    return {gid for gid, google_book in fetched.items() if google_book is None}
+
+
+def _run_book_refresh_jobs(session: Session, keys: List[str]) -> List[str]:
+    return list(refresh_books(session, keys))
+
+
+jobs.register_handler(BOOK_REFRESH_JOB, _run_book_refresh_jobs, batch_size=book_refresh_batch_size)
+
+
+def _refresh_if_stale(books: List[schema.books.Book]):
+    """Requests a background refresh of books not fetched from Google within the ttl.
+
+    The stale rows are still served. Requests for the same gid coalesce into
+    one job, which the job workers refresh in batches.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=book_refresh_ttl_seconds)
+    gids = {
+        b.gid for b in books
+        if b.gid and (b.refreshed_at is None or b.refreshed_at < stale_before)
+    }
+    if gids:
+        book_refreshes_requested.inc(len(gids))
+        jobs.enqueue_later(BOOK_REFRESH_JOB, gids)
 
 
-# TODO do a refresh here.
 def get_book(session: Session, book_id: int, user_id: int) -> schema.books.UserBookRead:
     book = session.get(schema.books.Book, book_id)
     if not book:
         raise NotFoundException
 
-    # google_book = googleClient.get_book_by_id(book.gid)
-    # refresh_book = translate.from_google_book(google_book)
-
     page = _books_to_page(session, [book], user_id, 0)
     return page.books[0]
 
 
-def get_user_books(session: Session, f: schema.books.BookFilter) -> schema.books.BookPage:
-    stmt = select(schema.books.Book)
+async def aget_book(session: AsyncSession, book_id: int, user_id: int) -> schema.books.UserBookRead:
+    return await session.run_sync(get_book, book_id, user_id)
 
-    if f.collection_ids:
-        stmt = stmt.join(
-            schema.collections.CollectionBookLink,
-            (schema.books.Book.id ==
-             schema.collections.CollectionBookLink.book_id),
-        ).where(
-            col(schema.collections.CollectionBookLink.collection_id).in_(f.collection_ids)
+
+def get_cover_link(session: Session, book_id: int) -> str:
+    book = session.get(schema.books.Book, book_id)
+    if not book or not book.cover_link:
+        raise NotFoundException
+    return book.cover_link
+
+
+async def aget_cover_link(session: AsyncSession, book_id: int) -> str:
+    return await session.run_sync(get_cover_link, book_id)
+
+
+def get_books(
+    session: Session,
+    book_ids: List[int],
+    user_id: int,
+) -> List[schema.books.UserBookRead]:
+    """The books in the order asked for, skipping unknown ids, in a fixed number of queries."""
+    if len(book_ids) > MAXIMUM_PATE_LIMIT:
+        raise InvalidArgumentException
+    book_ids = list(dict.fromkeys(book_ids))
+    found = [b for b in loaders.loaders(session).books().load_many(book_ids) if b]
+    return _books_to_page(session, found, user_id, len(found)).books
+
+
+async def aget_books(
+    session: AsyncSession,
+    book_ids: List[int],
+    user_id: int,
+) -> List[schema.books.UserBookRead]:
+    return await session.run_sync(get_books, book_ids, user_id)
+
+
+def suggest(q: str, limit: Optional[int] = None) -> List[schema.books.Suggestion]:
+    """Books and authors with a word of their title or name starting with q, from memory."""
+    if limit is not None and not 0 < limit <= typeahead_max_results:
+        raise InvalidArgumentException
+    return typeahead.typeahead_index.suggest(q, limit)
+
+
+def get_following_user_books(
+    session: Session,
+    book_id: int,
+    parent_id: int,
+) -> List[schema.books.UserBookRead]:
+    """The book as seen by each user parent_id follows who has shelved or reviewed it.
+
+    Runs a fixed number of queries however many users are followed.
+    """
+    batch = loaders.loaders(session)
+    book = batch.books().load(book_id)
+    if not book:
+        raise NotFoundException
+
+    followed = select(schema.users.UserLink.child_id).where(
+        (schema.users.UserLink.parent_id == parent_id) &
+        (schema.users.UserLink.type == schema.users.UserLinkType.FOLLOW)
+    )
+
+    collections_stmt = select(
+        schema.collections.CollectionUserLink.user_id, schema.collections.Collection,
+    ).join(
+        schema.collections.Collection,
+        schema.collections.Collection.id == schema.collections.CollectionUserLink.collection_id,
+    ).join(
+        schema.collections.CollectionBookLink,
+        schema.collections.CollectionBookLink.collection_id ==
+        schema.collections.CollectionUserLink.collection_id,
+    ).where(
+        (schema.collections.CollectionBookLink.book_id == book_id) &
+        (schema.collections.CollectionUserLink.type ==
+         schema.collections.CollectionUserLinkType.OWNER) &
+        col(schema.collections.CollectionUserLink.user_id).in_(followed)
+    ).order_by(col(schema.collections.Collection.id))
+
+    collections: Dict[int, List[schema.collections.Collection]] = {}
+    for user_id, collection in session.exec(collections_stmt).all():
+        collections.setdefault(user_id, []).append(collection)
+    batch.attach_collection_user_links(c for cs in collections.values() for c in cs)
+
+    reviews_stmt = select(schema.reviews.Review).where(
+        (schema.reviews.Review.book_id == book_id) &
+        col(schema.reviews.Review.user_id).in_(followed)
+    )
+    reviews = {review.user_id: review for review in session.exec(reviews_stmt).all()}
+
+    _refresh_if_stale([book])
+    batch.attach_book_authors([book])
+    authors = [schema.books.AuthorRead.from_orm(a) for a in book.authors]
+    return [
+        schema.books.UserBookRead(
+            user_id=user_id,
+            book=book,
+            authors=authors,
+            collections=[
+                schema.collections.CollectionRead.from_orm(c) for c in collections.get(user_id, [])
+            ],
+            review=reviews.get(user_id),
         )
+        for user_id in sorted(collections.keys() | reviews.keys())
+    ]
 
-    if not f.limit:
-        stmt = stmt.limit(f.limit)
 
-    if not f.offset:
+async def aget_following_user_books(
+    session: AsyncSession,
+    book_id: int,
+    parent_id: int,
+) -> List[schema.books.UserBookRead]:
+    return await session.run_sync(get_following_user_books, book_id, parent_id)
+
+
+def get_user_books(session: Session, f: schema.books.BookFilter) -> schema.books.BookPage:
+    """A page of books by keyset on the sort key and id, with the total in a separate count."""
+    _validate_filter(f)
+    limit = f.limit or DEFAULT_PAGE_LIMIT
+    book = schema.books.Book
+
+    added_at = None
+    stmt = select(book)
+    count_stmt = select(func.count()).select_from(book)
+    if f.collection_ids:
+        links = _collection_book_links(f.collection_ids)
+        added_at = links.c.added_at
+        stmt = select(book, added_at).join(links, links.c.book_id == book.id)
+        count_stmt = select(func.count()).select_from(links)
+
+    if f.sort == schema.books.BookSort.TITLE:
+        order_by = [col(book.title), col(book.id)]
+        if f.cursor:
+            if f.cursor.title is None:
+                raise InvalidArgumentException
+            stmt = stmt.where(tuple_(book.title, book.id) >= tuple_(f.cursor.title, f.cursor.id))
+    elif added_at is not None:
+        order_by = [added_at.desc(), col(book.id).desc()]
+        if f.cursor:
+            if f.cursor.added_at is None:
+                raise InvalidArgumentException
+            stmt = stmt.where(tuple_(added_at, book.id) <= tuple_(f.cursor.added_at, f.cursor.id))
+    else:
+        order_by = [col(book.id).desc()]
+        if f.cursor:
+            stmt = stmt.where(book.id <= f.cursor.id)
+
+    stmt = stmt.order_by(*order_by).limit(limit + 1)  # for cursor
+    if f.offset and not f.cursor:
         stmt = stmt.offset(f.offset)
 
     results = session.exec(stmt).all()
+    rows = results if added_at is not None else [(b, None) for b in results]
+
+    next_cursor = None
+    if len(rows) > limit:
+        cursor_book, cursor_added_at = rows.pop()
+        next_cursor = schema.books.BookCursor(
+            id=cursor_book.id,
+            added_at=cursor_added_at,
+            title=cursor_book.title,
+        )
+
+    total_count = session.exec(count_stmt).one()
+    page = _books_to_page(session, [b for b, _ in rows], f.user_id, total_count)
+    page.next_cursor = next_cursor
+    return page
+
 
-    return _books_to_page(session, results, f.user_id, 0)
+def _collection_book_links(collection_ids: List[int]):
+    """The books in any of the collections, with when they were last added to one."""
+    link = schema.collections.CollectionBookLink
+    if len(collection_ids) == 1:
+        # Without a GROUP BY, Postgres walks ix_collectionbooklink_collection_id_created_at
+        # in order and stops at the page limit.
+        stmt = select(link.book_id, col(link.created_at).label("added_at")).where(
+            link.collection_id == collection_ids[0]
+        )
+    else:
+        stmt = select(link.book_id, func.max(link.created_at).label("added_at")).where(
+            col(link.collection_id).in_(collection_ids)
+        ).group_by(link.book_id)
+    return stmt.subquery()
+
+
+async def aget_user_books(
+    session: AsyncSession,
+    f: schema.books.BookFilter,
+) -> schema.books.BookPage:
+    return await session.run_sync(get_user_books, f)
 
 
+@transactional
 def upsert_book(session: Session, book: schema.books.Book) -> schema.books.Book:
     book = session.merge(book)
-    session.commit()
+    session.flush()
+    search.index_books(session, [book.id])
     session.refresh(book)
     return book
 
@@ -117,14 +521,107 @@ def search_books_v2(
         f: schema.filter.Filter,
         user_id: int,
 ) -> schema.books.BookPage:
-    results = googleClient.search_book(search_term=filter_to_search_term(f))
-
-    # TOOD UPDATE THE GOOGLE CLIENT TO TAKE LIMITS
-    results_trimmed = results.get_all_results()[:f.limit if f.limit else DEFAULT_PAGE_LIMIT]
-
-    books = _insert_missing_books_and_return_v2(session, results_trimmed)
-    page = _books_to_page(session, books, user_id, results.total_results)
-    return page
+    """Searches the local catalog, then the Google search cache, then Google.
+
+    Not a unit of work, so no transaction is open while Google is asked,
+    only while its results are written.
+    """
+    search_term = filter_to_search_term(f)
+    offset, limit = f.offset or 0, f.limit
+
+    # Google is only asked when the local catalog has too few matches.
+    local_books, local_total = search.search_books(session, f.q, limit, offset)
+    if local_total >= local_search_min_results:
+        return _books_to_page(session, local_books, user_id, local_total)
+
+    key = search_cache.cache_key(search_term, offset, limit)
+    cached = search_cache.get(session, key)
+    if cached:
+        gids, total_results = cached
+        books = _get_books_by_gids(session, gids)
+        if len(books) == len(gids):
+            _prefetch_next_google_page(session, search_term, offset, limit, total_results)
+            return _books_to_page(session, books, user_id, total_results)
+
+    books, total_results = _search_google_page(session, search_term, offset, limit)
+    _prefetch_next_google_page(session, search_term, offset, limit, total_results)
+    return _books_to_page(session, books, user_id, total_results)
+
+
+def _search_google_page(
+        session: Session,
+        search_term: str,
+        offset: int,
+        limit: int,
+) -> Tuple[List[schema.books.Book], int]:
+    end_reads(session)
+    results = googleClient.search_book(
+        search_term=search_term, start_index=offset, max_results=limit,
+    )
+    with unit_of_work(session):
+        books = _insert_missing_books_and_return_v2(session, results.get_all_results())
+        gids = [b.gid for b in books]
+        key = search_cache.cache_key(search_term, offset, limit)
+        search_cache.put(session, key, gids, results.total_items)
+    # Loaded again in one query, the commit expired them.
+    return _get_books_by_gids(session, gids), results.total_items
+
+
+def _prefetch_next_google_page(
+        session: Session,
+        search_term: str,
+        offset: int,
+        limit: int,
+        total_results: int,
+):
+    """Loads the following page into the search cache in the background, for infinite scroll."""
+    offset += limit
+    if offset >= total_results:
+        return
+    bind = session.get_bind()
+    # After the commit, so the prefetch sees the books this request inserted.
+    on_commit(session, lambda: _submit_prefetch(bind, search_term, offset, limit))
+
+
+def _submit_prefetch(bind, search_term: str, offset: int, limit: int):
+    # Concurrent requests for the same page share one prefetch.
+    key = search_cache.cache_key(search_term, offset, limit)
+    with _prefetch_lock:
+        if key in _prefetching:
+            return
+        _prefetching.add(key)
+    _prefetch_executor.submit(_prefetch_google_page, bind, key, search_term, offset, limit)
+
+
+def _prefetch_google_page(bind, key: str, search_term: str, offset: int, limit: int):
+    try:
+        with Session(bind) as session:
+            if search_cache.get(session, key, record=False) is None:
+                _search_google_page(session, search_term, offset, limit)
+    except Exception as e:  # pylint: disable=W0703
+        print(f"Prefetching {key} failed: {e}")
+    finally:
+        with _prefetch_lock:
+            _prefetching.discard(key)
+
+
+def stop_prefetching():
+    """Drops the queued prefetches and waits for the running ones."""
+    _prefetch_executor.shutdown(cancel_futures=True)
+
+
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=google_prefetch_workers,
+    thread_name_prefix="google-prefetch",
+)
+_prefetch_lock = threading.Lock()
+_prefetching: Set[str] = set()
+
+
+def _get_books_by_gids(session: Session, gids: List[str]) -> List[schema.books.Book]:
+    stmt = select(schema.books.Book).where(col(schema.books.Book.gid).in_(gids))
+    gid_to_book = {b.gid: b for b in session.exec(stmt).all()}
+    return [gid_to_book[gid] for gid in gids if gid in gid_to_book]
 
 
 def _insert_missing_books_and_return_v2(
@@ -143,53 +640,86 @@ def _insert_missing_books_and_return_v2(
     for b in results:
         gid_to_book[b.gid] = b
 
-    for gid, b in gid_to_google_book.items():
-        if gid not in gid_to_book:
-            book = translate.from_google_book(b)
-
-            reserved_authors = []
-            for author in book.authors:
-                a = session.exec(select(schema.books.Author).where(schema.books.Author.name == author.name)).first()
-                if a:
-                    reserved_authors.append(a)
-                else:
-                    a = schema.books.Author(name=author.name)
-                    session.add(a)
-                    session.flush()
-                    session.refresh(a)
-                    reserved_authors.append(a)
-
-            book.authors = []
-
-            try:
-                session.add(book)
-                session.flush()
-                session.refresh(book)
-
-                for a in reserved_authors:
-                    link = schema.books.AuthorBookLink(book_id=book.id, author_id=a.id)
-                    session.add(link)
-
-                session.commit()
-                book.authors = reserved_authors
-
-                gid_to_book[gid] = book
-            except Exception as e:
-                session.rollback()
-                print(e)
+    missing = [b for gid, b in gid_to_google_book.items() if gid not in gid_to_book]
+    if not missing:
+        return [gid_to_book[gid] for gid in gids if gid in gid_to_book]
+
+    _insert_books_isolating_failures(session, missing)
+
+    stmt = select(schema.books.Book).where(col(schema.books.Book.gid).in_([b.id for b in missing]))
+    for b in session.exec(stmt).all():
+        gid_to_book[b.gid] = b
 
     return [gid_to_book[gid] for gid in gids if gid in gid_to_book]
 
 
+def _insert_books_isolating_failures(session: Session, google_books: List[GoogleBook]):
+    # On failure the batch is split in halves, each in its own savepoint,
+    # so one bad book costs O(log n) retries and does not fail the others.
+    try:
+        with session.begin_nested():
+            _bulk_insert_books(session, google_books)
+    except Exception as e:
+        if len(google_books) == 1:
+            print(e)
+            return
+        middle = len(google_books) // 2
+        _insert_books_isolating_failures(session, google_books[:middle])
+        _insert_books_isolating_failures(session, google_books[middle:])
+
+
+def _bulk_insert_books(session: Session, google_books: List[GoogleBook]) -> List[int]:
+    """Inserts books, their authors and author links in one statement each."""
+    books = [translate.from_google_book(b) for b in google_books]
+    author_ids = _upsert_authors(session, {a.name for book in books for a in book.authors})
+
+    # Books inserted concurrently by another search are skipped by the conflict.
+    now = datetime.utcnow()
+    stmt = insert(schema.books.Book).values(
+        [dict(book.dict(exclude={"id"}), refreshed_at=now) for book in books]
+    )
+    stmt = stmt.on_conflict_do_nothing(index_elements=["gid"]).returning(
+        schema.books.Book.id, schema.books.Book.gid,
+    )
+    gid_to_id = {gid: book_id for book_id, gid in session.execute(stmt).all()}
+
+    links = {
+        (author_ids[a.name], gid_to_id[book.gid])
+        for book in books if book.gid in gid_to_id
+        for a in book.authors
+    }
+    if links:
+        stmt = insert(schema.books.AuthorBookLink).values(
+            [{"author_id": author_id, "book_id": book_id} for author_id, book_id in sorted(links)]
+        )
+        session.execute(stmt.on_conflict_do_nothing())
+
+    book_ids = list(gid_to_id.values())
+    search.index_books(session, book_ids)
+    jobs.enqueue(session, TAG_ENRICHMENT_JOB, [str(book_id) for book_id in book_ids])
+    return book_ids
+
+
+def _upsert_authors(session: Session, names: Set[str]) -> Dict[str, int]:
+    if not names:
+        return {}
+    # Sorted so concurrent ingestions take the row locks in the same order.
+    names = sorted(names)
+    stmt = insert(schema.books.Author).values([{"name": name} for name in names])
+    session.execute(stmt.on_conflict_do_nothing(index_elements=["name"]))
+    stmt = select(schema.books.Author.id, schema.books.Author.name).where(
+        col(schema.books.Author.name).in_(names)
+    )
+    return {name: author_id for author_id, name in session.exec(stmt).all()}
+
+
 def filter_to_search_term(f: schema.filter.Filter) -> str:
     _validate_filter(f)
-    search_term = f.q
-    # if not f.limit:
-    #     f.limit = DEFAULT_PAGE_LIMIT
-    # search_term += f"&maxResults={f.limit}"
-    # if f.offset:
-    #     search_term += f"&startIndex={f.offset}"
-    return search_term
+    if not f.limit:
+        f.limit = DEFAULT_PAGE_LIMIT
+    # Google pages at most 40 results.
+    f.limit = min(f.limit, GOOGLE_BOOKS_MAX_RESULTS)
+    return f.q
 
 
 def _validate_filter(
@@ -200,46 +730,28 @@ def _validate_filter(
 
 
 def _books_to_page(session: Session, books: List[schema.books.Book], user_id: int, total_count: int) -> schema.books.BookPage:
-    page = schema.books.BookPage(total_count=total_count)
-
-    # Fetch collection ids for user owned.
-    cul_stmt = select(schema.collections.CollectionUserLink
-                      ).where((schema.collections.CollectionUserLink.user_id == user_id) &
-                              (schema.collections.CollectionUserLink.type == schema.collections.CollectionUserLinkType.OWNER))
-
-    cul_results = session.exec(cul_stmt).all()
-    col_ids = [c.collection_id for c in cul_results]
-
+    """Hydrates books with user_id's collections and review, one batched query per relation."""
+    _refresh_if_stale(books)
+    batch = loaders.loaders(session)
     ids = [b.id for b in books]  # must maintain order
 
-    stmt = select(schema.books.Book, schema.collections.Collection, schema.reviews.Review).outerjoin(
-        schema.collections.CollectionBookLink,
-        ((schema.books.Book.id == schema.collections.CollectionBookLink.book_id) &
-         (col(schema.collections.CollectionBookLink.collection_id).in_(col_ids)))
-    ).outerjoin(
-        schema.collections.Collection,
-        (schema.collections.Collection.id ==
-         schema.collections.CollectionBookLink.collection_id),
-    ).outerjoin(
-        schema.reviews.Review,
-        (schema.books.Book.id == schema.reviews.Review.book_id) &
-        (schema.reviews.Review.user_id == user_id),
-    ).where(col(schema.books.Book.id).in_(ids))
+    batch.attach_book_authors(books)
+    collections = batch.owned_collections(user_id).load_many(ids)
+    batch.attach_collection_user_links(c for cs in collections for c in cs)
+    reviews = batch.user_reviews(user_id).load_many(ids)
 
-    results = session.exec(stmt).all()
-    id_results_dict: Dict[int, schema.books.UserBookRead] = {}
-    for book, collection, review in results:
-        if book.id in id_results_dict:
-            if collection:
-                id_results_dict[book.id].collections.append(schema.collections.CollectionRead.from_orm(collection))
-        else:
-            id_results_dict[book.id] = schema.books.UserBookRead(
+    return schema.books.BookPage(
+        total_count=total_count,
+        books=[
+            schema.books.UserBookRead(
                 user_id=user_id,
                 book=book,
                 authors=[schema.books.AuthorRead.from_orm(a) for a in book.authors],
-                collections=[schema.collections.CollectionRead.from_orm(collection)] if collection else [],
+                collections=[
+                    schema.collections.CollectionRead.from_orm(c) for c in book_collections
+                ],
                 review=review,
             )
-
-    page.books = [id_results_dict[i] for i in ids]
-    return page
+            for book, book_collections, review in zip(books, collections, reviews)
+        ],
+    )
@@ -1,8 +1,10 @@
 from typing import List, Optional
 
 from sqlmodel import Session, select, delete, col
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import src.db.schema as schema
+from src.db.unit_of_work import transactional
 from resources.exceptions import InvalidArgumentException, NotFoundException
 
 
@@ -38,6 +40,13 @@ def get_collection(
     return cr
 
 
+async def aget_collection(
+    session: AsyncSession,
+    collection_id: int,
+) -> schema.collections.CollectionRead:
+    return await session.run_sync(get_collection, collection_id)
+
+
 def get_collections(
     session: Session,
     collections_filter: schema.collections.CollectionsFilter,
@@ -54,6 +63,13 @@ def get_collections(
     return collections_read
 
 
+async def aget_collections(
+    session: AsyncSession,
+    collections_filter: schema.collections.CollectionsFilter,
+) -> List[schema.collections.CollectionRead]:
+    return await session.run_sync(get_collections, collections_filter)
+
+
 def get_collection_user_link(
         session: Session,
         collection_id: int,
@@ -66,16 +82,17 @@ def get_collection_user_link(
     return session.exec(stmt).first()
 
 
+@transactional
 def upsert_collection_user_link(
         session: Session,
         link: schema.collections.CollectionUserLink,
 ) -> schema.collections.CollectionUserLinkRead:
     # TODO prevent people from adding themselves as owner/collaborator.
     session.merge(link)
-    session.commit()
     return schema.collections.CollectionUserLinkRead.from_orm(link)
 
 
+@transactional
 def delete_collection_user_link(
         session: Session,
         collection_id: int,
@@ -94,19 +111,20 @@ def delete_collection_user_link(
         raise InvalidArgumentException
 
     session.delete(link)
-    session.commit()
 
 
+@transactional
 def upsert_collection(
     session: Session,
     collection: schema.collections.Collection,
 ) -> schema.collections.Collection:
     collection = session.merge(collection)
-    session.commit()
+    session.flush()
     session.refresh(collection)
     return collection
 
 
+@transactional
 def delete_collection(
     session: Session,
     collection: schema.collections.Collection,
@@ -120,7 +138,6 @@ def delete_collection(
     )
     session.execute(stmt)
     session.delete(collection)
-    session.commit()
 
 
 def get_collection_book_link(
@@ -140,6 +157,7 @@ def get_collection_book_link(
     return session.exec(stmt).one()
 
 
+@transactional
 def insert_collection_book_link(
     session: Session,
     link: schema.collections.CollectionBookLink,
@@ -158,11 +176,12 @@ def insert_collection_book_link(
         session.add(atc)
 
     session.add(link)
-    session.commit()
+    session.flush()
     session.refresh(link)
     return link
 
 
+@transactional
 def patch_collection_book_link(
     session: Session,
     current_link: schema.collections.CollectionBookLink,
@@ -170,15 +189,15 @@ def patch_collection_book_link(
 ) -> schema.collections.CollectionBookLink:
     session.delete(current_link)
     session.add(new_link)
-    session.commit()
+    session.flush()
     session.refresh(new_link)
     return new_link
 
 
+@transactional
 def delete_collection_book_link(
     session: Session,
     link: schema.collections.CollectionBookLink,
 ):
     session.delete(link)
-    session.commit()
 
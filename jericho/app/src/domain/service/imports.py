@@ -0,0 +1,527 @@
+import csv
+import functools
+import io
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple
+
+from google_books_client.models import Book as GoogleBook
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import UploadFile
+
+import src.db.schema as schema
+from resources.exceptions import (
+    InvalidArgumentException,
+    NotFoundException,
+    PayloadTooLargeException,
+)
+from src.config import (
+    import_batch_size,
+    import_heartbeat_timeout_seconds,
+    import_max_bytes,
+    import_upload_dir,
+    import_workers,
+)
+from src.db import jobs
+from src.db.unit_of_work import on_commit, transactional, unit_of_work
+from src.domain.service import books, reviews
+from src.domain.utils import ratings
+
+LIBRARY_IMPORT_JOB = "library_import"
+
+# Goodreads exclusive shelves, anything else is saved.
+SHELF_TO_COLLECTION_TYPE = {
+    "read": schema.collections.CollectionType.COMPLETE,
+    "currently-reading": schema.collections.CollectionType.ACTIVE,
+    "to-read": schema.collections.CollectionType.SAVED,
+}
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class ImportRow:
+    def __init__(
+            self,
+            isbn: str,
+            shelf: Optional[str] = None,
+            stars: int = 0,
+            notes: Optional[str] = None,
+            added_at: Optional[datetime] = None,
+    ):
+        self.isbn = isbn
+        self.shelf = shelf
+        # 1 to 5, 0 when unrated.
+        self.stars = stars
+        self.notes = notes
+        self.added_at = added_at
+
+
+def create_import(
+        session: Session,
+        user_id: int,
+        file: UploadFile,
+) -> schema.imports.LibraryImportRead:
+    """Stores the upload on disk in chunks and queues its import.
+
+    The copy is made before the transaction begins, then renamed after the
+    import's id. Blocks on the copy, async routes run it in a thread.
+    """
+    extension = os.path.splitext(file.filename or "")[1].lstrip(".").lower()
+    if extension not in {f.value for f in schema.imports.LibraryImportFormat}:
+        raise InvalidArgumentException
+
+    os.makedirs(import_upload_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=import_upload_dir, prefix=".upload-")
+    os.close(fd)
+    size_bytes = _copy_upload(file.file, path)
+
+    try:
+        with unit_of_work(session):
+            library_import = schema.imports.LibraryImport(
+                user_id=user_id,
+                format=extension,
+                size_bytes=size_bytes,
+            )
+            session.add(library_import)
+            session.flush()
+
+            library_import.path = os.path.join(
+                import_upload_dir, f"{library_import.id}.{extension}",
+            )
+            session.add(library_import)
+            # Before the commit, a worker may start the import as soon as it is queued.
+            os.replace(path, library_import.path)
+            path = library_import.path
+            jobs.enqueue(session, LIBRARY_IMPORT_JOB, [str(library_import.id)])
+            created = schema.imports.LibraryImportRead.from_orm(library_import)
+    except BaseException:
+        os.remove(path)
+        raise
+    return created
+
+
+def _copy_upload(upload: IO[bytes], path: str) -> int:
+    """Copies the upload to path, returns its size. Uploads over import_max_bytes are rejected."""
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while chunk := upload.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > import_max_bytes:
+                    raise PayloadTooLargeException
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return size
+
+
+def get_import(session: Session, import_id: int, user_id: int) -> schema.imports.LibraryImportRead:
+    library_import = session.get(schema.imports.LibraryImport, import_id)
+    if not library_import or library_import.user_id != user_id:
+        raise NotFoundException
+    return schema.imports.LibraryImportRead.from_orm(library_import)
+
+
+async def aget_import(
+        session: AsyncSession,
+        import_id: int,
+        user_id: int,
+) -> schema.imports.LibraryImportRead:
+    return await session.run_sync(get_import, import_id, user_id)
+
+
+@transactional
+def resume_imports(session: Session):
+    """Queues the imports left running, e.g. by a process that crashed.
+
+    Their jobs take them over once their heartbeat is stale.
+    """
+    stmt = select(schema.imports.LibraryImport.id).where(
+        schema.imports.LibraryImport.status == schema.imports.LibraryImportStatus.RUNNING.value
+    )
+    import_ids = session.exec(stmt).all()
+    jobs.enqueue(session, LIBRARY_IMPORT_JOB, [str(import_id) for import_id in import_ids])
+
+
+def run_import(bind, import_id: int):
+    """Imports the file in batches, committing each batch and the progress with it.
+
+    Only one batch of rows is in memory at a time. Each batch asks Google
+    for its unknown ISBNs before locking the import row, so neither a
+    connection nor the lock is held during the calls. After a crash the
+    import resumes at the first row not committed. A failed import is not
+    retried.
+    """
+    with Session(bind) as session, unit_of_work(session):
+        library_import = session.get(schema.imports.LibraryImport, import_id)
+        finished = schema.imports.LibraryImportStatus.FINISHED.value
+        if not library_import or library_import.status == finished:
+            return
+        library_import.status = schema.imports.LibraryImportStatus.RUNNING.value
+        library_import.heartbeat_at = datetime.utcnow()
+        session.add(library_import)
+        path, processed = library_import.path, library_import.rows_processed
+        import_format = schema.imports.LibraryImportFormat(library_import.format)
+
+    try:
+        with open(path, "rb") as f:
+            rows = itertools.islice(read_rows(f, import_format), processed, None)
+            while batch := list(itertools.islice(rows, import_batch_size)):
+                # Google is asked first, with no transaction open or row locked.
+                with Session(bind) as session:
+                    fetched = books.fetch_isbns(session, {row.isbn for row in batch if row})
+                with Session(bind) as session, unit_of_work(session):
+                    library_import = session.get(
+                        schema.imports.LibraryImport, import_id, with_for_update=True,
+                    )
+                    if library_import.rows_processed != processed:
+                        # Taken over by another worker while this one looked dead.
+                        return
+                    if _stopping.is_set():
+                        # Shutting down, the next start takes it over straight away.
+                        library_import.heartbeat_at = None
+                        session.add(library_import)
+                        return
+                    _import_batch(session, library_import, batch, fetched)
+                    library_import.rows_processed += len(batch)
+                    library_import.processed_bytes = f.tell()
+                    library_import.heartbeat_at = datetime.utcnow()
+                    session.add(library_import)
+                    processed = library_import.rows_processed
+    except Exception as e:
+        with Session(bind) as session, unit_of_work(session):
+            library_import = session.get(schema.imports.LibraryImport, import_id)
+            library_import.status = schema.imports.LibraryImportStatus.FAILED.value
+            library_import.error = str(e)
+            session.add(library_import)
+        raise
+
+    with Session(bind) as session, unit_of_work(session):
+        library_import = session.get(schema.imports.LibraryImport, import_id)
+        library_import.status = schema.imports.LibraryImportStatus.FINISHED.value
+        library_import.processed_bytes = library_import.size_bytes
+        library_import.error = None
+        library_import.finished_at = datetime.utcnow()
+        session.add(library_import)
+    os.remove(path)
+
+
+@transactional
+def _run_library_import_jobs(session: Session, keys: List[str]) -> List[str]:
+    """Claims the imports, which run in the import threads once the claim
+    commits, so the job stays locked for the claim rather than the import.
+
+    Imports running elsewhere are retried, to be taken over if their
+    worker dies.
+    """
+    import_ids = [int(key) for key in keys]
+    claimed = _claim_imports(session, import_ids)
+    bind = session.get_bind()
+    for import_id in claimed:
+        run = functools.partial(_import_executor.submit, _run_claimed_import, bind, import_id)
+        on_commit(session, run)
+
+    stmt = select(schema.imports.LibraryImport.id).where(
+        col(schema.imports.LibraryImport.id).in_(set(import_ids) - claimed) &
+        (schema.imports.LibraryImport.status == schema.imports.LibraryImportStatus.RUNNING.value)
+    )
+    return [str(import_id) for import_id in session.exec(stmt).all()]
+
+
+def _claim_imports(session: Session, import_ids: List[int]) -> Set[int]:
+    """Marks pending imports, and running ones with a stale heartbeat, as running here."""
+    library_import = schema.imports.LibraryImport
+    now = datetime.utcnow()
+    stale = (
+        col(library_import.heartbeat_at).is_(None) |
+        (library_import.heartbeat_at < now - timedelta(seconds=import_heartbeat_timeout_seconds))
+    )
+    running = schema.imports.LibraryImportStatus.RUNNING.value
+    stmt = update(library_import).where(
+        col(library_import.id).in_(import_ids) & (
+            (library_import.status == schema.imports.LibraryImportStatus.PENDING.value) |
+            ((library_import.status == running) & stale)
+        )
+    ).values(status=running, heartbeat_at=now).returning(library_import.id)
+    return set(session.execute(stmt.execution_options(synchronize_session=False)).scalars().all())
+
+
+def _run_claimed_import(bind, import_id: int):
+    try:
+        run_import(bind, import_id)
+    except Exception as e:  # pylint: disable=W0703
+        print(f"Library import {import_id} failed: {e}")
+
+
+def stop_imports():
+    """Stops the running imports after their current batch, to resume on the next start."""
+    _stopping.set()
+    _import_executor.shutdown(cancel_futures=True)
+
+
+jobs.register_handler(LIBRARY_IMPORT_JOB, _run_library_import_jobs)
+
+_import_executor = ThreadPoolExecutor(
+    max_workers=import_workers,
+    thread_name_prefix="library-import",
+)
+_stopping = threading.Event()
+
+
+def read_rows(
+        f: IO[bytes],
+        import_format: schema.imports.LibraryImportFormat,
+) -> Iterator[Optional[ImportRow]]:
+    """Streams the rows of a Goodreads style CSV export or of JSONL.
+
+    Yields None for rows that cannot be read or have no ISBN.
+    """
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    if import_format == schema.imports.LibraryImportFormat.CSV:
+        records = csv.DictReader(text)
+    else:
+        records = (_json_or_none(line) for line in text if line.strip())
+    try:
+        for record in records:
+            try:
+                yield _parse_record(record) if isinstance(record, dict) else None
+            except ValueError:
+                yield None
+    finally:
+        # Leaves f open, the caller reads its position.
+        text.detach()
+
+
+def _json_or_none(line: str) -> Optional[dict]:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _parse_record(record: Dict[str, str]) -> Optional[ImportRow]:
+    # Goodreads column names, then the JSONL keys.
+    def field(*names: str) -> Optional[str]:
+        for name in names:
+            value = record.get(name)
+            if value not in (None, ""):
+                return str(value)
+        return None
+
+    isbn = _normalize_isbn(field("ISBN13", "isbn13")) or _normalize_isbn(
+        field("ISBN", "isbn10", "isbn")
+    )
+    if not isbn:
+        return None
+    stars = int(float(field("My Rating", "rating") or 0))
+    if not 0 <= stars <= 5:
+        raise ValueError(f"Rating {stars} is not 0 to 5")
+    added_at = field("Date Added", "added_at")
+    return ImportRow(
+        isbn=isbn,
+        shelf=field("Exclusive Shelf", "shelf"),
+        stars=stars,
+        notes=field("My Review", "review"),
+        added_at=datetime.fromisoformat(added_at.replace("/", "-")) if added_at else None,
+    )
+
+
+def _normalize_isbn(value: Optional[str]) -> Optional[str]:
+    # Goodreads exports ISBNs as ="0316769487".
+    isbn = re.sub(r"[^0-9X]", "", (value or "").upper())
+    return isbn if len(isbn) in (10, 13) else None
+
+
+def _import_batch(
+        session: Session,
+        library_import: schema.imports.LibraryImport,
+        rows: List[Optional[ImportRow]],
+        fetched: Dict[str, GoogleBook],
+):
+    unreadable = sum(1 for row in rows if row is None)
+    rows = [row for row in rows if row]
+    resolved = books.resolve_isbns(session, {row.isbn for row in rows}, fetched)
+
+    # The last row wins for books listed twice.
+    book_rows: Dict[int, ImportRow] = {}
+    for row in rows:
+        if row.isbn in resolved:
+            book_rows[resolved[row.isbn].id] = row
+    library_import.rows_failed += unreadable + sum(1 for row in rows if row.isbn not in resolved)
+
+    _add_to_collections(session, library_import.user_id, book_rows)
+    rated = {book_id: row for book_id, row in book_rows.items() if row.stars}
+    _add_reviews(session, library_import, rated)
+    library_import.books_imported += len(book_rows)
+
+
+def _add_to_collections(session: Session, user_id: int, book_rows: Dict[int, ImportRow]):
+    stmt = select(schema.collections.Collection.type, schema.collections.Collection.id).join(
+        schema.collections.CollectionUserLink,
+        schema.collections.CollectionUserLink.collection_id == schema.collections.Collection.id,
+    ).where(
+        (schema.collections.CollectionUserLink.user_id == user_id) &
+        (
+            schema.collections.CollectionUserLink.type ==
+            schema.collections.CollectionUserLinkType.OWNER
+        ) &
+        col(schema.collections.Collection.type).is_not(None)
+    )
+    collection_ids = dict(session.exec(stmt).all())
+
+    links = {}
+    for book_id, row in book_rows.items():
+        # Rated books have been read, whatever the shelf says.
+        if row.stars:
+            collection_type = schema.collections.CollectionType.COMPLETE
+        else:
+            collection_type = SHELF_TO_COLLECTION_TYPE.get(
+                row.shelf, schema.collections.CollectionType.SAVED,
+            )
+        collection_id = collection_ids.get(collection_type)
+        if collection_id is not None:
+            links[book_id] = (collection_id, row.added_at or datetime.utcnow())
+    if not links:
+        return
+
+    # Like a review does, finishing a book takes it off the saved and active shelves.
+    complete_id = collection_ids.get(schema.collections.CollectionType.COMPLETE)
+    finished = [
+        book_id for book_id, (collection_id, _) in links.items() if collection_id == complete_id
+    ]
+    shelves = [
+        collection_ids[t]
+        for t in (schema.collections.CollectionType.SAVED, schema.collections.CollectionType.ACTIVE)
+        if t in collection_ids
+    ]
+    if finished and shelves:
+        session.query(schema.collections.CollectionBookLink).filter(
+            col(schema.collections.CollectionBookLink.collection_id).in_(shelves) &
+            col(schema.collections.CollectionBookLink.book_id).in_(finished)
+        ).delete(synchronize_session=False)
+
+    stmt = insert(schema.collections.CollectionBookLink).values([
+        {"collection_id": collection_id, "book_id": book_id, "created_at": added_at}
+        for book_id, (collection_id, added_at) in sorted(links.items())
+    ])
+    session.execute(stmt.on_conflict_do_nothing())
+
+
+def _reaction(stars: int) -> schema.reviews.Reaction:
+    if stars <= 2:
+        return schema.reviews.Reaction.NEGATIVE
+    if stars == 3:
+        return schema.reviews.Reaction.NEUTRAL
+    return schema.reviews.Reaction.POSITIVE
+
+
+def _add_reviews(
+        session: Session,
+        library_import: schema.imports.LibraryImport,
+        book_rows: Dict[int, ImportRow],
+):
+    """Adds reviews for the rated books the user has not reviewed yet.
+
+    Books with the same star rating share a rank. Each reaction's imported
+    tiers rank above the user's earlier reviews, higher stars higher.
+    """
+    user_id = library_import.user_id
+    reviewed = session.exec(select(schema.reviews.Review.book_id).where(
+        (schema.reviews.Review.user_id == user_id) &
+        col(schema.reviews.Review.book_id).in_(list(book_rows))
+    )).all()
+    for book_id in reviewed:
+        book_rows.pop(book_id)
+    if not book_rows:
+        return
+
+    tiers: Dict[Tuple[schema.reviews.Reaction, int], List[int]] = {}
+    for book_id, row in sorted(book_rows.items()):
+        tiers.setdefault((_reaction(row.stars), row.stars), []).append(book_id)
+
+    review_ids: List[int] = []
+    review_tiers = dict(library_import.review_tiers)
+    for (reaction, stars), book_ids in sorted(tiers.items()):
+        rank = _tier_rank(session, user_id, review_tiers, reaction, stars)
+        stmt = insert(schema.reviews.Review).values([
+            {
+                "user_id": user_id,
+                "book_id": book_id,
+                "notes": book_rows[book_id].notes,
+                "rating": 0,
+                "rank": rank,
+                "reaction": reaction.value,
+                "hide_rank": False,
+            }
+            for book_id in book_ids
+        ]).returning(schema.reviews.Review.id)
+        review_ids += session.execute(stmt).scalars().all()
+        review_tiers.setdefault(f"{reaction.value}:{stars}", book_ids[0])
+
+    for reaction in {reaction for reaction, _ in tiers}:
+        _sync_ratings(session, user_id, reaction)
+    ratings.sync_hide_rank(session, user_id)
+    # Shown in feeds like reviews made in the app.
+    reviews.add_review_activities(session, user_id, review_ids)
+
+    library_import.review_tiers = review_tiers
+    library_import.reviews_imported += len(book_rows)
+
+
+def _tier_rank(
+        session: Session,
+        user_id: int,
+        review_tiers: Dict[str, int],
+        reaction: schema.reviews.Reaction,
+        stars: int,
+) -> int:
+    """The rank of the tier, opening a rank for it if it is new."""
+    def rank_of(book_id: int) -> Optional[int]:
+        return session.exec(select(schema.reviews.Review.rank).where(
+            (schema.reviews.Review.user_id == user_id) & (schema.reviews.Review.book_id == book_id)
+        )).first()
+
+    existing = review_tiers.get(f"{reaction.value}:{stars}")
+    rank = rank_of(existing) if existing is not None else None
+    if rank is not None:
+        return rank
+
+    higher = [
+        book_id for s in range(stars + 1, 6)
+        if (book_id := review_tiers.get(f"{reaction.value}:{s}")) is not None
+    ]
+    rank = rank_of(higher[0]) if higher else None
+    if rank is None:
+        return ratings.get_max_rank(session, user_id, reaction) + 1
+
+    # Below the next higher tier, which moves up with everything above it.
+    session.execute(update(schema.reviews.Review).where(
+        (schema.reviews.Review.user_id == user_id) &
+        (schema.reviews.Review.reaction == reaction.value) &
+        (schema.reviews.Review.rank >= rank)
+    ).values(rank=schema.reviews.Review.rank + 1).execution_options(synchronize_session=False))
+    return rank
+
+
+def _sync_ratings(session: Session, user_id: int, reaction: schema.reviews.Reaction):
+    # ratings.generate_rating for every review of the reaction, in one statement.
+    interval = schema.reviews.REACTION_INTERVAL[reaction]
+    max_rank = ratings.get_max_rank(session, user_id, reaction)
+    session.execute(update(schema.reviews.Review).where(
+        (schema.reviews.Review.user_id == user_id) &
+        (schema.reviews.Review.reaction == reaction.value)
+    ).values(
+        rating=(
+            schema.reviews.Review.rank * (interval.high - interval.low) / max_rank + interval.low
+        ),
+    ).execution_options(synchronize_session=False))
@@ -1,9 +1,11 @@
+from datetime import datetime
 from typing import List
 
-from sqlalchemy import func
+from sqlalchemy import func, insert
 from sqlmodel import Session, col, select, delete
 
 import src.db.schema as schema
+from src.db.unit_of_work import transactional
 from src.domain.utils import ratings
 
 
@@ -48,6 +50,7 @@ def get_reviews(
     return session.exec(stmt).all()
 
 
+@transactional
 def upsert_review(
     session: Session,
     review: schema.reviews.Review,
@@ -94,22 +97,27 @@ def upsert_review(
     _update_collections_from_review_insertion(session, review.user_id, review.book_id)
 
     review = get_review(session, review.user_id, review.book_id)
+    add_review_activities(session, review.user_id, [review.id])
 
-    activity = schema.activity.Activity()
-    session.add(activity)
-    session.flush()
-    ra = schema.activity.ReviewActivity(
-        activity_id=activity.id,
-        user_id=review.user_id,
-        review_id=review.id,
-    )
-    session.add(ra)
+    return review
 
-    session.commit()
 
-    return review
+def add_review_activities(session: Session, user_id: int, review_ids: List[int]):
+    """Adds the feed activity of each review, in two statements."""
+    if not review_ids:
+        return
+    created_at = datetime.utcnow()
+    stmt = insert(schema.activity.Activity).values(
+        [{"created_at": created_at} for _ in review_ids]
+    ).returning(schema.activity.Activity.id)
+    activity_ids = session.execute(stmt).scalars().all()
+    session.execute(insert(schema.activity.ReviewActivity).values([
+        {"activity_id": activity_id, "user_id": user_id, "review_id": review_id}
+        for activity_id, review_id in zip(activity_ids, review_ids)
+    ]))
 
 
+@transactional
 def delete_review(session: Session, review: schema.reviews.Review):
     stmt = select(schema.activity.ReviewActivity).where(schema.activity.ReviewActivity.review_id == review.id)
     activities = session.exec(stmt).all()
@@ -118,7 +126,6 @@ def delete_review(session: Session, review: schema.reviews.Review):
     user_id = review.user_id
     ratings.delete_review_sync_ratings(session, review)
     ratings.sync_hide_rank(session, user_id)
-    session.commit()
 
 
 # """
@@ -7,9 +7,12 @@ from fastapi import UploadFile
 from python_usernames import is_safe_username
 from sqlalchemy import func
 from sqlmodel import Session, select, col
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import src.db.schema as schema
 from resources.exceptions import InvalidArgumentException
+from src.auth.user import invalidate_request_user
+from src.db.unit_of_work import on_commit, transactional
 
 DEFAULT_PAGE_LIMIT = 10
 MAXIMUM_PATE_LIMIT = 100
@@ -80,6 +83,14 @@ def search_users(
     return page
 
 
+async def asearch_users(
+        session: AsyncSession,
+        f: schema.filter.Filter,
+        user_id: int,
+) -> schema.users.UserPage:
+    return await session.run_sync(search_users, f, user_id)
+
+
 def _validate_filter(
         f: schema.filter.Filter,
 ):
@@ -143,6 +154,19 @@ def get_linked_users(
     return session.exec(stmt).all()
 
 
+async def aget_linked_users_read(
+        session: AsyncSession,
+        users_filter: schema.users.LinkedUsersFilter,
+        user_id: int,
+) -> List[schema.users.UserRead]:
+    def _get_linked_users_read(sync_session: Session) -> List[schema.users.UserRead]:
+        us = get_linked_users(sync_session, users_filter)
+        return add_current_user_links(sync_session, us, user_id)
+
+    return await session.run_sync(_get_linked_users_read)
+
+
+@transactional
 def upsert_user(
         session: Session,
         user: schema.users.User,
@@ -157,15 +181,19 @@ def upsert_user(
     user = session.merge(user)
     if new_user:
         _insert_default_collections(session, user)
-    session.commit()
+    session.flush()
     session.refresh(user)
+    sub = user.sub
+    on_commit(session, lambda: invalidate_request_user(sub))
     return user
 
 
+@transactional
 def delete_user(session: Session, user: schema.users.User):
     # TODO(arden) on delete cascade.
+    sub = user.sub
     session.delete(user)
-    session.commit()
+    on_commit(session, lambda: invalidate_request_user(sub))
 
 
 def get_user_link(
@@ -178,6 +206,7 @@ def get_user_link(
     return session.exec(stmt).one()
 
 
+@transactional
 def upsert_user_link(
         session: Session,
         user_link: schema.users.UserLink,
@@ -194,13 +223,12 @@ def upsert_user_link(
         session.add(fu)
 
     session.merge(user_link)
-    session.commit()
     return user_link
 
 
+@transactional
 def delete_user_link(session: Session, user_link: schema.users.UserLink):
     session.delete(user_link)
-    session.commit()
 
 
 tag_length_minimum = 2
@@ -261,16 +289,18 @@ def validate_new_tag(session: Session, tag: str) -> schema.users.TagValidation:
     )
 
 
+@transactional
 def insert_feedback(
     session: Session,
     feedback: schema.users.FeedbackWrite,
 ) -> schema.users.FeedbackRead:
     db_feedback = schema.users.Feedback.from_orm(feedback)
     session.add(db_feedback)
-    session.commit()
+    session.flush()
     return schema.users.FeedbackRead.from_orm(db_feedback)
 
 
+@transactional
 def upsert_avatar(
     session: Session,
     user_id: int,
@@ -286,6 +316,5 @@ def upsert_avatar(
     user.avatar_filepath = filepath
 
     user = session.merge(user)
-    session.commit()
 
     return user.avatar_filepath
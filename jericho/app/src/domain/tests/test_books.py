@@ -1,7 +1,16 @@
-from sqlmodel import Session
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from google_books_client.models import Book as GoogleBook, BookSearchResultSet
+from pytest import raises
+from sqlmodel import Session, select
 
 import src.db.schema as schema
 from src.domain.service import books
+from src.db.instrumentation import query_budget
+from src.db import jobs
+from src.db.jobs import JobWorkerPool
+from src.domain.utils import loaders, search, search_cache, typeahead
 
 
 def test_crud_book(session: Session):
@@ -22,3 +31,466 @@ def test_crud_book(session: Session):
     book = books.get_book(session, book.id)
     assert book is not None
     assert book.title != title
+
+
+def test_search_books_local(session: Session, monkeypatch):
+    for title, author in [
+        ("Harry Potter and the Philosopher's Stone", "J. K. Rowling"),
+        ("Harry Potter and the Chamber of Secrets", "Joanne Rowling"),
+        ("Solito", "Javier Zamora"),
+    ]:
+        books.upsert_book(session, schema.books.Book(
+            title=title, authors=[schema.books.Author(name=author)],
+        ))
+
+    results, total = search.search_books(session, "harr pot", limit=1)
+    assert total == 2
+    assert len(results) == 1
+    assert results[0].title.startswith("Harry Potter")
+
+    results, total = search.search_books(session, "zamo", limit=10)
+    assert [b.title for b in results] == ["Solito"]
+    assert search.search_books(session, "?!", limit=10) == ([], 0)
+
+    def google_search(**kwargs):
+        raise AssertionError("local results should have been enough")
+
+    monkeypatch.setattr(books, "local_search_min_results", 2)
+    monkeypatch.setattr(books.googleClient, "search_book", google_search)
+    page = books.search_books_v2(session, schema.filter.Filter(q="potter", limit=5), user_id=0)
+    assert page.total_count == 2
+    assert len(page.books) == 2
+
+
+class FakeGoogleSearch:
+    def __init__(self, *titles: str, authors=None):
+        self.books = [
+            GoogleBook(title=title, authors=authors or [], id=f"gid{i}")
+            for i, title in enumerate(titles)
+        ]
+        self.calls = 0
+        self.start_indexes = []
+
+    def __call__(
+        self, search_term: str, start_index: int = 0, max_results: int = 40,
+    ) -> BookSearchResultSet:
+        self.calls += 1
+        self.start_indexes.append(start_index)
+        return BookSearchResultSet(
+            books=self.books[start_index:start_index + max_results],
+            total_items=len(self.books),
+        )
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def test_search_books_google_cache(session: Session, monkeypatch):
+    google_search = FakeGoogleSearch("Dune", "Dune Messiah")
+    monkeypatch.setattr(books.googleClient, "search_book", google_search)
+    search_cache.search_results.clear()
+    f = schema.filter.Filter(q="Dune  ", limit=5)
+
+    page = books.search_books_v2(session, f, user_id=0)
+    assert [b.book.title for b in page.books] == ["Dune", "Dune Messiah"]
+    assert google_search.calls == 1
+
+    lookups = search_cache.google_search_cache_lookups
+    memory_hits = lookups.value(result="memory")
+    page = books.search_books_v2(session, schema.filter.Filter(q="dune", limit=5), user_id=0)
+    assert [b.book.gid for b in page.books] == ["gid0", "gid1"]
+    assert page.total_count == 2
+    assert lookups.value(result="memory") == memory_hits + 1
+
+    search_cache.search_results.clear()
+    db_hits = lookups.value(result="db")
+    books.search_books_v2(session, f, user_id=0)
+    assert lookups.value(result="db") == db_hits + 1
+    assert google_search.calls == 1
+
+    search_cache.prune(session, max_rows=0)
+    assert not session.exec(select(schema.books.GoogleSearchCache)).all()
+
+
+def test_search_books_asks_google_outside_transaction(session: Session, monkeypatch):
+    google_search = FakeGoogleSearch("Dune")
+    search_cache.search_results.clear()
+
+    def search_book(**kwargs) -> BookSearchResultSet:
+        assert not session.in_transaction()
+        return google_search(**kwargs)
+
+    monkeypatch.setattr(books.googleClient, "search_book", search_book)
+    page = books.search_books_v2(session, schema.filter.Filter(q="outside", limit=5), user_id=0)
+    assert [b.book.title for b in page.books] == ["Dune"]
+    assert google_search.calls == 1
+
+
+def test_insert_missing_books_in_bulk(session: Session):
+    books.upsert_book(session, schema.books.Book(title="Existing", gid="gid1"))
+    google_books = FakeGoogleSearch(
+        *[f"Book {i}" for i in range(40)],
+        authors=["Frank Herbert", "Brian Herbert"],
+    ).books
+    google_books[5].title = None  # violates book.title NOT NULL
+
+    with query_budget(100):
+        result = books._insert_missing_books_and_return_v2(session, google_books)
+
+    assert [b.gid for b in result] == [b.id for b in google_books if b.id != "gid5"]
+    assert result[1].title == "Existing"
+    assert sorted(a.name for a in result[0].authors) == ["Brian Herbert", "Frank Herbert"]
+
+    # A batch without failures takes a fixed number of statements.
+    titles = [f"Book {i}" for i in range(40, 80)]
+    google_books = FakeGoogleSearch(*titles, authors=["Frank Herbert"]).books
+    for i, b in enumerate(google_books):
+        b.id = f"gid{i + 40}"
+    with query_budget(10):
+        assert len(books._insert_missing_books_and_return_v2(session, google_books)) == 40
+
+
+def test_enrich_book_tags(session: Session, monkeypatch):
+    subjects = {
+        "gid0": ["Fiction / Science Fiction / General", "Fiction / Classics"],
+        "gid1": ["Fiction / Science Fiction"],
+        "gid2": None,
+    }
+
+    def get_book_by_id(gid: str) -> GoogleBook:
+        return GoogleBook(title=gid, authors=[], id=gid, subjects=subjects[gid])
+
+    monkeypatch.setattr(books.googleClient, "get_book_by_id", get_book_by_id)
+    ids = [books.upsert_book(session, schema.books.Book(title=gid, gid=gid)).id for gid in subjects]
+
+    with query_budget(6):
+        assert not books.enrich_book_tags(session, ids[:2])
+    book_tags = books.get_book_tags(session, ids[0])
+    assert sorted(t.tag_name for t in book_tags.tags) == ["classics", "fiction", "science fiction"]
+    assert not book_tags.pending
+
+    assert books.backfill_book_tags(session, batch_size=1) == 1
+    assert not books.get_book_tags(session, ids[2]).tags
+
+
+def test_tag_enrichment_jobs(session: Session, monkeypatch):
+    fetched = []
+    book_ids = {}
+
+    def get_book_by_id(gid: str) -> GoogleBook:
+        fetched.append(gid)
+        # The claim committed, its job is not locked while Google is asked.
+        with Session(session.get_bind()) as other:
+            other.exec(select(schema.jobs.Job).where(
+                schema.jobs.Job.key == str(book_ids[gid])
+            ).with_for_update(nowait=True)).all()
+        if gid == "gid1":
+            raise ConnectionError("google unreachable")
+        return GoogleBook(title=gid, authors=[], id=gid, subjects=["Fiction"])
+
+    monkeypatch.setattr(books.googleClient, "get_book_by_id", get_book_by_id)
+    result = books._insert_missing_books_and_return_v2(
+        session, FakeGoogleSearch("Dune", "Emma").books,
+    )
+    session.commit()
+    book_ids.update({b.gid: b.id for b in result})
+    dune, emma = [b.id for b in result]
+
+    # Reads do not wait on Google.
+    assert books.get_book_tags(session, dune).pending
+    assert not fetched
+
+    pool = JobWorkerPool(lambda: Session(session.get_bind()), retry_backoff_seconds=0)
+    assert pool.run_once() == 2
+    assert sorted(fetched) == ["gid0", "gid1"]
+    assert [t.tag_name for t in books.get_book_tags(session, dune).tags] == ["fiction"]
+    assert books.get_book_tags(session, emma).pending  # retried
+
+    session.expire_all()
+    job = session.exec(select(schema.jobs.Job).where(schema.jobs.Job.key == str(emma))).one()
+    assert job.attempts == 1
+    assert job.last_error == "failed"
+
+
+def test_stale_books_refresh_in_background(session: Session, monkeypatch):
+    fetched = []
+
+    def get_book_by_id(gid: str) -> GoogleBook:
+        fetched.append(gid)
+        return GoogleBook(title=f"{gid} 2nd edition", authors=[], id=gid, subjects=["Fiction"])
+
+    monkeypatch.setattr(books.googleClient, "get_book_by_id", get_book_by_id)
+    stale, fresh = books._insert_missing_books_and_return_v2(
+        session, FakeGoogleSearch("Refresh", "Fresh").books,
+    )
+    stale.refreshed_at = datetime.utcnow() - timedelta(seconds=books.book_refresh_ttl_seconds + 1)
+    session.add(stale)
+    session.commit()
+    stale_id, fresh_id, gid = stale.id, fresh.id, stale.gid
+
+    pool = JobWorkerPool(lambda: Session(session.get_bind()))
+    monkeypatch.setattr(jobs, "_running", {pool})
+    pool.run_once()  # tag enrichment of the new books
+    fetched.clear()
+
+    # The stale row is served right away, concurrent reads share one refresh.
+    for _ in range(3):
+        assert books.get_book(session, stale_id, 0).book.title == "Refresh"
+    books.get_book(session, fresh_id, 0)
+    assert not fetched
+
+    pool.run_once()
+    assert fetched == [gid]
+
+    session.expire_all()
+    assert books.get_book(session, stale_id, 0).book.title == f"{gid} 2nd edition"
+    assert search.search_books(session, "2nd edition", limit=10)[1] == 1
+
+    # Fresh again, so reading it requests nothing.
+    pool.run_once()
+    assert fetched == [gid]
+
+
+def test_search_books_google_paging(session: Session, monkeypatch):
+    google_search = FakeGoogleSearch(*[f"Dune {i}" for i in range(5)])
+    monkeypatch.setattr(books.googleClient, "search_book", google_search)
+    monkeypatch.setattr(books, "_prefetch_executor", InlineExecutor())
+    search_cache.search_results.clear()
+
+    f = schema.filter.Filter(q="dune", offset=0, limit=2)
+    page = books.search_books_v2(session, f, user_id=0)
+    assert [b.book.title for b in page.books] == ["Dune 0", "Dune 1"]
+    assert page.total_count == 5
+    # Page 2 was prefetched once page 1 committed.
+    assert google_search.start_indexes == [0, 2]
+
+    f = schema.filter.Filter(q="dune", offset=2, limit=2)
+    page = books.search_books_v2(session, f, user_id=0)
+    assert [b.book.title for b in page.books] == ["Dune 2", "Dune 3"]
+    assert google_search.start_indexes == [0, 2, 4]
+
+    # The last page has nothing after it to prefetch.
+    books.search_books_v2(session, schema.filter.Filter(q="dune", offset=4, limit=2), user_id=0)
+    assert google_search.start_indexes == [0, 2, 4]
+
+
+def test_get_user_books_keyset_pages(session: Session):
+    user = schema.users.User(sub="auth0|reader")
+    shelf = schema.collections.Collection(name="Shelf")
+    other = schema.collections.Collection(name="Other")
+    session.add_all([user, shelf, other])
+    session.commit()
+
+    titles = ["Emma", "Beloved", "Dune", "Carrie", "Atonement"]
+    added = datetime(2026, 1, 1)
+    # Dune and Carrie were added at the same time, ties go by id.
+    for title, days in zip(titles, [0, 1, 2, 2, 4]):
+        book = books.upsert_book(session, schema.books.Book(title=title))
+        at = added + timedelta(days=days)
+        session.add(schema.collections.CollectionBookLink(
+            collection_id=shelf.id, book_id=book.id, created_at=at,
+        ))
+        if title == "Emma":
+            session.add(schema.collections.CollectionBookLink(
+                collection_id=other.id, book_id=book.id, created_at=added + timedelta(days=10),
+            ))
+    session.commit()
+
+    def pages(**kwargs):
+        f = schema.books.BookFilter(user_id=user.id, limit=2, **kwargs)
+        while True:
+            page = books.get_user_books(session, f)
+            yield page
+            if page.next_cursor is None:
+                return
+            f.cursor = page.next_cursor
+
+    result = list(pages(collection_ids=[shelf.id]))
+    assert [[b.book.title for b in page.books] for page in result] == [
+        ["Atonement", "Carrie"], ["Dune", "Beloved"], ["Emma"],
+    ]
+    assert {page.total_count for page in result} == {5}
+
+    result = list(pages(collection_ids=[shelf.id], sort=schema.books.BookSort.TITLE))
+    assert [b.book.title for page in result for b in page.books] == sorted(titles)
+
+    # A book in several collections is listed once, by its latest addition.
+    result = list(pages(collection_ids=[shelf.id, other.id]))
+    assert [b.book.title for page in result for b in page.books] == [
+        "Emma", "Atonement", "Carrie", "Dune", "Beloved",
+    ]
+    assert result[0].total_count == 5
+
+    page = books.get_user_books(session, schema.books.BookFilter(
+        user_id=user.id, collection_ids=[shelf.id], offset=4, limit=2,
+    ))
+    assert [b.book.title for b in page.books] == ["Emma"]
+    assert page.next_cursor is None
+
+    # An added-at cursor needs the time it was taken at.
+    with raises(HTTPException) as e:
+        books.get_user_books(session, schema.books.BookFilter(
+            user_id=user.id, collection_ids=[shelf.id], cursor=schema.books.BookCursor(id=1),
+        ))
+    assert e.value.status_code == 422
+
+
+def test_get_following_user_books(session: Session):
+    book = books.upsert_book(session, schema.books.Book(
+        title="Solito", authors=[schema.books.Author(name="Zamora")],
+    ))
+    me = schema.users.User(sub="auth0|me")
+    readers = [schema.users.User(sub=f"auth0|reader{i}") for i in range(5)]
+    session.add_all([me, *readers])
+    session.commit()
+
+    for i, reader in enumerate(readers):
+        session.add(schema.users.UserLink(
+            parent_id=me.id, child_id=reader.id, type=schema.users.UserLinkType.FOLLOW,
+        ))
+        if i % 2 == 0:
+            shelf = schema.collections.Collection(name="Reading")
+            session.add(shelf)
+            session.flush()
+            session.add(schema.collections.CollectionUserLink(
+                collection_id=shelf.id, user_id=reader.id,
+                type=schema.collections.CollectionUserLinkType.OWNER,
+            ))
+            session.add(schema.collections.CollectionBookLink(
+                collection_id=shelf.id, book_id=book.id,
+            ))
+    session.add(schema.reviews.Review(
+        user_id=readers[1].id, book_id=book.id, rating=8.0, rank=0, reaction="positive",
+    ))
+    session.commit()
+    book_id, me_id, reader_ids = book.id, me.id, [reader.id for reader in readers]
+    session.expire_all()
+
+    with query_budget(5):
+        result = books.get_following_user_books(session, book_id, me_id)
+
+    # reader 3 is followed but has not shelved or reviewed the book.
+    assert [b.user_id for b in result] == [reader_ids[i] for i in (0, 1, 2, 4)]
+    assert [len(b.collections) for b in result] == [1, 0, 1, 1]
+    assert result[1].review.rating == 8.0
+    assert result[0].authors[0].name == "Zamora"
+
+
+def test_books_to_page_batches_relations(session: Session):
+    user = schema.users.User(sub="auth0|batched")
+    shelf = schema.collections.Collection(name="Shelf")
+    session.add_all([user, shelf])
+    session.flush()
+    session.add(schema.collections.CollectionUserLink(
+        collection_id=shelf.id, user_id=user.id,
+        type=schema.collections.CollectionUserLinkType.OWNER,
+    ))
+    for i in range(6):
+        book = books.upsert_book(session, schema.books.Book(
+            title=f"Batched {i}", authors=[schema.books.Author(name=f"Batched Author {i}")],
+        ))
+        session.add(schema.collections.CollectionBookLink(collection_id=shelf.id, book_id=book.id))
+        if i == 0:
+            session.add(schema.reviews.Review(
+                user_id=user.id, book_id=book.id, rating=5.0, rank=0, reaction="neutral",
+            ))
+    session.commit()
+    user_id, shelf_id = user.id, shelf.id
+    session.expire_all()
+
+    # The page and its count, then authors, collections, their user links and reviews.
+    f = schema.books.BookFilter(
+        user_id=user_id, collection_ids=[shelf_id], sort=schema.books.BookSort.TITLE,
+    )
+    with query_budget(6):
+        page = books.get_user_books(session, f)
+    assert [b.authors[0].name for b in page.books] == [f"Batched Author {i}" for i in range(6)]
+    assert all(b.collections[0].user_links[0].user_id == user_id for b in page.books)
+    assert page.books[0].review.rating == 5.0
+
+    # Memoized for the rest of the request.
+    with query_budget(0):
+        loaders.loaders(session).book_authors().load_many(b.book.id for b in page.books)
+
+
+def test_batch_loader():
+    fetched = []
+
+    def fetch(keys):
+        fetched.append(keys)
+        return {key: key * 2 for key in keys if key != 3}
+
+    loader = loaders.BatchLoader(fetch, default=lambda: -1)
+    assert loader.load_many([1, 2, 1, 3]) == [2, 4, 2, -1]
+    assert loader.load_many([2, 4]) == [4, 8]
+    assert fetched == [[1, 2, 3], [4]]
+
+
+def test_loaders_are_dropped_on_write(session: Session):
+    batch = loaders.loaders(session)
+    assert loaders.loaders(session) is batch
+    session.add(schema.books.Book(title="Dropped"))
+    session.flush()
+    assert loaders.loaders(session) is not batch
+
+
+def test_typeahead_index():
+    index = typeahead.TypeaheadIndex(max_results=3, max_key_chars=12)
+    book, author = schema.books.SuggestionType.BOOK, schema.books.SuggestionType.AUTHOR
+    index.add(book, 1, "Harry Potter and the Philosopher's Stone", popularity=5)
+    index.add(book, 2, "Harry Potter and the Chamber of Secrets", popularity=9)
+    index.add(author, 3, "Harriet Beecher Stowe")
+    index.add(book, 4, "The the")
+    index.add(book, 5, "Les Misérables")
+
+    def ids(q, limit=None):
+        return [(s.type, s.id) for s in index.suggest(q, limit)]
+
+    # Any word start, most shelved first, then shortest.
+    assert ids("harr") == [(book, 2), (book, 1), (author, 3)]
+    assert ids("POTTER  and") == [(book, 2), (book, 1)]
+    assert ids("stow") == [(author, 3)]
+    assert ids("harr", limit=1) == [(book, 2)]
+    assert ids("otter") == []
+    assert ids("the") == [(book, 2), (book, 1), (book, 4)]
+    assert ids("miser") == [(book, 5)]
+    assert index.suggest("misé")[0].text == "Les Misérables"
+    # Past max_key_chars the rest of the query filters.
+    assert ids("harry potter and the phil") == [(book, 1)]
+    assert ids("...") == []
+
+
+def test_typeahead_sync(session: Session):
+    read = books.upsert_book(session, schema.books.Book(title="Demon Copperhead", authors=[
+        schema.books.Author(name="Barbara Kingsolver"),
+    ]))
+    shelf = schema.collections.Collection(name="Read")
+    session.add(shelf)
+    session.flush()
+    session.add(schema.collections.CollectionBookLink(collection_id=shelf.id, book_id=read.id))
+    books.upsert_book(session, schema.books.Book(title="Demons"))
+    session.commit()
+
+    index = typeahead.TypeaheadIndex(batch_size=1)
+    index.rebuild(session)
+    assert [s.text for s in index.suggest("dem")] == ["Demon Copperhead", "Demons"]
+    assert [s.type for s in index.suggest("kings")] == [schema.books.SuggestionType.AUTHOR]
+
+    books.upsert_book(session, schema.books.Book(title="Democracy in America"))
+    session.commit()
+    assert index.sync(session) == 1
+    assert index.sync(session) == 0
+    assert [s.text for s in index.suggest("democ")] == ["Democracy in America"]
+    assert index.stats()["suggestions"] == 4
+
+    # An id taken before the last one synced, committed after it.
+    with Session(session.get_bind()) as other:
+        other.add(schema.books.Book(title="Demonology"))
+        other.flush()
+        books.upsert_book(session, schema.books.Book(title="Demonstrations"))
+        assert index.sync(session) == 1
+        other.commit()
+    assert index.sync(session) == 1
+    assert [s.text for s in index.suggest("demonol")] == ["Demonology"]
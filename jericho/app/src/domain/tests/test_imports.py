@@ -0,0 +1,227 @@
+import io
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, UploadFile
+from google_books_client.models import Book as GoogleBook
+from pytest import raises
+from sqlmodel import Session, col, select
+
+import src.db.schema as schema
+from src.db.jobs import JobWorkerPool
+from src.domain.service import books, imports, users
+
+GOODREADS_CSV = '''Book Id,Title,Author,ISBN,ISBN13,My Rating,Date Added,Exclusive Shelf,My Review
+1,Local,A,"=""0000000001""","=""""",0,2021/03/04,to-read,
+2,Dune,B,"=""""","=""9780000000002""",5,2021/03/05,read,Loved it
+3,Emma,C,"=""""","=""9780000000003""",5,2021/03/06,read,
+4,Solito,D,"=""""","=""9780000000004""",2,2021/03/07,read,
+5,Nowhere,E,"=""""","=""9780000000005""",0,2021/03/08,currently-reading,
+6,Unknown,F,"=""""","=""""",0,2021/03/09,to-read,
+7,Reading,G,"=""""","=""9780000000007""",0,2021/03/10,currently-reading,
+'''
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def _upload(filename: str, content: bytes) -> UploadFile:
+    return UploadFile(filename=filename, file=io.BytesIO(content))
+
+
+def _user(session: Session, sub: str) -> int:
+    return users.upsert_user(session, schema.users.User(sub=sub)).id
+
+
+def _shelves(session: Session, user_id: int) -> dict:
+    stmt = select(
+        schema.collections.Collection.type, schema.collections.CollectionBookLink.book_id,
+    ).join(
+        schema.collections.CollectionBookLink,
+        schema.collections.CollectionBookLink.collection_id == schema.collections.Collection.id,
+    ).join(
+        schema.collections.CollectionUserLink,
+        schema.collections.CollectionUserLink.collection_id == schema.collections.Collection.id,
+    ).where(schema.collections.CollectionUserLink.user_id == user_id)
+    shelves = {}
+    for collection_type, book_id in session.exec(stmt).all():
+        shelves.setdefault(collection_type, set()).add(book_id)
+    return shelves
+
+
+def test_library_import(session: Session, monkeypatch, tmp_path):
+    fetched = []
+
+    def get_book_by_isbn13(isbn: str) -> GoogleBook:
+        fetched.append(isbn)
+        # The import row is not locked while Google is asked.
+        with Session(session.get_bind()) as other:
+            other.get(
+                schema.imports.LibraryImport, created.id, with_for_update={"nowait": True},
+            )
+        if isbn == "9780000000005":
+            raise ValueError("not found")
+        return GoogleBook(title=f"Book {isbn}", authors=[], id=f"gid{isbn}", ISBN_13=isbn)
+
+    monkeypatch.setattr(books.googleClient, "get_book_by_isbn13", get_book_by_isbn13)
+    monkeypatch.setattr(imports, "import_upload_dir", str(tmp_path))
+    monkeypatch.setattr(imports, "import_batch_size", 2)
+    monkeypatch.setattr(imports, "_import_executor", InlineExecutor())
+
+    local = books.upsert_book(session, schema.books.Book(title="Local", isbn10="0000000001"))
+    user_id = _user(session, "auth0|importer")
+    local_id = local.id
+
+    created = imports.create_import(
+        session, user_id, _upload("goodreads_library_export.csv", GOODREADS_CSV.encode()),
+    )
+    assert created.status == schema.imports.LibraryImportStatus.PENDING
+    assert os.path.exists(os.path.join(tmp_path, f"{created.id}.csv"))
+
+    JobWorkerPool(lambda: Session(session.get_bind())).run_once()
+
+    session.expire_all()
+    library_import = imports.get_import(session, created.id, user_id)
+    assert library_import.status == schema.imports.LibraryImportStatus.FINISHED
+    assert library_import.rows_processed == 7
+    assert library_import.rows_failed == 2
+    assert library_import.books_imported == 5
+    assert library_import.reviews_imported == 3
+    assert library_import.processed_bytes == library_import.size_bytes
+    assert not os.listdir(tmp_path)
+
+    # The local book resolved without Google.
+    assert sorted(fetched) == [f"978000000000{i}" for i in (2, 3, 4, 5, 7)]
+
+    by_isbn = {b.isbn13: b.id for b in session.exec(
+        select(schema.books.Book).where(col(schema.books.Book.isbn13).is_not(None))
+    ).all()}
+    dune, emma, solito, reading = (by_isbn[f"978000000000{i}"] for i in (2, 3, 4, 7))
+    shelves = _shelves(session, user_id)
+    assert shelves[schema.collections.CollectionType.SAVED] == {local_id}
+    assert shelves[schema.collections.CollectionType.ACTIVE] == {reading}
+    assert shelves[schema.collections.CollectionType.COMPLETE] == {dune, emma, solito}
+
+    reviews = {r.book_id: r for r in session.exec(
+        select(schema.reviews.Review).where(schema.reviews.Review.user_id == user_id)
+    ).all()}
+    assert reviews[dune].notes == "Loved it"
+    assert reviews[dune].reaction == reviews[emma].reaction == schema.reviews.Reaction.POSITIVE
+    # Dune and Emma were imported in different batches into the same tier.
+    assert reviews[dune].rank == reviews[emma].rank
+    assert reviews[dune].rating == reviews[emma].rating == 10
+    assert reviews[solito].reaction == schema.reviews.Reaction.NEGATIVE
+    # The imported reviews show in feeds.
+    review_ids = session.exec(select(schema.activity.ReviewActivity.review_id).where(
+        schema.activity.ReviewActivity.user_id == user_id
+    )).all()
+    assert sorted(review_ids) == sorted(r.id for r in reviews.values())
+
+
+def test_library_import_jsonl_ranks_tiers(session: Session, monkeypatch, tmp_path):
+    monkeypatch.setattr(imports, "import_upload_dir", str(tmp_path))
+    book_ids = {}
+    for i in range(4):
+        isbn = f"97800000001{i:02d}"
+        book = books.upsert_book(session, schema.books.Book(title=f"Book {i}", isbn13=isbn))
+        book_ids[isbn] = book.id
+    user_id = _user(session, "auth0|jsonl")
+
+    rows = [
+        {"isbn13": "9780000000100", "rating": 4},
+        {"isbn13": "9780000000101", "rating": 5},
+        "not json",
+        {"isbn13": "9780000000102", "rating": 4},
+        {"isbn13": "9780000000103", "rating": 9},
+    ]
+    content = "\n".join(r if isinstance(r, str) else json.dumps(r) for r in rows)
+    created = imports.create_import(session, user_id, _upload("books.jsonl", content.encode()))
+    imports.run_import(session.get_bind(), created.id)
+
+    session.expire_all()
+    library_import = imports.get_import(session, created.id, user_id)
+    assert library_import.rows_failed == 2
+    assert library_import.reviews_imported == 3
+
+    ranks = {r.book_id: r.rank for r in session.exec(
+        select(schema.reviews.Review).where(schema.reviews.Review.user_id == user_id)
+    ).all()}
+    four, five, other_four = (ranks[book_ids[f"97800000001{i:02d}"]] for i in (0, 1, 2))
+    assert five > four == other_four
+
+
+def test_create_import_rejects_other_formats(session: Session):
+    user_id = _user(session, "auth0|xlsx")
+    with raises(HTTPException) as e:
+        imports.create_import(session, user_id, _upload("books.xlsx", b""))
+    assert e.value.status_code == 422
+
+    with raises(HTTPException) as e:
+        imports.get_import(session, 0, user_id)
+    assert e.value.status_code == 404
+
+
+def test_create_import_rejects_large_uploads(session: Session, monkeypatch, tmp_path):
+    monkeypatch.setattr(imports, "import_upload_dir", str(tmp_path))
+    monkeypatch.setattr(imports, "import_max_bytes", 4)
+    user_id = _user(session, "auth0|large")
+
+    with raises(HTTPException) as e:
+        imports.create_import(session, user_id, _upload("books.jsonl", b"{}\n{}\n"))
+    assert e.value.status_code == 413
+    assert not os.listdir(tmp_path)
+    assert not session.exec(
+        select(schema.imports.LibraryImport).where(schema.imports.LibraryImport.user_id == user_id)
+    ).all()
+
+
+def test_library_import_taken_over_once_stale(session: Session, monkeypatch, tmp_path):
+    monkeypatch.setattr(imports, "import_upload_dir", str(tmp_path))
+    monkeypatch.setattr(imports, "_import_executor", InlineExecutor())
+    user_id = _user(session, "auth0|stale")
+    created = imports.create_import(session, user_id, _upload("books.jsonl", b"{}\n"))
+
+    library_import = session.get(schema.imports.LibraryImport, created.id)
+    library_import.status = schema.imports.LibraryImportStatus.RUNNING.value
+    library_import.heartbeat_at = datetime.utcnow()
+    session.add(library_import)
+    session.commit()
+
+    # Still running elsewhere, checked again later.
+    assert imports._run_library_import_jobs(session, [str(created.id)]) == [str(created.id)]
+    session.commit()
+    assert session.get(schema.imports.LibraryImport, created.id).rows_processed == 0
+
+    stale = timedelta(seconds=imports.import_heartbeat_timeout_seconds + 1)
+    library_import.heartbeat_at = datetime.utcnow() - stale
+    session.add(library_import)
+    session.commit()
+    imports.resume_imports(session)
+    JobWorkerPool(lambda: Session(session.get_bind())).run_once()
+
+    session.expire_all()
+    library_import = imports.get_import(session, created.id, user_id)
+    assert library_import.status == schema.imports.LibraryImportStatus.FINISHED
+    assert library_import.rows_failed == 1
+
+
+def test_library_import_stops_between_batches(session: Session, monkeypatch, tmp_path):
+    monkeypatch.setattr(imports, "import_upload_dir", str(tmp_path))
+    stopping = threading.Event()
+    stopping.set()
+    monkeypatch.setattr(imports, "_stopping", stopping)
+    user_id = _user(session, "auth0|stopped")
+    created = imports.create_import(session, user_id, _upload("books.jsonl", b"{}\n"))
+
+    imports.run_import(session.get_bind(), created.id)
+
+    session.expire_all()
+    library_import = session.get(schema.imports.LibraryImport, created.id)
+    assert library_import.status == schema.imports.LibraryImportStatus.RUNNING
+    assert library_import.rows_processed == 0
+    # Claimable at once by the next start.
+    assert library_import.heartbeat_at is None
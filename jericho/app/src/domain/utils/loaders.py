@@ -0,0 +1,188 @@
+from collections import defaultdict
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, col, select
+
+import src.db.schema as schema
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_LOADERS = "loaders"
+
+
+class BatchLoader(Generic[K, V]):
+    """Fetches the values of many keys with one query and memoizes them.
+
+    fetch takes the keys not loaded yet and returns the values it found;
+    keys it did not return get default().
+    """
+
+    def __init__(
+        self, fetch: Callable[[List[K]], Dict[K, V]], default: Callable[[], V] = lambda: None,
+    ):
+        self.fetch = fetch
+        self.default = default
+        self._values: Dict[K, V] = {}
+
+    def load(self, key: K) -> V:
+        return self.load_many([key])[0]
+
+    def load_many(self, keys: Iterable[K]) -> List[V]:
+        keys = list(keys)
+        missing = list(dict.fromkeys(key for key in keys if key not in self._values))
+        if missing:
+            found = self.fetch(missing)
+            for key in missing:
+                self._values[key] = found[key] if key in found else self.default()
+        return [self._values[key] for key in keys]
+
+    def prime(self, key: K, value: V):
+        self._values.setdefault(key, value)
+
+
+class Loaders:
+    """The batch loaders of one session, so of one request.
+
+    Dropped whenever the session flushes, commits or rolls back, so a
+    memoized value never outlives a write.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._loaders: Dict[Hashable, BatchLoader] = {}
+
+    def _get(
+        self, key: Hashable, fetch: Callable[[List], Dict], default: Callable = lambda: None,
+    ) -> BatchLoader:
+        loader = self._loaders.get(key)
+        if loader is None:
+            loader = self._loaders[key] = BatchLoader(fetch, default)
+        return loader
+
+    def _by_id(self, model) -> BatchLoader:
+        def fetch(ids: List[int]) -> Dict[int, object]:
+            stmt = select(model).where(col(model.id).in_(ids))
+            return {row.id: row for row in self.session.exec(stmt).all()}
+
+        return self._get(model, fetch)
+
+    def _grouped(self, stmt_for: Callable[[List], object]) -> Callable[[List], Dict]:
+        def fetch(keys: List) -> Dict:
+            grouped = defaultdict(list)
+            for key, value in self.session.exec(stmt_for(keys)).all():
+                grouped[key].append(value)
+            return grouped
+
+        return fetch
+
+    def books(self) -> BatchLoader[int, Optional[schema.books.Book]]:
+        return self._by_id(schema.books.Book)
+
+    def users(self) -> BatchLoader[int, Optional[schema.users.User]]:
+        return self._by_id(schema.users.User)
+
+    def collections(self) -> BatchLoader[int, Optional[schema.collections.Collection]]:
+        return self._by_id(schema.collections.Collection)
+
+    def reviews(self) -> BatchLoader[int, Optional[schema.reviews.Review]]:
+        return self._by_id(schema.reviews.Review)
+
+    def book_authors(self) -> BatchLoader[int, List[schema.books.Author]]:
+        """Authors by book id."""
+        return self._get("book_authors", self._grouped(lambda book_ids: select(
+            schema.books.AuthorBookLink.book_id, schema.books.Author,
+        ).join(
+            schema.books.Author, schema.books.Author.id == schema.books.AuthorBookLink.author_id,
+        ).where(
+            col(schema.books.AuthorBookLink.book_id).in_(book_ids)
+        ).order_by(col(schema.books.Author.id))), list)
+
+    def collection_user_links(
+        self,
+    ) -> BatchLoader[int, List[schema.collections.CollectionUserLink]]:
+        """User links by collection id."""
+        return self._get("collection_user_links", self._grouped(lambda collection_ids: select(
+            schema.collections.CollectionUserLink.collection_id,
+            schema.collections.CollectionUserLink,
+        ).where(
+            col(schema.collections.CollectionUserLink.collection_id).in_(collection_ids)
+        )), list)
+
+    def owned_collections(
+        self, user_id: int,
+    ) -> BatchLoader[int, List[schema.collections.Collection]]:
+        """The collections user_id owns, by the id of a book in them."""
+        return self._get(("owned_collections", user_id), self._grouped(lambda book_ids: select(
+            schema.collections.CollectionBookLink.book_id, schema.collections.Collection,
+        ).join(
+            schema.collections.Collection,
+            schema.collections.Collection.id == schema.collections.CollectionBookLink.collection_id,
+        ).join(
+            schema.collections.CollectionUserLink,
+            schema.collections.CollectionUserLink.collection_id ==
+            schema.collections.CollectionBookLink.collection_id,
+        ).where(
+            col(schema.collections.CollectionBookLink.book_id).in_(book_ids) &
+            (schema.collections.CollectionUserLink.user_id == user_id) &
+            (schema.collections.CollectionUserLink.type ==
+             schema.collections.CollectionUserLinkType.OWNER)
+        ).order_by(col(schema.collections.Collection.id))), list)
+
+    def user_reviews(self, user_id: int) -> BatchLoader[int, Optional[schema.reviews.Review]]:
+        """The reviews of user_id, by book id."""
+
+        def fetch(book_ids: List[int]) -> Dict[int, schema.reviews.Review]:
+            stmt = select(schema.reviews.Review).where(
+                (schema.reviews.Review.user_id == user_id) &
+                col(schema.reviews.Review.book_id).in_(book_ids)
+            )
+            return {review.book_id: review for review in self.session.exec(stmt).all()}
+
+        return self._get(("user_reviews", user_id), fetch)
+
+    def activity_reactions(self) -> BatchLoader[int, List[schema.activity.ActivityReaction]]:
+        """Reactions by activity id."""
+        return self._get("activity_reactions", self._grouped(lambda activity_ids: select(
+            schema.activity.ActivityReaction.activity_id, schema.activity.ActivityReaction,
+        ).where(
+            col(schema.activity.ActivityReaction.activity_id).in_(activity_ids)
+        )), list)
+
+    def activity_comments(self) -> BatchLoader[int, List[schema.activity.ActivityComment]]:
+        """Comments by activity id, oldest first."""
+        return self._get("activity_comments", self._grouped(lambda activity_ids: select(
+            schema.activity.ActivityComment.activity_id, schema.activity.ActivityComment,
+        ).where(
+            col(schema.activity.ActivityComment.activity_id).in_(activity_ids)
+        ).order_by(col(schema.activity.ActivityComment.created_at))), list)
+
+    def attach_book_authors(self, books: List[schema.books.Book]):
+        """Sets book.authors on every book, without a lazy load each."""
+        for book, authors in zip(books, self.book_authors().load_many(b.id for b in books)):
+            set_committed_value(book, "authors", authors)
+
+    def attach_collection_user_links(self, collections: Iterable[schema.collections.Collection]):
+        """Sets collection.user_links, which CollectionRead includes."""
+        collections = list({c.id: c for c in collections}.values())
+        links_by_collection = self.collection_user_links().load_many(c.id for c in collections)
+        for collection, links in zip(collections, links_by_collection):
+            set_committed_value(collection, "user_links", links)
+
+
+def loaders(session: Session) -> Loaders:
+    """The session's loaders, created on first use."""
+    found = session.info.get(_LOADERS)
+    if found is None:
+        found = session.info[_LOADERS] = Loaders(session)
+    return found
+
+
+@event.listens_for(OrmSession, "after_flush")
+@event.listens_for(OrmSession, "after_commit")
+@event.listens_for(OrmSession, "after_soft_rollback")
+def _drop_loaders(session: OrmSession, *args):
+    session.info.pop(_LOADERS, None)
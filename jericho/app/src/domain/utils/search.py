@@ -0,0 +1,74 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, literal_column, text
+from sqlmodel import Session, col, select
+
+import src.db.schema as schema
+
+# Title matches outrank subtitle and author matches. The simple configuration
+# skips stemming and stop words, which suits names and prefix matching.
+INDEX_BOOKS_SQL = text("""
+INSERT INTO booksearch (book_id, document)
+SELECT
+    book.id,
+    setweight(to_tsvector('simple', coalesce(book.title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(book.subtitle, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(string_agg(author.name, ' '), '')), 'B')
+FROM book
+LEFT JOIN authorbooklink ON authorbooklink.book_id = book.id
+LEFT JOIN author ON author.id = authorbooklink.author_id
+WHERE book.id = ANY(:book_ids)
+GROUP BY book.id
+ON CONFLICT (book_id) DO UPDATE SET document = excluded.document
+""")
+
+SIMPLE_CONFIG = literal_column("'simple'::regconfig")
+
+
+def index_books(session: Session, book_ids: List[int]):
+    """Adds or refreshes the search documents of the given books."""
+    if book_ids:
+        session.execute(INDEX_BOOKS_SQL, {"book_ids": list(book_ids)})
+
+
+def to_prefix_tsquery(q: str) -> Optional[str]:
+    """Requires every word of q, each matching as a prefix, e.g. "harr pot" finds Harry Potter."""
+    words = re.findall(r"[^\W_]+", q.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def search_books(
+        session: Session,
+        q: str,
+        limit: int,
+        offset: int = 0,
+) -> Tuple[List[schema.books.Book], int]:
+    """Books matching q by rank, and the total number of matches."""
+    tsquery = to_prefix_tsquery(q)
+    if tsquery is None:
+        return [], 0
+
+    query = func.to_tsquery(SIMPLE_CONFIG, tsquery)
+    document = col(schema.books.BookSearch.document)
+    match = document.op("@@")(query)
+
+    stmt = select(schema.books.Book, func.count().over()).join(
+        schema.books.BookSearch,
+        schema.books.BookSearch.book_id == schema.books.Book.id,
+    ).where(match).order_by(
+        func.ts_rank(document, query).desc(),
+        col(schema.books.Book.id),
+    ).offset(offset).limit(limit)
+
+    results = session.exec(stmt).all()
+    if results:
+        return [book for book, _ in results], results[0][1]
+    if not offset:
+        return [], 0
+
+    # Paged past the end, the window count is not available.
+    count_stmt = select(func.count()).select_from(schema.books.BookSearch).where(match)
+    return [], session.exec(count_stmt).one()
@@ -0,0 +1,113 @@
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete, select
+
+import src.db.schema as schema
+from src import metrics
+from src.cache import TTLCache
+from src.config import (
+    google_search_cache_max_rows,
+    google_search_cache_size,
+    google_search_cache_ttl_seconds,
+)
+from src.db.unit_of_work import on_commit
+
+# The gids of a Google result page in order, and Google's total result count.
+CachedSearch = Tuple[Tuple[str, ...], int]
+
+# Expired rows and rows over google_search_cache_max_rows are deleted every
+# this many writes rather than on each one.
+PRUNE_EVERY_WRITES = 100
+
+search_results: TTLCache[CachedSearch] = TTLCache(
+    maxsize=google_search_cache_size,
+    ttl_seconds=google_search_cache_ttl_seconds,
+)
+_writes = itertools.count(1)
+
+google_search_cache_lookups = metrics.counter(
+    "google_search_cache_lookups_total",
+    "Google search cache lookups, by the tier that answered or miss.",
+    ["result"],
+)
+metrics.gauge(
+    "google_search_cache",
+    "In memory Google search cache statistics.",
+    search_results.stats,
+)
+
+
+def cache_key(search_term: str, offset: Optional[int], limit: int) -> str:
+    term = " ".join(search_term.lower().split())
+    return f"{term}|{offset or 0}|{limit}"
+
+
+def get(session: Session, key: str, record: bool = True) -> Optional[CachedSearch]:
+    """Looks key up in memory, then in Postgres. record=False leaves the hit rate metrics alone."""
+    cached = search_results.get(key)
+    if cached is not None:
+        if record:
+            google_search_cache_lookups.inc(result="memory")
+        return cached
+
+    stmt = select(schema.books.GoogleSearchCache).where(
+        (schema.books.GoogleSearchCache.key == key) &
+        (schema.books.GoogleSearchCache.expires_at > datetime.utcnow())
+    )
+    row = session.exec(stmt).first()
+    if row is None:
+        if record:
+            google_search_cache_lookups.inc(result="miss")
+        return None
+
+    if record:
+        google_search_cache_lookups.inc(result="db")
+    cached = (tuple(row.gids), row.total_results)
+    expires_at = row.expires_at.replace(tzinfo=timezone.utc).timestamp()
+    search_results.set(key, cached, expires_at=expires_at)
+    return cached
+
+
+def put(session: Session, key: str, gids: List[str], total_results: int):
+    expires_at = datetime.utcnow() + timedelta(seconds=google_search_cache_ttl_seconds)
+    stmt = insert(schema.books.GoogleSearchCache).values(
+        key=key,
+        gids=gids,
+        total_results=total_results,
+        expires_at=expires_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={
+            "gids": stmt.excluded.gids,
+            "total_results": stmt.excluded.total_results,
+            "expires_at": stmt.excluded.expires_at,
+        },
+    )
+    session.execute(stmt)
+
+    # Only once committed, the gids may refer to books inserted alongside.
+    cached = (tuple(gids), total_results)
+    on_commit(session, lambda: search_results.set(key, cached))
+
+    if next(_writes) % PRUNE_EVERY_WRITES == 0:
+        prune(session)
+
+
+def prune(session: Session, max_rows: int = google_search_cache_max_rows):
+    session.execute(
+        delete(schema.books.GoogleSearchCache).where(
+            col(schema.books.GoogleSearchCache.expires_at) <= datetime.utcnow()
+        ).execution_options(synchronize_session=False)
+    )
+    newest = select(schema.books.GoogleSearchCache.key).order_by(
+        col(schema.books.GoogleSearchCache.expires_at).desc()
+    ).limit(max_rows)
+    session.execute(
+        delete(schema.books.GoogleSearchCache).where(
+            col(schema.books.GoogleSearchCache.key).not_in(newest.scalar_subquery())
+        ).execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,401 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, col, select
+
+import src.db.schema as schema
+from src import metrics
+from src.config import (
+    typeahead_gap_timeout_seconds,
+    typeahead_max_key_chars,
+    typeahead_max_results,
+    typeahead_rebuild_interval_seconds,
+    typeahead_sync_batch_size,
+    typeahead_sync_interval_seconds,
+)
+
+# (type, id) of a book or author.
+SuggestionKey = Tuple[str, int]
+# Orders suggestions, most popular then shortest first, and ends with their key.
+_Entry = Tuple[int, int, str, int]
+
+# Freeing a replaced index takes this many nodes or suggestions at a time.
+RELEASE_CHUNK = 10000
+# Loads let waiting threads run every this many rows, rather than after the
+# interpreter's switch interval, so lookups do not queue behind a rebuild.
+YIELD_EVERY_ROWS = 20
+# Skipped ids checked again on each sync, per type, the most recent kept.
+MAX_GAPS = 10000
+
+# An id, text and popularity.
+_Row = Tuple[int, str, int]
+# Selects rows by a condition on their id.
+_RowLoader = Callable[[Session, ColumnElement], List[_Row]]
+
+typeahead_sync_seconds = metrics.histogram(
+    "typeahead_sync_seconds",
+    "Time to load new books and authors.",
+    ["kind"],
+)
+
+
+def normalize(text: str) -> str:
+    """Lower case words without accents or punctuation, separated by single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[^\W_]+", text.lower()))
+
+
+class PrefixTree:
+    """A radix tree that keeps the top max_results entries of every subtree.
+
+    A lookup walks the prefix and returns the node's entries, so it costs
+    the length of the prefix whatever the number of matches. Inserts update
+    the entries along their path.
+
+    Nodes are positions in parallel lists of strings, dicts of ints and
+    tuples, which the garbage collector stops tracking after one collection,
+    so a large tree adds little to collection pauses. Nodes a reader could
+    be on are replaced rather than changed, so lookups need no lock; inserts
+    must be serialized by the caller.
+    """
+
+    def __init__(self, max_results: int = typeahead_max_results):
+        self.max_results = max_results
+        self.keys = 0
+        # The label of the edge from the parent, the children by the first
+        # character of their label, and the best entries below, sorted.
+        self._labels: List[str] = [""]
+        self._children: List[Dict[str, int]] = [{}]
+        self._tops: List[Tuple[_Entry, ...]] = [()]
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def insert(self, key: str, entry: _Entry):
+        node = 0
+        self._offer(node, entry)
+        i = 0
+        while i < len(key):
+            children = self._children[node]
+            child = children.get(key[i])
+            if child is None:
+                children[key[i]] = self._new(key[i:], {}, (entry,))
+                break
+
+            label = self._labels[child]
+            if key.startswith(label, i):
+                common = len(label)
+            else:
+                common = _common_prefix_length(label, key, i)
+            if common < len(label):
+                # The old child is left unreachable, readers may be on it.
+                tail = self._new(label[common:], self._children[child], self._tops[child])
+                child = self._new(label[:common], {label[common]: tail}, self._tops[child])
+                children[key[i]] = child
+            self._offer(child, entry)
+            node = child
+            i += common
+        self.keys += 1
+
+    def find(self, prefix: str) -> Tuple[_Entry, ...]:
+        node = 0
+        i = 0
+        while i < len(prefix):
+            node = self._children[node].get(prefix[i])
+            if node is None:
+                return ()
+            label = self._labels[node]
+            if not label.startswith(prefix[i:i + len(label)]):
+                return ()
+            i += len(label)
+        return self._tops[node]
+
+    def release(self):
+        """Empties the tree a chunk at a time, letting other threads run in between."""
+        for nodes in (self._labels, self._children, self._tops):
+            while nodes:
+                del nodes[-RELEASE_CHUNK:]
+                time.sleep(0)
+
+    def _new(self, label: str, children: Dict[str, int], top: Tuple[_Entry, ...]) -> int:
+        # Appended in this order, a node's top exists once it is reachable.
+        self._tops.append(top)
+        self._children.append(children)
+        self._labels.append(label)
+        return len(self._labels) - 1
+
+    def _offer(self, node: int, entry: _Entry):
+        top = self._tops[node]
+        if entry in top or (len(top) >= self.max_results and entry >= top[-1]):
+            return
+        merged = list(top)
+        bisect.insort(merged, entry)
+        self._tops[node] = tuple(merged[:self.max_results])
+
+
+def _common_prefix_length(label: str, key: str, start: int) -> int:
+    n = 0
+    while n < len(label) and start + n < len(key) and label[n] == key[start + n]:
+        n += 1
+    return n
+
+
+class _State:
+    def __init__(self, max_results: int):
+        self.tree = PrefixTree(max_results)
+        # Display and normalized text.
+        self.texts: Dict[SuggestionKey, Tuple[str, str]] = {}
+        self.last_ids: Dict[str, int] = {}
+        # Ids below the last loaded that were not there yet, by when they
+        # were skipped. Ids are taken in insert order but commit in any.
+        self.gaps: Dict[str, Dict[int, float]] = {}
+
+    def release(self):
+        self.tree.release()
+        while self.texts:
+            for _ in range(min(RELEASE_CHUNK, len(self.texts))):
+                self.texts.popitem()
+            time.sleep(0)
+
+
+class TypeaheadIndex:
+    """Book titles and author names in memory, matched by the prefix of any word.
+
+    Every word start of a text, up to max_key_chars long, is a key, so
+    "pott" and "harry pott" both find Harry Potter. Suggestions rank by how
+    many shelves hold a book, or how many books an author has, then
+    shortest first.
+
+    A background thread adds books and authors inserted since its last
+    sync, by id, every sync_interval_seconds, and rebuilds everything every
+    rebuild_interval_seconds so renamed books and popularity catch up.
+    Ids it skipped are looked up again for gap_timeout_seconds, in case
+    their insert commits after a later one.
+    """
+
+    def __init__(
+        self,
+        max_results: int = typeahead_max_results,
+        max_key_chars: int = typeahead_max_key_chars,
+        sync_interval_seconds: float = typeahead_sync_interval_seconds,
+        rebuild_interval_seconds: float = typeahead_rebuild_interval_seconds,
+        batch_size: int = typeahead_sync_batch_size,
+        gap_timeout_seconds: float = typeahead_gap_timeout_seconds,
+    ):
+        self.max_results = max_results
+        self.max_key_chars = max_key_chars
+        self.sync_interval_seconds = sync_interval_seconds
+        self.rebuild_interval_seconds = rebuild_interval_seconds
+        self.batch_size = batch_size
+        self.gap_timeout_seconds = gap_timeout_seconds
+        self._state = _State(max_results)
+        self._lock = threading.Lock()
+        self._syncer: Optional[threading.Thread] = None
+
+    def suggest(self, q: str, limit: Optional[int] = None) -> List[schema.books.Suggestion]:
+        query = normalize(q)
+        if not query:
+            return []
+        state = self._state
+        entries = state.tree.find(query[:self.max_key_chars])
+        if len(query) > self.max_key_chars:
+            # Keys are truncated, the rest of the query filters their matches.
+            entries = [e for e in entries if f" {query}" in f" {state.texts[e[2:]][1]}"]
+
+        # Not validated again, the index only holds what it validated.
+        return [
+            schema.books.Suggestion.construct(
+                type=schema.books.SuggestionType(entry[2]),
+                id=entry[3],
+                text=state.texts[entry[2:]][0],
+            )
+            for entry in entries[:limit or self.max_results]
+        ]
+
+    def add(
+            self,
+            suggestion_type: schema.books.SuggestionType,
+            suggestion_id: int,
+            text: str,
+            popularity: int = 0,
+    ):
+        with self._lock:
+            self._add(self._state, suggestion_type, suggestion_id, text, popularity)
+
+    def add_many(self, suggestion_type: schema.books.SuggestionType, rows: List[_Row]):
+        """Adds (id, text, popularity) rows as a sync or rebuild does."""
+        with self._lock:
+            self._add_rows(self._state, suggestion_type, rows)
+
+    def sync(self, session: Session) -> int:
+        """Adds the books and authors inserted since the last sync, returns how many."""
+        with self._lock:
+            return self._load(session, self._state)
+
+    def rebuild(self, session: Session) -> "_State":
+        """Loads everything into a new tree and swaps it in, returns the replaced one.
+
+        The replaced tree can be released once no lookup is still on it.
+        """
+        state = _State(self.max_results)
+        self._load(session, state)
+        with self._lock:
+            # Catches up with what was inserted while loading.
+            self._load(session, state)
+            replaced, self._state = self._state, state
+        return replaced
+
+    def stats(self) -> Dict[str, int]:
+        state = self._state
+        return {
+            "suggestions": len(state.texts),
+            "keys": state.tree.keys,
+            "nodes": len(state.tree),
+        }
+
+    def start(self, session_factory: Callable[[], Session]):
+        if self._syncer is not None:
+            return
+        self._syncer = threading.Thread(
+            target=self._run_syncer, args=(session_factory,), name="typeahead-sync", daemon=True,
+        )
+        self._syncer.start()
+
+    def _run_syncer(self, session_factory: Callable[[], Session]):
+        rebuilt_at = None
+        replaced = None
+        while True:
+            try:
+                if replaced is not None:
+                    # A sync interval on, lookups that started on it are done.
+                    replaced.release()
+                    replaced = None
+                with session_factory() as session:
+                    if rebuilt_at is None or self._rebuild_due(rebuilt_at):
+                        replaced = self.rebuild(session)
+                        rebuilt_at = time.monotonic()
+                    else:
+                        self.sync(session)
+            except Exception as e:  # pylint: disable=W0703
+                print(f"Typeahead sync failed: {e}")
+            time.sleep(self.sync_interval_seconds)
+
+    def _rebuild_due(self, rebuilt_at: float) -> bool:
+        return time.monotonic() - rebuilt_at >= self.rebuild_interval_seconds
+
+    def _add(
+            self,
+            state: _State,
+            suggestion_type: schema.books.SuggestionType,
+            suggestion_id: int,
+            text: str,
+            popularity: int,
+    ):
+        normalized = normalize(text)
+        if not normalized:
+            return
+        state.texts[(suggestion_type.value, suggestion_id)] = (text, normalized)
+        entry = (-popularity, len(normalized), suggestion_type.value, suggestion_id)
+        for key in self._keys(normalized):
+            state.tree.insert(key, entry)
+
+    def _add_rows(
+            self,
+            state: _State,
+            suggestion_type: schema.books.SuggestionType,
+            rows: List[_Row],
+    ):
+        for i, (suggestion_id, text, popularity) in enumerate(rows, 1):
+            self._add(state, suggestion_type, suggestion_id, text, popularity)
+            if i % YIELD_EVERY_ROWS == 0:
+                time.sleep(0)
+
+    def _keys(self, normalized: str) -> Set[str]:
+        starts = [0] + [m.end() for m in re.finditer(" ", normalized)]
+        return {normalized[start:start + self.max_key_chars] for start in starts}
+
+    def _load(self, session: Session, state: _State) -> int:
+        loaded = 0
+        with typeahead_sync_seconds.time(kind="book"):
+            loaded += self._load_new(
+                session, state, schema.books.SuggestionType.BOOK,
+                schema.books.Book.id, self._book_rows,
+            )
+        with typeahead_sync_seconds.time(kind="author"):
+            loaded += self._load_new(
+                session, state, schema.books.SuggestionType.AUTHOR,
+                schema.books.Author.id, self._author_rows,
+            )
+        return loaded
+
+    def _load_new(
+            self,
+            session: Session,
+            state: _State,
+            suggestion_type: schema.books.SuggestionType,
+            id_column,
+            load_rows: _RowLoader,
+    ) -> int:
+        """Adds the rows after the last id loaded, and the skipped ones committed since."""
+        gaps = state.gaps.setdefault(suggestion_type.value, {})
+        now = time.monotonic()
+        expired = [
+            i for i, skipped_at in gaps.items() if now - skipped_at > self.gap_timeout_seconds
+        ]
+        for suggestion_id in expired:
+            # Rolled back, or a conflict used the id.
+            del gaps[suggestion_id]
+        loaded = 0
+        if gaps:
+            rows = load_rows(session, col(id_column).in_(list(gaps)))
+            self._add_rows(state, suggestion_type, rows)
+            for row in rows:
+                del gaps[row[0]]
+            loaded += len(rows)
+
+        last_id = state.last_ids.get(suggestion_type.value, 0)
+        while rows := load_rows(session, id_column > last_id):
+            self._add_rows(state, suggestion_type, rows)
+            loaded_ids = {row[0] for row in rows}
+            for suggestion_id in range(max(last_id + 1, rows[-1][0] - MAX_GAPS), rows[-1][0]):
+                if suggestion_id not in loaded_ids:
+                    gaps[suggestion_id] = now
+            while len(gaps) > MAX_GAPS:
+                del gaps[next(iter(gaps))]
+            last_id = state.last_ids[suggestion_type.value] = rows[-1][0]
+            loaded += len(rows)
+        return loaded
+
+    def _book_rows(self, session: Session, condition: ColumnElement) -> List[_Row]:
+        # The batch first, so the count only joins its links.
+        book = schema.books.Book
+        link = schema.collections.CollectionBookLink
+        batch = select(book.id, book.title).where(condition).order_by(
+            col(book.id)
+        ).limit(self.batch_size).subquery()
+        stmt = select(batch.c.id, batch.c.title, func.count(link.book_id)).outerjoin(
+            link, link.book_id == batch.c.id,
+        ).group_by(batch.c.id, batch.c.title).order_by(batch.c.id)
+        return session.exec(stmt).all()
+
+    def _author_rows(self, session: Session, condition: ColumnElement) -> List[_Row]:
+        author = schema.books.Author
+        link = schema.books.AuthorBookLink
+        batch = select(author.id, author.name).where(condition).order_by(
+            col(author.id)
+        ).limit(self.batch_size).subquery()
+        stmt = select(batch.c.id, batch.c.name, func.count(link.book_id)).outerjoin(
+            link, link.author_id == batch.c.id,
+        ).group_by(batch.c.id, batch.c.name).order_by(batch.c.id)
+        return session.exec(stmt).all()
+
+
+typeahead_index = TypeaheadIndex()
+metrics.gauge("typeahead_index", "Typeahead index size.", typeahead_index.stats)
@@ -1,10 +1,11 @@
 
 from fastapi import APIRouter, Depends, Request
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import src.db.schema as schema
 from src.auth.middleware import auth0_middleware
-from src.database import get_session
+from src.database import get_async_read_session, get_async_session, get_session
 from src.domain.service import activity
 
 # TODO(arden) header dependencies.
@@ -17,17 +18,17 @@ router = APIRouter(
 @router.post("/activities", response_model=schema.activity.ActivityPage)
 async def get_activities(
         f: schema.activity.ActivityFilter,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_read_session),
 ):
-    return activity.get_activities(session, f)
+    return await activity.aget_activities(session, f)
 
 
 @router.get("/activity/{activity_id}", response_model=schema.activity.ActivityRead)
 async def get_activity(
         activity_id: int,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_session),
 ):
-    return activity.get_activity(session, activity_id)
+    return await activity.aget_activity(session, activity_id)
 
 
 @router.put("/activity/comment", response_model=schema.activity.ActivityCommentRead)
@@ -1,14 +1,15 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Request, Response
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import src.db.schema as schema
 from olclient.openlibrary import OpenLibrary
 from resources.exceptions import NotFoundException
 from src.auth.middleware import auth0_middleware
-from src.database import get_session
-from src.domain.service import books, users
+from src.database import get_async_read_session, get_session
+from src.domain.service import books
 
 # TODO(arden) header dependencies.
 router = APIRouter(
@@ -36,33 +37,56 @@ async def search_books(
     return books.search_books_v2(session, f, request.state.user.id)
 
 
+@router.get("/books/typeahead/{q}", response_model=List[schema.books.Suggestion])
+async def suggest(
+        q: str,
+        limit: Optional[int] = None,
+):
+    return books.suggest(q, limit)
+
+
 @router.get("/book/{book_id}", response_model=schema.books.UserBookRead)
 async def get_book(
         request: Request,
         book_id: int,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_read_session),
 ):
-    book = books.get_book(session, book_id, request.state.user.id)
+    book = await books.aget_book(session, book_id, request.state.user.id)
     if not book:
         raise NotFoundException
     return book
 
 
+@router.post("/books/batch", response_model=List[schema.books.UserBookRead])
+async def get_books(
+        request: Request,
+        batch: schema.books.BookBatch,
+        session: AsyncSession = Depends(get_async_read_session),
+):
+    user_id = batch.user_id if batch.user_id is not None else request.state.user.id
+    return await books.aget_books(session, batch.book_ids, user_id)
+
+
 @router.get("/tags/{book_id}", response_model=List[schema.books.TagBookLink])
 async def get_book(
         book_id: int,
-        session: Session = Depends(get_session),
+        response: Response,
+        session: AsyncSession = Depends(get_async_read_session),
 ):
-    return books.get_tags_from_book_id(session, book_id)
+    book_tags = await books.aget_book_tags(session, book_id)
+    # A header, so clients reading the list of tags keep working.
+    if book_tags.pending:
+        response.headers["X-Tags-Pending"] = "true"
+    return book_tags.tags
 
 
 @router.get("/book/{book_id}/{user_id}", response_model=schema.books.UserBookRead)
 async def get_user_book(
         book_id: int,
         user_id: int,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_read_session),
 ):
-    book = books.get_book(session, book_id, user_id)
+    book = await books.aget_book(session, book_id, user_id)
     if not book:
         raise NotFoundException
     return book
@@ -71,27 +95,15 @@ async def get_user_book(
 @router.post("/books", response_model=schema.books.BookPage)
 async def get_user_books(
         f: schema.books.BookFilter,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_read_session),
 ):
-    return books.get_user_books(session, f)
+    return await books.aget_user_books(session, f)
 
 
 @router.get("/following/books/{book_id}/{parent_id}", response_model=List[schema.books.UserBookRead])
 async def get_following_user_books(
         book_id: int,
         parent_id: int,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_read_session),
 ):
-    users_filter = schema.users.LinkedUsersFilter(
-        parent_id=parent_id,
-        type=schema.users.UserLinkType.FOLLOW,
-    )
-    us = users.get_linked_users(session, users_filter)
-
-    bs: List[schema.books.UserBookRead] = []
-    for u in us:
-        b = books.get_book(session, book_id, u.id)
-        if len(b.collections) > 0 or b.review:
-            bs.append(b)
-
-    return bs
+    return await books.aget_following_user_books(session, book_id, parent_id)
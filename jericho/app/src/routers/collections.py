@@ -2,11 +2,12 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Request
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import src.db.schema as schema
 from resources.exceptions import NotFoundException
 from src.auth.middleware import auth0_middleware
-from src.database import get_session
+from src.database import get_async_read_session, get_async_session, get_session
 from src.domain.service import collections
 
 # TODO(arden) header dependencies.
@@ -22,9 +23,9 @@ router = APIRouter(
 )
 async def get_collection(
     collection_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    collection = collections.get_collection(session, collection_id)
+    collection = await collections.aget_collection(session, collection_id)
     if not collection:
         raise NotFoundException
     return collection
@@ -33,9 +34,9 @@ async def get_collection(
 @router.get("/collections", response_model=List[schema.collections.CollectionRead])
 async def get_collections(
     collection_filter: schema.collections.CollectionsFilter = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
 ):
-    return collections.get_collections(session, collection_filter)
+    return await collections.aget_collections(session, collection_filter)
 
 
 @router.get("/collection/user/link/{collection_id}/{user_id}", response_model=Optional[schema.collections.CollectionUserLinkRead])
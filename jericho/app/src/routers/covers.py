@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from resources.exceptions import BadGatewayException, InvalidArgumentException
+from src.config import cover_default_width, cover_max_age_seconds
+from src.covers import cache
+from src.database import get_async_read_session
+from src.domain.service import books
+
+# Unauthenticated, covers are loaded by image tags.
+router = APIRouter(
+    tags=["covers"],
+)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@router.get("/covers/{book_id}")
+async def get_cover(
+        request: Request,
+        book_id: int,
+        width: int = cover_default_width,
+        session: AsyncSession = Depends(get_async_read_session),
+):
+    if width not in cache.cover_cache.widths:
+        raise InvalidArgumentException
+    cover_link = await books.aget_cover_link(session, book_id)
+    headers = {"Cache-Control": f"public, max-age={cover_max_age_seconds}"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = cache.cover_cache.etag(cover_link, width)
+        if etag and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    try:
+        cover = await run_in_threadpool(cache.cover_cache.get, cover_link, width)
+    except Exception as e:  # pylint: disable=W0703
+        print(f"Cover of book {book_id} failed: {e}")
+        raise BadGatewayException
+    return FileResponse(
+        cover.path, media_type="image/jpeg", headers={**headers, "ETag": cover.etag},
+    )
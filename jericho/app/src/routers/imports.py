@@ -0,0 +1,103 @@
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import parse_options_header
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+import src.db.schema as schema
+from resources.exceptions import InvalidArgumentException, PayloadTooLargeException
+from src.auth.middleware import auth0_middleware
+from src.config import import_max_bytes
+from src.database import get_async_read_session, get_session
+from src.domain.service import imports
+
+router = APIRouter(
+    tags=["imports"],
+    dependencies=[Depends(auth0_middleware)],
+)
+
+# Room for the multipart boundaries and part headers around the file.
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class _UploadTooLarge(MultiPartException):
+    pass
+
+
+async def _limited(stream: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    size = 0
+    async for chunk in stream:
+        size += len(chunk)
+        if size > max_bytes:
+            # A MultiPartException, so the parser closes the files it spooled.
+            raise _UploadTooLarge("Upload too large")
+        yield chunk
+
+
+async def _receive_upload(request: Request) -> UploadFile:
+    """Parses the multipart "file" field, rejecting bodies over the import
+    limit from Content-Length or while they stream, before they are spooled.
+    """
+    max_bytes = import_max_bytes + UPLOAD_FORM_OVERHEAD_BYTES
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise PayloadTooLargeException
+    content_type, _ = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data":
+        raise InvalidArgumentException
+
+    parser = MultiPartParser(request.headers, _limited(request.stream(), max_bytes))
+    try:
+        form = await parser.parse()
+    except _UploadTooLarge:
+        raise PayloadTooLargeException
+    except MultiPartException:
+        raise InvalidArgumentException
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        await form.close()
+        raise InvalidArgumentException
+    return file
+
+
+@router.post(
+    "/imports",
+    response_model=schema.imports.LibraryImportRead,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"],
+                    },
+                },
+            },
+        },
+    },
+)
+async def create_import(
+        request: Request,
+        session: Session = Depends(get_session),
+):
+    file = await _receive_upload(request)
+    try:
+        # The upload is copied to disk off the event loop.
+        return await run_in_threadpool(imports.create_import, session, request.state.user.id, file)
+    finally:
+        await file.close()
+
+
+@router.get("/imports/{import_id}", response_model=schema.imports.LibraryImportRead)
+async def get_import(
+        request: Request,
+        import_id: int,
+        session: AsyncSession = Depends(get_async_read_session),
+):
+    return await imports.aget_import(session, import_id, request.state.user.id)
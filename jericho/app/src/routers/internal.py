@@ -1,4 +1,9 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.database import async_engine, engine, replica_router
+from src.db.pool import pool_status
+from src.metrics import registry
 
 router = APIRouter(
     tags=["internal"],
@@ -8,3 +13,20 @@ router = APIRouter(
 @router.get("/health")
 async def health():
     return {"message": "OK"}
+
+
+@router.get("/health/pool")
+async def health_pool():
+    return {
+        "primary": pool_status(engine.pool),
+        "primary_async": pool_status(async_engine.pool),
+        "replicas": {
+            replica.host: pool_status(replica.async_engine.pool)
+            for replica in replica_router.replicas
+        },
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -3,12 +3,13 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Request, UploadFile, File
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pathlib import Path
 
 import src.db.schema as schema
 from resources.exceptions import NotFoundException
 from src.auth.middleware import auth0_middleware
-from src.database import get_session
+from src.database import get_async_read_session, get_async_session, get_session
 from src.domain.service import users
 from src.routers.authorization import authorize_request_user_action
 
@@ -26,7 +27,7 @@ user_router = APIRouter(
 async def search_users(
         request: Request,
         q: str,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_read_session),
         offset: Optional[int] = None,
         limit: Optional[int] = None,
 ):
@@ -37,7 +38,7 @@ async def search_users(
     )
 
     # TODO authorization.
-    return users.search_users(session, f, request.state.user.id)
+    return await users.asearch_users(session, f, request.state.user.id)
 
 
 
@@ -155,10 +156,9 @@ async def put_avatar(
 async def get_linked_users(
     request: Request,
     users_filter: schema.users.LinkedUsersFilter = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    us = users.get_linked_users(session, users_filter)
-    return users.add_current_user_links(session, us, request.state.user.id)
+    return await users.aget_linked_users_read(session, users_filter, request.state.user.id)
 
 
 @users_router.put("/link", response_model=schema.users.UserLinkRead)
@@ -0,0 +1,207 @@
+import asyncio
+
+from pytest import raises
+from sqlmodel import Session
+
+import src.db.schema as schema
+from src.auth.auth0 import JWKSKeyStore
+from src.auth.local_jwks import LocalJWKS
+from src.auth.middleware import averify_token, verified_tokens, verify_token
+from src.auth.user import (
+    get_request_user_by_sub,
+    invalidation_hooks,
+    register_invalidation_hook,
+    user_ids_by_sub,
+)
+from src.cache import TTLCache
+from src.domain.service import users
+
+
+def _jwk(kid: str) -> dict:
+    return LocalJWKS(kid=kid).jwks()["keys"][0]
+
+
+class FakeJWKS:
+    def __init__(self, *kids: str):
+        self.keys = [_jwk(kid) for kid in kids]
+        self.fetches = 0
+
+    def __call__(self) -> dict:
+        self.fetches += 1
+        return {"keys": self.keys}
+
+
+class FakeAsyncJWKS(FakeJWKS):
+    async def __call__(self) -> dict:
+        self.fetches += 1
+        await asyncio.sleep(0.01)
+        return {"keys": self.keys}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_jwks_key_store_caches_keys():
+    jwks = FakeJWKS("a")
+    store = JWKSKeyStore(fetch=jwks, ttl_seconds=60, miss_refresh_interval_seconds=10)
+
+    key = store.get_public_key("a")
+    assert key is not None
+    assert store.get_public_key("a") is key
+    assert jwks.fetches == 1
+
+
+def test_jwks_key_store_rate_limits_kid_miss_refresh():
+    jwks = FakeJWKS("a")
+    clock = FakeClock()
+    store = JWKSKeyStore(fetch=jwks, ttl_seconds=600, miss_refresh_interval_seconds=10, clock=clock)
+
+    assert store.get_public_key("b") is None
+    assert jwks.fetches == 1
+
+    clock.now = 1
+    assert store.get_public_key("b") is None
+    assert store.get_public_key("b") is None
+    assert jwks.fetches == 2
+
+    # Rotation: the new kid is picked up once the rate limit has elapsed.
+    jwks.keys.append(_jwk("b"))
+    clock.now = 5
+    assert store.get_public_key("b") is None
+    clock.now = 12
+    assert store.get_public_key("b") is not None
+    assert jwks.fetches == 3
+
+
+def test_jwks_key_store_refreshes_stale_keys_in_background():
+    jwks = FakeJWKS("a")
+    clock = FakeClock()
+    store = JWKSKeyStore(fetch=jwks, ttl_seconds=60, miss_refresh_interval_seconds=10, clock=clock)
+
+    key = store.get_public_key("a")
+    clock.now = 61
+    assert store.get_public_key("a") is key  # served while refreshing
+    store._background_refresh.join()
+    assert jwks.fetches == 2
+    assert store.get_public_key("a") is not key
+
+
+def test_jwks_key_store_keeps_keys_when_refresh_fails():
+    jwks = FakeJWKS("a")
+    store = JWKSKeyStore(fetch=jwks, ttl_seconds=60, miss_refresh_interval_seconds=0)
+    key = store.get_public_key("a")
+
+    def failing_fetch():
+        raise ConnectionError("auth0 unreachable")
+
+    store.fetch = failing_fetch
+    store.refresh()
+    assert store.get_public_key("a") is key
+
+
+def test_jwks_key_store_backs_off_after_failed_fetch():
+    jwks = FakeJWKS("a")
+    clock = FakeClock()
+    store = JWKSKeyStore(fetch=jwks, ttl_seconds=60, miss_refresh_interval_seconds=10, clock=clock)
+    fetch = store.fetch
+
+    def failing_fetch():
+        jwks.fetches += 1
+        raise ConnectionError("auth0 unreachable")
+
+    store.fetch = failing_fetch
+    for _ in range(3):
+        assert store.get_public_key("a") is None
+    assert jwks.fetches == 1
+
+    clock.now = 9
+    assert store.get_public_key("a") is None
+    assert jwks.fetches == 1
+
+    store.fetch = fetch
+    clock.now = 10
+    assert store.get_public_key("a") is not None
+    assert jwks.fetches == 2
+
+
+def test_jwks_key_store_async_fetch_is_shared():
+    jwks = FakeAsyncJWKS("a")
+    store = JWKSKeyStore(afetch=jwks, ttl_seconds=60, miss_refresh_interval_seconds=10)
+
+    async def lookup_concurrently():
+        return await asyncio.gather(*[store.aget_public_key("a") for _ in range(10)])
+
+    keys = asyncio.run(lookup_concurrently())
+    assert all(key is keys[0] for key in keys)
+    assert keys[0] is not None
+    assert jwks.fetches == 1
+
+
+def test_verify_token_caches_until_exp(local_jwks: LocalJWKS):
+    verified_tokens.clear()
+
+    token = local_jwks.mint("auth0|1", expires_in=60)
+    hits, misses = verified_tokens.hits, verified_tokens.misses
+
+    assert verify_token(token)["sub"] == "auth0|1"
+    assert verify_token(token)["sub"] == "auth0|1"
+    assert verified_tokens.misses == misses + 1
+    assert verified_tokens.hits == hits + 1
+    assert asyncio.run(averify_token(token))["sub"] == "auth0|1"
+    assert verified_tokens.hits == hits + 2
+
+    verified_tokens.clear()
+    assert asyncio.run(averify_token(token))["sub"] == "auth0|1"
+    verified_tokens.clear()
+
+
+def test_verify_token_rejects_unknown_key(local_jwks: LocalJWKS):
+    with raises(ValueError):
+        verify_token(LocalJWKS(kid="other").mint("auth0|1"))
+
+
+def test_ttl_cache_expiry_and_eviction():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, clock=lambda: now[0])
+
+    cache.set("a", 1, expires_at=10)
+    cache.set("b", 2, expires_at=10)
+    assert cache.get("a") == 1
+    cache.set("c", 3, expires_at=10)  # evicts b, the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+    now[0] = 10
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_request_user_identity_cache(session: Session):
+    user_ids_by_sub.clear()
+    invalidated = []
+    register_invalidation_hook(invalidated.append)
+
+    user = users.upsert_user(session, schema.users.User(sub="auth0|archer"))
+    assert invalidated == ["auth0|archer"]
+
+    assert get_request_user_by_sub(session, "auth0|archer").id == user.id
+    assert user_ids_by_sub.get("auth0|archer") == user.id
+
+    # Skips the default collections, which delete_user does not cascade to yet.
+    user = schema.users.User(sub="auth0|emily")
+    session.add(user)
+    session.commit()
+
+    assert get_request_user_by_sub(session, "auth0|emily").id == user.id
+    users.delete_user(session, user)
+    assert user_ids_by_sub.get("auth0|emily") is None
+    assert get_request_user_by_sub(session, "auth0|emily").id is None
+    assert invalidated == ["auth0|archer", "auth0|emily"]
+
+    invalidation_hooks.remove(invalidated.append)
@@ -0,0 +1,67 @@
+import os
+
+from src.covers import cache
+from src.covers.local_origin import make_cover
+
+
+class FakeOrigin:
+    def __init__(self):
+        self.covers = {"dune": make_cover(600, 900, "teal"), "emma": make_cover(600, 900, "plum")}
+        self.fetches = []
+
+    def __call__(self, url: str) -> bytes:
+        self.fetches.append(url)
+        return self.covers[url]
+
+
+def _lookups() -> dict:
+    return {
+        result: cache.cover_lookups.value(result=result)
+        for result in ("origin", "original", "variant")
+    }
+
+
+def _paths(cover: cache.Cover) -> tuple:
+    # The variant and its original.
+    return cover.path, cover.path[:-len("-w128.jpg")]
+
+
+def test_cover_cache_counts_one_tier_per_lookup(tmp_path):
+    cover_cache = cache.CoverCache(root=str(tmp_path), fetch=FakeOrigin(), resize_workers=1)
+    try:
+        before = _lookups()
+        for width in (128, 128, 256):
+            cover_cache.get("dune", width)
+        after = _lookups()
+    finally:
+        cover_cache.close()
+
+    assert {result: after[result] - before[result] for result in after} == {
+        "origin": 1, "variant": 1, "original": 1,
+    }
+
+
+def test_cover_cache_prunes_least_recently_used(tmp_path):
+    origin = FakeOrigin()
+    cover_cache = cache.CoverCache(root=str(tmp_path), fetch=origin, resize_workers=1)
+    try:
+        dune = cover_cache.get("dune", 128)
+        emma = cover_cache.get("emma", 128)
+        # Dune was used last.
+        for cover, used_at in ((emma, 1000), (dune, 2000)):
+            for path in _paths(cover):
+                os.utime(path, (used_at, used_at))
+
+        assert cover_cache.prune() == 0
+        size = sum(os.path.getsize(path) for path in _paths(dune) + _paths(emma))
+        cover_cache.max_bytes = size - 1
+        assert cover_cache.prune() > 0
+        assert os.path.exists(dune.path)
+        assert not os.path.exists(emma.path)
+        assert cover_cache.etag("emma", 128) is None
+
+        # Fetched again when asked for.
+        cover_cache.get("emma", 128)
+        assert origin.fetches == ["dune", "emma", "emma"]
+    finally:
+        cover_cache.close()
@@ -0,0 +1,188 @@
+from pytest import raises
+from sqlalchemy import event, exc, inspect
+from sqlmodel import Session, select
+
+import src.db.schema as schema
+from src.database import run_migrations
+from src.db import jobs
+from src.db.instrumentation import QueryBudgetExceeded, query_budget, statement_shape, track_queries
+from src.db.pool import InstrumentedQueuePool, pool_status
+from src.db.routing import Replica, ReplicaRouter
+from src.db.unit_of_work import on_commit, transactional, unit_of_work
+from src.domain.service import users
+
+
+class FakeConnection:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_instrumented_pool_counts_timeouts():
+    pool = InstrumentedQueuePool(FakeConnection, pool_size=1, max_overflow=0, timeout=0.01)
+
+    conn = pool.connect()
+    status = pool_status(pool)
+    assert status["checked_out"] == 1
+    assert status["checkouts"] == 1
+
+    with raises(exc.TimeoutError):
+        pool.connect()
+    assert pool_status(pool)["timeouts"] == 1
+
+    conn.close()
+    status = pool_status(pool)
+    assert status["checked_out"] == 0
+    assert status["checked_in"] == 1
+
+
+def test_replica_router_skips_lagging_replicas():
+    replicas = [Replica(host, engine=None, async_engine=None) for host in ["a", "b", "c"]]
+    lag = {"a": 0.5, "b": 30.0, "c": 1.0}
+
+    def measure_lag(replica: Replica) -> float:
+        if replica.host not in lag:
+            raise ConnectionError("replica down")
+        return lag[replica.host]
+
+    router = ReplicaRouter(
+        replicas, max_lag_seconds=5, check_interval_seconds=60, measure_lag=measure_lag,
+    )
+    assert router.pick() is None  # lag unknown until the first check
+
+    router.check_lag()
+    assert [router.pick().host for _ in range(4)] == ["a", "c", "a", "c"]
+
+    del lag["a"]
+    lag["c"] = 10.0
+    router.check_lag()
+    assert router.pick() is None
+    assert router.lag() == {"a": -1, "b": 30.0, "c": 10.0}
+
+    router.start()
+    checker = router._checker
+    router.stop()
+    assert not checker.is_alive()
+
+
+def test_statement_shape_collapses_parameters():
+    assert statement_shape("SELECT * FROM book WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == (
+        "SELECT * FROM book WHERE id IN (?)"
+    )
+    assert statement_shape("SELECT *\n  FROM book WHERE id = $1") == (
+        "SELECT * FROM book WHERE id = ?"
+    )
+
+
+def test_track_queries_flags_n_plus_one(session: Session):
+    for i in range(5):
+        session.add(schema.users.User(sub=f"auth0|{i}"))
+    session.commit()
+
+    with track_queries() as stats:
+        for user in session.exec(select(schema.users.User)).all():
+            session.exec(select(schema.users.UserLink).where(
+                schema.users.UserLink.parent_id == user.id
+            )).all()
+
+    assert stats.count == 6
+    assert len(stats.n_plus_one(threshold=5)) == 1
+    assert not stats.n_plus_one(threshold=6)
+
+
+def test_query_budget(session: Session):
+    with query_budget(1):
+        session.exec(select(schema.users.User)).all()
+
+    with raises(QueryBudgetExceeded):
+        with query_budget(1):
+            session.exec(select(schema.users.User)).all()
+            session.exec(select(schema.users.UserLink)).all()
+
+
+def test_run_migrations(session: Session):
+    engine = session.get_bind()
+    with engine.begin() as connection:
+        run_migrations(connection)
+    # Idempotent on a database already at head.
+    with engine.begin() as connection:
+        run_migrations(connection)
+
+    inspector = inspect(engine)
+    assert "alembic_version" in inspector.get_table_names()
+    indexes = {
+        table: {index["name"] for index in inspector.get_indexes(table)}
+        for table in ["review", "userlink", "collectionbooklink", "activity"]
+    }
+    assert "ix_review_user_id_reaction_rank" in indexes["review"]
+    assert "ix_userlink_child_id_type" in indexes["userlink"]
+    assert "ix_collectionbooklink_book_id" in indexes["collectionbooklink"]
+    assert "ix_activity_created_at_desc_id" in indexes["activity"]
+
+
+def test_unit_of_work_commits_once(session: Session):
+    commits = []
+    event.listen(session, "after_commit", commits.append)
+    invalidated = []
+
+    @transactional
+    def add_users(session: Session, *subs: str):
+        for sub in subs:
+            users.upsert_user(session, schema.users.User(sub=sub))
+            on_commit(session, lambda: invalidated.append(sub))
+
+    add_users(session, "auth0|archer", "auth0|emily")
+    assert len(commits) == 1
+    assert len(invalidated) == 2
+
+    with raises(ValueError):
+        with unit_of_work(session):
+            users.upsert_user(session, schema.users.User(sub="auth0|arden"))
+            raise ValueError
+    assert len(commits) == 1
+    subs = session.exec(select(schema.users.User.sub)).all()
+    assert sorted(subs) == ["auth0|archer", "auth0|emily"]
+
+
+def test_unit_of_work_savepoint_isolates_failures(session: Session):
+    with unit_of_work(session):
+        session.add(schema.users.User(sub="auth0|archer"))
+        with raises(exc.IntegrityError):
+            with session.begin_nested():
+                session.add(schema.users.User(sub="auth0|archer"))
+        session.add(schema.users.User(sub="auth0|emily"))
+
+    subs = session.exec(select(schema.users.User.sub)).all()
+    assert sorted(subs) == ["auth0|archer", "auth0|emily"]
+
+
+def test_enqueue_later_is_bounded(monkeypatch):
+    monkeypatch.setattr(jobs, "_deferred", {})
+    monkeypatch.setattr(jobs, "_running", set())
+    dropped = jobs.jobs_deferred_dropped.value(kind="test", reason="no_workers")
+    jobs.enqueue_later("test", ["a"])
+    assert not jobs._deferred
+    assert jobs.jobs_deferred_dropped.value(kind="test", reason="no_workers") == dropped + 1
+
+    monkeypatch.setattr(jobs, "_running", {jobs.JobWorkerPool(lambda: None)})
+    dropped = jobs.jobs_deferred_dropped.value(kind="test", reason="full")
+    jobs.enqueue_later("test", ["a", "b"], max_keys=3)
+    jobs.enqueue_later("test", ["b", "c", "d"], max_keys=3)
+    assert len(jobs._deferred["test"]) == 3
+    assert jobs.jobs_deferred_dropped.value(kind="test", reason="full") == dropped + 1
+
+
+def test_job_worker_pool_stops(session: Session, monkeypatch):
+    monkeypatch.setattr(jobs, "_running", set())
+    pool = jobs.JobWorkerPool(
+        lambda: Session(session.get_bind()), workers=2, poll_interval_seconds=60,
+    )
+    pool.start()
+    threads = list(pool._threads)
+    assert jobs._running == {pool}
+
+    pool.stop()
+    assert not any(thread.is_alive() for thread in threads)
+    assert not jobs._running
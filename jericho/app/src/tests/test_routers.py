@@ -1,14 +1,21 @@
+import io
+import os
+
 from fastapi.testclient import TestClient
+from PIL import Image
 from sqlmodel import Session
 
+import src.db.schema as schema
 from resources.exceptions import NotFoundException
+from src.config import pg_pool_size
+from src.covers import cache
+from src.covers.local_origin import LocalCoverOrigin, make_cover
+from src.db import jobs
+from src.domain.service import books, imports, users
+from src.domain.utils import typeahead
 
 
 def test_get_book(client: TestClient, session: Session):
-    # pylint: disable=C0415
-    from src.domain.service import books
-    import src.db.schema as schema
-
     book = books.upsert_book(session, schema.books.Book(title="Demon Copperhead"))
 
     response = client.get(f"/book/{book.id}")
@@ -26,10 +33,6 @@ def test_get_book(client: TestClient, session: Session):
 
 
 def test_crud_user(client: TestClient):
-    # pylint: disable=C0415
-    from src.domain.service import users
-    import src.db.schema as schema
-
     user = schema.users.User(
         name="Archer",
         tag="archer_the_good_boi",
@@ -86,10 +89,6 @@ def test_crud_user(client: TestClient):
 
 
 def test_crud_user_link(client: TestClient, session: Session):
-    # pylint: disable=C0415
-    from src.domain.service import users
-    import src.db.schema as schema
-
     user1 = schema.users.User(tag="first", name="first")
     user1 = users.upsert_user(session, user1)
 
@@ -135,3 +134,209 @@ def test_crud_user_link(client: TestClient, session: Session):
 
     assert response.status_code == 200
     assert len(data) == 0
+
+
+def test_auth_phase_metrics(client: TestClient):
+    response = client.get("/user/current")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["id"] is not None
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    for phase in ["header_parse", "key_lookup", "signature_verify", "user_resolution"]:
+        assert f'auth_phase_seconds_count{{phase="{phase}"}}' in response.text
+
+    response = client.get("/user/current", headers={"Authorization": "Bearer not-a-token"})
+
+    assert response.status_code == 401
+
+
+def test_health_pool(client: TestClient):
+    response = client.get("/health/pool")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["primary"]["size"] == pg_pool_size
+    assert data["primary"]["timeouts"] == 0
+    assert "checked_out" in data["primary"]
+
+
+def test_search_users(client: TestClient, session: Session):
+    users.upsert_user(session, schema.users.User(sub="auth0|archer", name="Archer", tag="archer"))
+    users.upsert_user(session, schema.users.User(sub="auth0|emily", name="Emily", tag="emily"))
+
+    response = client.get("/user/search/arc")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["total_count"] == 1
+    assert data["users"][0]["tag"] == "archer"
+
+
+def test_get_activities(client: TestClient, session: Session):
+    archer = users.upsert_user(
+        session, schema.users.User(sub="auth0|archer", name="Archer", tag="archer"),
+    )
+    emily = users.upsert_user(
+        session, schema.users.User(sub="auth0|emily", name="Emily", tag="emily"),
+    )
+    users.upsert_user_link(
+        session,
+        schema.users.UserLink(
+            parent_id=archer.id, child_id=emily.id, type=schema.users.UserLinkType.FOLLOW,
+        ),
+    )
+
+    response = client.post("/activities", json={"primary_user_id": archer.id})
+    data = response.json()
+
+    assert response.status_code == 200
+    assert len(data["activities"]) == 1
+    assert data["activities"][0]["follow_user"]["follower"]["tag"] == "archer"
+    assert data["activities"][0]["follow_user"]["following"]["tag"] == "emily"
+    assert int(response.headers["X-DB-Query-Count"]) <= 6
+    assert response.headers["X-DB-N-Plus-One"] == "0"
+
+
+def test_get_books_batch(client: TestClient, session: Session):
+    client.get("/user/current")  # creates the requesting user
+    ids = [books.upsert_book(session, schema.books.Book(title=f"Batch {i}")).id for i in range(30)]
+
+    response = client.post("/books/batch", json={"book_ids": ids[::-1] + [ids[-1] + 1]})
+    data = response.json()
+
+    assert response.status_code == 200
+    assert [b["book"]["id"] for b in data] == ids[::-1]
+    assert int(response.headers["X-DB-Query-Count"]) <= 6
+    assert response.headers["X-DB-N-Plus-One"] == "0"
+
+    response = client.post("/books/batch", json={"book_ids": list(range(101))})
+    assert response.status_code == 422
+
+
+def test_get_book_tags(client: TestClient, session: Session):
+    book = books.upsert_book(session, schema.books.Book(title="Tagless", gid="tagless"))
+    jobs.enqueue(session, books.TAG_ENRICHMENT_JOB, [str(book.id)])
+    session.commit()
+
+    response = client.get(f"/tags/{book.id}")
+    assert response.status_code == 200
+    assert response.json() == []
+    assert response.headers["X-Tags-Pending"] == "true"
+
+    books.add_tags_if_not_exist(session, {"fiction"})
+    books.add_tag_links_if_not_exist(session, {"fiction"}, book.id)
+    session.commit()
+
+    response = client.get(f"/tags/{book.id}")
+    assert [t["tag_name"] for t in response.json()] == ["fiction"]
+    assert "X-Tags-Pending" not in response.headers
+
+
+def test_library_import(client: TestClient, tmp_path, monkeypatch):
+    monkeypatch.setattr(imports, "import_upload_dir", str(tmp_path))
+    client.get("/user/current")  # creates the requesting user
+
+    response = client.post(
+        "/imports", files={"file": ("library.jsonl", b'{"isbn13": "9780000000001"}\n')},
+    )
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["status"] == "pending"
+    assert data["size_bytes"] == 28
+
+    response = client.get(f"/imports/{data['id']}")
+    assert response.status_code == 200
+    assert response.json()["id"] == data["id"]
+
+    response = client.get(f"/imports/{data['id'] + 1}")
+    assert response.status_code == NotFoundException.status_code
+
+    response = client.post("/imports", files={"file": ("library.xlsx", b"")})
+    assert response.status_code == 422
+
+    response = client.post("/imports", data={"name": "library.jsonl"})
+    assert response.status_code == 422
+
+
+def test_library_import_too_large(client: TestClient, tmp_path, monkeypatch):
+    monkeypatch.setattr(imports, "import_upload_dir", str(tmp_path))
+    monkeypatch.setattr("src.routers.imports.import_max_bytes", 64)
+    monkeypatch.setattr("src.routers.imports.UPLOAD_FORM_OVERHEAD_BYTES", 256)
+    client.get("/user/current")  # creates the requesting user
+
+    # Refused from its Content-Length.
+    response = client.post("/imports", files={"file": ("library.jsonl", b"{}\n" * 200)})
+    assert response.status_code == 413
+
+    # Refused while it streams, without a Content-Length.
+    boundary = "library-import"
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="library.jsonl"\r\n\r\n'
+    ).encode() + b"{}\n" * 200 + f"\r\n--{boundary}--\r\n".encode()
+    response = client.post(
+        "/imports",
+        content=(body[i:i + 100] for i in range(0, len(body), 100)),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert response.status_code == 413
+    assert not os.listdir(tmp_path)
+
+
+def test_suggest(client: TestClient, monkeypatch):
+    index = typeahead.TypeaheadIndex()
+    index.add(schema.books.SuggestionType.BOOK, 1, "Demon Copperhead")
+    monkeypatch.setattr(typeahead, "typeahead_index", index)
+
+    response = client.get("/books/typeahead/copper")
+    assert response.status_code == 200
+    assert response.json() == [{"type": "book", "id": 1, "text": "Demon Copperhead"}]
+
+    response = client.get("/books/typeahead/copper?limit=1000")
+    assert response.status_code == 422
+
+
+def test_get_cover(client: TestClient, session: Session, tmp_path, monkeypatch):
+    cover_cache = cache.CoverCache(root=str(tmp_path), resize_workers=1)
+    monkeypatch.setattr(cache, "cover_cache", cover_cache)
+
+    with LocalCoverOrigin() as origin:
+        cover_link = origin.add("/dune.jpg", make_cover(600, 900))
+        book = books.upsert_book(session, schema.books.Book(title="Dune", cover_link=cover_link))
+        # Same image, another URL, stored once.
+        other = books.upsert_book(session, schema.books.Book(
+            title="Dune Messiah", cover_link=origin.add("/dune-messiah.jpg", make_cover(600, 900)),
+        ))
+
+        response = client.get(f"/covers/{book.id}", params={"width": 128})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert "max-age=" in response.headers["cache-control"]
+        assert Image.open(io.BytesIO(response.content)).size == (128, 192)
+        etag = response.headers["etag"]
+
+        assert client.get(f"/covers/{book.id}", params={"width": 128}).content == response.content
+        assert client.get(f"/covers/{book.id}", params={"width": 512}).status_code == 200
+        assert origin.requests == {"/dune.jpg": 1}
+
+        response = client.get(
+            f"/covers/{book.id}", params={"width": 128}, headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 304
+
+        response = client.get(f"/covers/{other.id}", params={"width": 128})
+        assert response.headers["etag"] == etag
+        assert len(list((tmp_path / "objects").rglob("*-w128.jpg"))) == 1
+
+        assert client.get(f"/covers/{book.id}", params={"width": 100}).status_code == 422
+        missing = books.upsert_book(session, schema.books.Book(
+            title="Missing", cover_link=origin.url("/gone.jpg"),
+        ))
+        assert client.get(f"/covers/{missing.id}").status_code == 502
+
+    cover_cache.close()
@@ -1,2 +1,3 @@
+export {Item} from './Item';
 export {List} from './List';
 export {Screen} from './Screen';
@@ -1,8 +1,9 @@
 import React, {useCallback, useContext, useEffect, useState} from 'react';
 import {
+  ActivityIndicator,
+  FlatList,
   RefreshControl,
   SafeAreaView,
-  ScrollView,
   StyleSheet,
   Text,
   View,
@@ -10,17 +11,37 @@ import {
 import {Title} from './Title';
 import {
   CollectionRead,
+  BookCursor,
   BookPage,
+  BooksApi,
   CollectionUserLinkType,
+  UserBookRead,
   UserRead,
 } from '../../generated/jericho';
-import {List as BooksList} from '../book';
+import {Item as BookItem} from '../book';
 import {Divider} from 'react-native-paper';
 import {LightTheme} from '../../styles/themes/LightTheme';
 import {ApiContext, UserContext} from '../../context';
 import {TitleButtons} from './Buttons';
 import {useIsFocused} from '@react-navigation/native';
 
+const BOOKS_PAGE_SIZE = 20;
+
+const fetchCollectionBooks = async (
+  booksApi: BooksApi,
+  userId: number,
+  collectionId: number,
+  cursor?: BookCursor,
+): Promise<BookPage> => {
+  const response = await booksApi.getUserBooksBooksPost({
+    user_id: userId,
+    collection_ids: [collectionId],
+    cursor: cursor,
+    limit: BOOKS_PAGE_SIZE,
+  });
+  return response.data;
+};
+
 interface ScreenProps {
   collection: CollectionRead;
 }
@@ -28,11 +49,14 @@ interface ScreenProps {
 export const Screen = ({collection}: ScreenProps) => {
   const {user: bibliUser} = useContext(UserContext);
   const {booksApi, usersApi} = useContext(ApiContext);
-  const [bookPage, setBookPage] = useState<BookPage>();
+  const [books, setBooks] = useState<UserBookRead[]>([]);
+  const [totalCount, setTotalCount] = useState<number>(0);
+  const [cursor, setCursor] = useState<BookCursor>();
   const [refreshing, setRefreshing] = useState<boolean>(false);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [isLoaded, setIsLoaded] = useState<boolean>(false);
   const [owner, setOwner] = useState<UserRead>();
-  const [ownerBookPage, setOwnerBookPage] = useState<BookPage>();
+  const [ownerBooks, setOwnerBooks] = useState<UserBookRead[]>([]);
   const isFocused = useIsFocused();
 
   const owner_id = collection.user_links.find(
@@ -58,30 +82,41 @@ export const Screen = ({collection}: ScreenProps) => {
     fetchUser().catch(error => console.log(error));
   }, [bibliUser, owner_id, usersApi]);
 
+  // A page of the collection as the user sees it, and as its owner does.
+  // Both list the collection's books in the same order, so share cursors.
+  const fetchPage = useCallback(
+    async (pageCursor?: BookCursor) => {
+      if (!bibliUser) {
+        return undefined;
+      }
+      const [page, ownerPage] = await Promise.all([
+        fetchCollectionBooks(booksApi, bibliUser.id, collection.id, pageCursor),
+        owner && bibliUser.id !== owner.id
+          ? fetchCollectionBooks(booksApi, owner.id, collection.id, pageCursor)
+          : undefined,
+      ]);
+      return {page, ownerPage};
+    },
+    [bibliUser, booksApi, collection.id, owner],
+  );
+
   const fetchBooks = useCallback(async () => {
-    if (bibliUser) {
-      try {
-        const response = await booksApi.getUserBooksBooksPost({
-          user_id: bibliUser?.id,
-          collection_ids: [collection.id],
-        });
-        setBookPage(response.data);
-        if (owner && bibliUser?.id !== owner?.id) {
-          const response = await booksApi.getUserBooksBooksPost({
-            user_id: owner?.id,
-            collection_ids: [collection.id],
-          });
-          setOwnerBookPage(response.data);
-        }
+    try {
+      const result = await fetchPage();
+      if (result) {
+        setBooks(result.page.books ?? []);
+        setTotalCount(result.page.total_count);
+        setCursor(result.page.next_cursor);
+        setOwnerBooks(result.ownerPage?.books ?? []);
         setIsLoaded(true);
-      } catch (error) {
-        console.log(
-          `Error fetching books for collection ${collection.name}:`,
-          error,
-        );
       }
+    } catch (error) {
+      console.log(
+        `Error fetching books for collection ${collection.name}:`,
+        error,
+      );
     }
-  }, [bibliUser, booksApi, collection.id, collection.name, owner]);
+  }, [collection.name, fetchPage]);
 
   useEffect(() => {
     if (isFocused) {
@@ -95,6 +130,46 @@ export const Screen = ({collection}: ScreenProps) => {
     setRefreshing(false);
   }, [fetchBooks]);
 
+  const loadMoreBooks = useCallback(async () => {
+    if (!loadingMore && cursor) {
+      setLoadingMore(true);
+      try {
+        const result = await fetchPage(cursor);
+        if (result) {
+          const pageBooks = result.page.books ?? [];
+          setBooks(prevBooks => [...prevBooks, ...pageBooks]);
+          setCursor(result.page.next_cursor);
+          const ownerPageBooks = result.ownerPage?.books ?? [];
+          setOwnerBooks(prevBooks => [...prevBooks, ...ownerPageBooks]);
+        }
+      } catch (error) {
+        console.log(
+          `Error fetching more books for collection ${collection.name}:`,
+          error,
+        );
+      } finally {
+        setLoadingMore(false);
+      }
+    }
+  }, [collection.name, cursor, fetchPage, loadingMore]);
+
+  const onEndReached = useCallback(() => {
+    loadMoreBooks().catch(error => console.log(error));
+  }, [loadMoreBooks]);
+
+  const renderBookItem = ({item}: {item: UserBookRead}) => (
+    <BookItem
+      userBook={item}
+      currentOwnedCollection={
+        owner?.id === bibliUser?.id ? collection : undefined
+      }
+      owner={owner}
+      ownerBook={ownerBooks.find(book => book.book.id === item.book.id)}
+    />
+  );
+
+  const itemSeparator = () => <Divider bold={true} />;
+
   return (
     <SafeAreaView style={styles.container}>
       <View style={styles.headerContainer}>
@@ -108,8 +183,7 @@ export const Screen = ({collection}: ScreenProps) => {
         )}
         {isLoaded && (
           <Text style={styles.socialText}>
-            {bookPage?.books?.length ?? 0} Books •{' '}
-            {collection.user_links.length} Followers
+            {totalCount} Books • {collection.user_links.length} Followers
           </Text>
         )}
       </View>
@@ -117,20 +191,19 @@ export const Screen = ({collection}: ScreenProps) => {
         bold={true}
         style={{backgroundColor: LightTheme.colors.onBackground}}
       />
-      <ScrollView
+      <FlatList
         style={styles.routeContainer}
+        data={books}
+        renderItem={renderBookItem}
+        keyExtractor={item => item.book.id.toString()}
         refreshControl={
           <RefreshControl refreshing={refreshing} onRefresh={onRefresh} />
-        }>
-        <BooksList
-          userBooks={bookPage?.books ?? []}
-          currentOwnedCollection={
-            owner?.id === bibliUser?.id ? collection : undefined
-          }
-          owner={owner}
-          ownerBooks={ownerBookPage?.books}
-        />
-      </ScrollView>
+        }
+        onEndReached={onEndReached}
+        onEndReachedThreshold={0.7}
+        ListFooterComponent={loadingMore ? <ActivityIndicator /> : undefined}
+        ItemSeparatorComponent={itemSeparator}
+      />
     </SafeAreaView>
   );
 };
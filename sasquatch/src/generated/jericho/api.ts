@@ -311,6 +311,31 @@ export interface BodyPutAvatarUserAvatarUserIdPut {
      */
     'file': File;
 }
+/**
+ * The first book of the next page, by the page's sort.
+ * @export
+ * @interface BookCursor
+ */
+export interface BookCursor {
+    /**
+     * 
+     * @type {number}
+     * @memberof BookCursor
+     */
+    'id': number;
+    /**
+     * 
+     * @type {string}
+     * @memberof BookCursor
+     */
+    'added_at'?: string;
+    /**
+     * 
+     * @type {string}
+     * @memberof BookCursor
+     */
+    'title'?: string;
+}
 /**
  * 
  * @export
@@ -329,6 +354,18 @@ export interface BookFilter {
      * @memberof BookFilter
      */
     'collection_ids'?: Array<number>;
+    /**
+     * 
+     * @type {BookSort}
+     * @memberof BookFilter
+     */
+    'sort'?: BookSort;
+    /**
+     * 
+     * @type {BookCursor}
+     * @memberof BookFilter
+     */
+    'cursor'?: BookCursor;
     /**
      * 
      * @type {number}
@@ -342,6 +379,8 @@ export interface BookFilter {
      */
     'limit'?: number;
 }
+
+
 /**
  * 
  * @export
@@ -360,6 +399,12 @@ export interface BookPage {
      * @memberof BookPage
      */
     'books'?: Array<UserBookRead>;
+    /**
+     * 
+     * @type {BookCursor}
+     * @memberof BookPage
+     */
+    'next_cursor'?: BookCursor;
 }
 /**
  * 
@@ -428,6 +473,20 @@ export interface BookRead {
      */
     'id': number;
 }
+/**
+ * An enumeration.
+ * @export
+ * @enum {string}
+ */
+
+export const BookSort = {
+    Added: 'added',
+    Title: 'title'
+} as const;
+
+export type BookSort = typeof BookSort[keyof typeof BookSort];
+
+
 /**
  * 
  * @export